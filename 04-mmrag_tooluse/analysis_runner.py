@@ -0,0 +1,314 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError"}
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """
+    Parses the duration in an `x-ratelimit-reset-*` header ("1s", "6m0s", "59ms") into seconds.
+    """
+    if not value:
+        return None
+    units = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+class TokenBucket:
+    """Refills `capacity` units per minute, continuously."""
+
+    def __init__(self, capacity: float):
+        self.capacity = max(1.0, float(capacity))
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.capacity
+
+    def consume(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+    def sync(self, limit: Optional[float], remaining: Optional[float]) -> None:
+        """Adopt the server's view: its limit becomes the capacity, and we never assume more headroom than it reports."""
+        self._refill(time.monotonic())
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+
+
+class RateLimiter:
+    """
+    Request and token buckets for one model. They start from the configured limits and are
+    corrected from the `x-ratelimit-*` headers of every response, so the send rate follows the
+    account's actual limits. A 429 pauses every caller until the server's reset time.
+
+    Only used from a single event loop, so no locking is needed.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+
+    async def acquire(self, tokens: float) -> None:
+        while True:
+            now = time.monotonic()
+            wait = max(
+                self.paused_until - now,
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(tokens, now))
+            if wait <= 0:
+                self.requests.consume(1)
+                self.tokens.consume(tokens)
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def update(self, headers) -> None:
+        def number(name: str) -> Optional[float]:
+            try:
+                return float(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+
+        self.requests.sync(number("x-ratelimit-limit-requests"), number("x-ratelimit-remaining-requests"))
+        self.tokens.sync(number("x-ratelimit-limit-tokens"), number("x-ratelimit-remaining-tokens"))
+        for kind in ("requests", "tokens"):
+            if number(f"x-ratelimit-remaining-{kind}") == 0:
+                reset = parse_reset(headers.get(f"x-ratelimit-reset-{kind}"))
+                if reset:
+                    self.pause(reset)
+
+
+class Checkpoint:
+    """
+    Append-only JSONL of finished items (`{"key": ..., "result": ...}` per line), flushed after
+    every item, so an interrupted run resumes without repeating the work it already paid for.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.results: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line torn by a crash
+                    self.results[entry["key"]] = entry["result"]
+        except OSError:
+            pass
+        self._file = None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.results
+
+    def get(self, key: str) -> Any:
+        return self.results.get(key)
+
+    def record(self, key: str, result: Any) -> None:
+        with self._lock:
+            if self._file is None:
+                folder = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(folder, exist_ok=True)
+                self._file = open(self.path, "a")
+            self._file.write(json.dumps({"key": key, "result": result}) + "\n")
+            self._file.flush()
+            self.results[key] = result
+
+    def clear(self) -> None:
+        """Drop the checkpoint once its results are stored somewhere durable."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.results = {}
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+def is_retryable(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return type(error).__name__ in RETRYABLE_ERRORS or isinstance(error, (asyncio.TimeoutError, ConnectionError))
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after-ms")) / 1000.0
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        pass
+    if getattr(error, "status_code", None) == 429:
+        return parse_reset(headers.get("x-ratelimit-reset-tokens") or headers.get("x-ratelimit-reset-requests"))
+    return None
+
+
+class AsyncJobRunner:
+    """
+    Runs an async job per item on an event loop in a background thread.
+
+    Items are submitted from ordinary code with `submit(key, item)`, which returns a
+    concurrent.futures.Future resolving to the job's result, or None if it failed. At most
+    `concurrency` jobs run at once. Inside a job, every API call goes through `request`, which
+    waits for rate-limit capacity, feeds the response headers back to the limiter and retries
+    transient errors with exponential backoff and jitter. Results accepted by `is_complete` are
+    written to the checkpoint as they finish, and items already in the checkpoint are not run again.
+    """
+
+    def __init__(
+        self,
+        job: Callable[[Any], Awaitable[Any]],
+        limiter: Optional[RateLimiter] = None,
+        concurrency: int = 8,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        checkpoint: Optional[Checkpoint] = None,
+        is_complete: Callable[[Any], bool] = bool,
+        on_close: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        self.job = job
+        self.limiter = limiter
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.checkpoint = checkpoint
+        self.is_complete = is_complete
+        self.on_close = on_close  # e.g. closing an async API client on the loop it was used on
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._futures: Dict[str, Future] = {}
+
+    def __enter__(self) -> "AsyncJobRunner":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _start(self) -> None:
+        # Started on first use rather than in __init__, so no thread is running while
+        # the caller may still be forking worker processes.
+        if self._loop is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run_loop():
+            asyncio.set_event_loop(self._loop)
+            self._slots = asyncio.Semaphore(self.concurrency)
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run_loop, name="async-job-runner", daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def submit(self, key: str, item: Any) -> Future:
+        if key in self._futures:
+            return self._futures[key]
+        if self.checkpoint is not None and key in self.checkpoint:
+            future: Future = Future()
+            future.set_result(self.checkpoint.get(key))
+        else:
+            self._start()
+            future = asyncio.run_coroutine_threadsafe(self._run_item(key, item), self._loop)
+        self._futures[key] = future
+        return future
+
+    def map(self, items: Dict[str, Any]) -> Dict[str, Any]:
+        futures = {key: self.submit(key, item) for key, item in items.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+    async def _run_item(self, key: str, item: Any) -> Any:
+        async with self._slots:
+            try:
+                result = await self.job(item)
+            except Exception as e:
+                logger.error(f"Job {key} failed: {e}")
+                return None
+        if self.checkpoint is not None and self.is_complete(result):
+            self.checkpoint.record(key, result)
+        return result
+
+    async def request(self, make_request: Callable[[], Awaitable[Any]], tokens: float = 1) -> Any:
+        """
+        Sends one rate-limited API call. `make_request` must return an OpenAI raw response
+        (`client.with_raw_response...`) so its rate-limit headers can be read; the parsed
+        response is returned.
+        """
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                await self.limiter.acquire(tokens)
+            try:
+                raw = await make_request()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = retry_after(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                if getattr(e, "status_code", None) == 429 and self.limiter is not None:
+                    self.limiter.pause(delay)
+                logger.warning(f"Request failed ({e}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            if self.limiter is not None:
+                self.limiter.update(raw.headers)
+            return raw.parse()
+
+    def close(self) -> None:
+        """Wait for submitted jobs, then stop the loop thread."""
+        for future in list(self._futures.values()):
+            try:
+                future.result()
+            except Exception:
+                pass
+        if self._loop is not None:
+            if self.on_close is not None:
+                asyncio.run_coroutine_threadsafe(self.on_close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop, self._thread, self._slots = None, None, None
+        self._futures = {}
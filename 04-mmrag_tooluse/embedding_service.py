@@ -0,0 +1,183 @@
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# (texts, model) -> one vector per text, in order
+Embedder = Callable[[List[str], str], List[List[float]]]
+
+
+def normalize_text(text: str) -> str:
+    """Newlines are replaced with spaces before embedding, as OpenAI recommends."""
+    return text.replace("\n", " ").strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap upper-bound-ish token estimate used only to size batches."""
+    return len(text) // 3 + 1
+
+
+class OpenAIEmbedder:
+    """Calls the embeddings endpoint with a whole batch per request."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def __call__(self, texts: List[str], model: str) -> List[List[float]]:
+        response = self.client.embeddings.create(input=texts, model=model)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class HashEmbedder:
+    """
+    Deterministic local stand-in for tests and offline runs: the same text always maps to the same
+    unit vector, and no network calls are made.
+    """
+
+    def __init__(self, dimensions: int = 1536):
+        self.dimensions = dimensions
+
+    def __call__(self, texts: List[str], model: str) -> List[List[float]]:
+        vectors = []
+        for text in texts:
+            values = []
+            counter = 0
+            while len(values) < self.dimensions:
+                block = hashlib.sha256(f"{model}\0{counter}\0{text}".encode("utf-8")).digest()
+                values.extend(byte / 127.5 - 1.0 for byte in block)
+                counter += 1
+            values = values[:self.dimensions]
+            norm = math.sqrt(sum(value * value for value in values)) or 1.0
+            vectors.append([value / norm for value in values])
+        return vectors
+
+
+class EmbeddingCache:
+    """On-disk float32 vectors keyed by (model, normalized text hash), stored in SQLite."""
+
+    def __init__(self, path: str):
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: Sequence[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit.
+            for start in range(0, len(hashes), 500):
+                chunk = list(hashes[start:start + 500])
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *chunk],
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]) -> None:
+        if not vectors:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model, key, array("f", vector).tobytes()) for key, vector in vectors.items()],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingService:
+    """
+    Embeds texts in as few requests as possible: repeated and cached texts are never sent, the rest
+    are packed into batches bounded by item count and estimated tokens, and batches run with bounded
+    concurrency. New vectors are written to the cache.
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        model: str,
+        cache: Optional[EmbeddingCache] = None,
+        max_batch_size: int = 256,
+        max_batch_tokens: int = 100_000,
+        max_concurrency: int = 4,
+    ):
+        self.embedder = embedder
+        self.model = model
+        self.cache = cache
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_batch_tokens = max(1, max_batch_tokens)
+        self.max_concurrency = max(1, max_concurrency)
+
+    def embed(self, text: str, model: Optional[str] = None) -> List[float]:
+        return self.embed_many([text], model)[0]
+
+    def embed_many(self, texts: Sequence[str], model: Optional[str] = None) -> List[List[float]]:
+        model = model or self.model
+        normalized = [normalize_text(text) for text in texts]
+        keys = [text_hash(text) for text in normalized]
+        unique: Dict[str, str] = dict(zip(keys, normalized))
+
+        vectors = self.cache.get_many(model, list(unique)) if self.cache else {}
+        missing = [key for key in unique if key not in vectors]
+        if missing:
+            fresh: Dict[str, List[float]] = {}
+            batches = self._batches([(key, unique[key]) for key in missing])
+            if len(batches) > 1 and self.max_concurrency > 1:
+                with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+                    results = list(executor.map(lambda batch: self._embed_batch(batch, model), batches))
+            else:
+                results = [self._embed_batch(batch, model) for batch in batches]
+            for result in results:
+                fresh.update(result)
+            if self.cache:
+                self.cache.put_many(model, fresh)
+            vectors.update(fresh)
+            logger.info(
+                f"Embedded {len(missing)} texts in {len(batches)} requests ({len(unique) - len(missing)} cached).")
+        return [vectors[key] for key in keys]
+
+    def _batches(self, items: List[tuple]) -> List[List[tuple]]:
+        batches: List[List[tuple]] = []
+        current: List[tuple] = []
+        tokens = 0
+        for key, text in items:
+            cost = estimate_tokens(text)
+            if current and (len(current) >= self.max_batch_size or tokens + cost > self.max_batch_tokens):
+                batches.append(current)
+                current, tokens = [], 0
+            current.append((key, text))
+            tokens += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, batch: List[tuple], model: str) -> Dict[str, List[float]]:
+        embeddings = self.embedder([text for _, text in batch], model)
+        # Round through float32 so fresh and cached vectors are identical.
+        return {key: array("f", embedding).tolist() for (key, _), embedding in zip(batch, embeddings)}
@@ -2,63 +2,78 @@ import os
 import json
 import sqlite3
 
+from query_service import QueryService
+from schema_definitions import schema_dict
 
-def create_tables(cursor):
+# Every parsed table has one row per (report_date, quarter); reloading a filing updates its rows.
+KEY_COLUMNS = ("report_date", "quarter")
+SQL_TYPES = {"number": "REAL", "integer": "INTEGER", "string": "TEXT", "boolean": "INTEGER"}
+
+
+def table_columns(schema):
     """
-    Create tables for Free Cash Flow data.
+    Return the (column name, SQL type) pairs of a table, derived from its JSON schema:
+    the report date followed by the properties of each data row.
     """
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS Free_Cash_Flow_Less_Equipment_Finance_Leases (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        report_date TEXT,
-        quarter TEXT,
-        operating_cash_flow REAL,
-        purchases_of_property_and_equipment REAL,
-        equipment_acquired_under_finance_leases REAL,
-        principal_repayments_of_other_finance_leases REAL,
-        principal_repayments_of_financing_obligations REAL,
-        free_cash_flow_less_equipment_finance_leases REAL
-    )
-    ''')
-
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS Free_Cash_Flow_Less_Principal_Repayments (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        report_date TEXT,
-        quarter TEXT,
-        operating_cash_flow REAL,
-        purchases_of_property_and_equipment REAL,
-        principal_repayments_of_finance_leases REAL,
-        principal_repayments_of_financing_obligations REAL,
-        free_cash_flow_less_principal_repayments REAL
-    )
-    ''')
-
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS Free_Cash_Flow_Reconciliation (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        report_date TEXT,
-        quarter TEXT,
-        operating_cash_flow REAL,
-        purchases_of_property_and_equipment REAL,
-        free_cash_flow REAL
-    )
-    ''')
-
-
-def ingest_json_files(json_folder_path, db_path):
+    properties = schema["json_schema"]["schema"]["properties"]
+    row_properties = properties["data"]["items"]["properties"]
+    columns = [("report_date", SQL_TYPES.get(properties["report_date"].get("type"), "TEXT"))]
+    for name, definition in row_properties.items():
+        columns.append((name, SQL_TYPES.get(definition.get("type"), "TEXT")))
+    return columns
+
+
+def create_tables(cursor, schemas=schema_dict):
     """
-    Ingest JSON files into the SQLite database.
+    Create a table for each schema, add columns that are new in the schema, and index it.
+    Existing duplicate rows are collapsed (keeping the latest) before the unique key is added.
     """
-    # Connect to the SQLite3 database
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    for table_name, schema in schemas.items():
+        columns = table_columns(schema)
+        column_sql = ",\n".join(f"    {name} {sql_type}" for name, sql_type in columns)
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {table_name} (\n"
+            f"    id INTEGER PRIMARY KEY AUTOINCREMENT,\n{column_sql}\n)")
+
+        existing = {row[1] for row in cursor.execute(f"PRAGMA table_info('{table_name}')")}
+        for name, sql_type in columns:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {name} {sql_type}")
+
+        unique_index = f"ux_{table_name}_report_date_quarter"
+        has_unique_index = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (unique_index,)).fetchone()
+        if not has_unique_index:
+            cursor.execute(f'''
+            DELETE FROM {table_name}
+            WHERE id NOT IN (SELECT MAX(id) FROM {table_name} GROUP BY report_date, quarter)
+            ''')
+            cursor.execute(
+                f"CREATE UNIQUE INDEX {unique_index} ON {table_name} (report_date, quarter)")
+        # report_date lookups use the unique index; quarter needs its own.
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS ix_{table_name}_quarter ON {table_name} (quarter)")
+
+
+def upsert_statement(table_name, columns):
+    names = [name for name, _ in columns]
+    updates = ", ".join(f"{name} = excluded.{name}" for name in names if name not in KEY_COLUMNS)
+    return f'''
+    INSERT INTO {table_name} ({", ".join(names)})
+    VALUES ({", ".join("?" * len(names))})
+    ON CONFLICT (report_date, quarter) DO UPDATE SET {updates}
+    '''
 
-    # Create tables
-    create_tables(cursor)
 
-    # Loop over all JSON files in the specified folder
-    for filename in os.listdir(json_folder_path):
+def read_table_rows(json_folder_path, schemas=schema_dict):
+    """
+    Read every parsed table JSON file in a folder and return {table name: [row tuple, ...]},
+    with values in table_columns order.
+    """
+    rows = {table_name: [] for table_name in schemas}
+    columns = {table_name: table_columns(schema) for table_name, schema in schemas.items()}
+
+    for filename in sorted(os.listdir(json_folder_path)):
         if filename.endswith(".json"):
             file_path = os.path.join(json_folder_path, filename)
 
@@ -70,113 +85,111 @@ def ingest_json_files(json_folder_path, db_path):
             report_date = data.get("report_date")
             records = data.get("data", [])
 
-            if title == "Free_Cash_Flow_Less_Equipment_Finance_Leases":
-                for record in records:
-                    cursor.execute('''
-                    INSERT INTO Free_Cash_Flow_Less_Equipment_Finance_Leases (
-                        report_date,
-                        quarter,
-                        operating_cash_flow,
-                        purchases_of_property_and_equipment,
-                        equipment_acquired_under_finance_leases,
-                        principal_repayments_of_other_finance_leases,
-                        principal_repayments_of_financing_obligations,
-                        free_cash_flow_less_equipment_finance_leases
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        report_date,
-                        record.get("quarter"),
-                        record.get("operating_cash_flow"),
-                        record.get("purchases_of_property_and_equipment"),
-                        record.get("equipment_acquired_under_finance_leases"),
-                        record.get(
-                            "principal_repayments_of_other_finance_leases"),
-                        record.get(
-                            "principal_repayments_of_financing_obligations"),
-                        record.get(
-                            "free_cash_flow_less_equipment_finance_leases")
-                    ))
-            elif title == "Free_Cash_Flow_Less_Principal_Repayments":
-                for record in records:
-                    cursor.execute('''
-                    INSERT INTO Free_Cash_Flow_Less_Principal_Repayments (
-                        report_date,
-                        quarter,
-                        operating_cash_flow,
-                        purchases_of_property_and_equipment,
-                        principal_repayments_of_finance_leases,
-                        principal_repayments_of_financing_obligations,
-                        free_cash_flow_less_principal_repayments
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        report_date,
-                        record.get("quarter"),
-                        record.get("operating_cash_flow"),
-                        record.get("purchases_of_property_and_equipment"),
-                        record.get("principal_repayments_of_finance_leases"),
-                        record.get(
-                            "principal_repayments_of_financing_obligations"),
-                        record.get("free_cash_flow_less_principal_repayments")
-                    ))
-            elif title == "Free_Cash_Flow_Reconciliation":
-                for record in records:
-                    cursor.execute('''
-                    INSERT INTO Free_Cash_Flow_Reconciliation (
-                        report_date,
-                        quarter,
-                        operating_cash_flow,
-                        purchases_of_property_and_equipment,
-                        free_cash_flow
-                    ) VALUES (?, ?, ?, ?, ?)
-                    ''', (
-                        report_date,
-                        record.get("quarter"),
-                        record.get("operating_cash_flow"),
-                        record.get("purchases_of_property_and_equipment"),
-                        record.get("free_cash_flow")
-                    ))
-            else:
+            if title not in schemas:
                 print(
                     f"Unknown title '{title}' in file '{filename}'. Skipping.")
+                continue
+
+            skipped = 0
+            for record in records:
+                if not report_date or not record.get("quarter"):
+                    skipped += 1
+                    continue
+                row = dict(record, report_date=report_date)
+                rows[title].append(tuple(row.get(name) for name, _ in columns[title]))
+            if skipped:
+                print(
+                    f"Skipped {skipped} rows without a report date or quarter in file '{filename}'.")
+
+    return rows
 
-    # Commit changes and close connection
-    conn.commit()
-    conn.close()
 
+def ingest_json_files(json_folder_path, db_path, batch_size=5000):
+    """
+    Ingest JSON files into the SQLite database.
 
-def execute_query(db_path, query, params=()):
+    Rows are upserted on (report_date, quarter) with executemany, `batch_size` rows per
+    transaction, so reloading the same files leaves the database unchanged. The load runs with
+    WAL and synchronous=NORMAL; the database's journal mode is restored afterwards so the file
+    stays self-contained. Returns the number of rows written.
+    """
+    rows = read_table_rows(json_folder_path)
+
+    # Connect to the SQLite3 database
+    conn = sqlite3.connect(db_path)
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        with conn:
+            create_tables(conn.cursor())
+
+        written = 0
+        for table_name, table_rows in rows.items():
+            statement = upsert_statement(table_name, table_columns(schema_dict[table_name]))
+            for start in range(0, len(table_rows), batch_size):
+                with conn:
+                    conn.executemany(statement, table_rows[start:start + batch_size])
+            written += len(table_rows)
+
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        return written
+    finally:
+        conn.close()
+
+
+_query_services = {}
+
+
+def get_query_service(db_path):
+    """Return the shared read-only QueryService for a database file."""
+    db_path = os.path.abspath(db_path)
+    service = _query_services.get(db_path)
+    if service is None:
+        service = _query_services.setdefault(db_path, QueryService(db_path))
+    return service
+
+
+def execute_query(db_path, query, params=(), max_rows=None):
     """
     Execute a SQL query and return the results.
 
+    Reads go through a pooled, read-only QueryService, so repeated and concurrent queries reuse
+    connections, prepared statements and cached results. INSERT/UPDATE/DELETE statements use a
+    separate read-write connection and are committed.
+
     Parameters:
     db_path (str): Path to the SQLite database file.
     query (str): SQL query to be executed.
     params (tuple): Parameters to be passed to the query (default is an empty tuple).
+    max_rows (int): Maximum number of rows to return (default is every row). Limited reads are cached.
 
     Returns:
     list: List of rows returned by the query.
     """
-    try:
-        # Connect to the SQLite database
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+    if query.strip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')):
+        conn = None
+        try:
+            conn = sqlite3.connect(db_path)
+            with conn:
+                return conn.execute(query, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"An error occurred: {e}")
+            return []
+        finally:
+            if conn:
+                conn.close()
 
-        # Execute the query with parameters
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-
-        # Commit if it's an INSERT/UPDATE/DELETE query
-        if query.strip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')):
-            conn.commit()
-
-        return results
+    try:
+        service = get_query_service(db_path)
+        if max_rows is None:
+            return list(service.stream(query, params, max_rows=None))
+        return service.execute(query, params, max_rows)
     except sqlite3.Error as e:
         print(f"An error occurred: {e}")
         return []
-    finally:
-        # Close the connection
-        if conn:
-            conn.close()
 
 
 # Example usage
@@ -185,7 +198,8 @@ if __name__ == "__main__":
     db_path = "earnings.db"
 
     # Ingest JSON files into the database
-    ingest_json_files(json_folder_path, db_path)
+    written = ingest_json_files(json_folder_path, db_path)
+    print(f"Upserted {written} rows.")
 
     # Example query: Retrieve all records from Free_Cash_Flow_Reconciliation where free_cash_flow > 25000
     query = '''
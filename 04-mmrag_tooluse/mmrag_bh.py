@@ -3,19 +3,20 @@
 import os
 import re
 import base64
-import io
 import json
 import logging
 import argparse
-from typing import Dict, List, Tuple, Any
-from PIL import Image
-import fitz  # PyMuPDF
+from typing import Callable, Dict, List, Optional, Tuple, Any
 from concurrent.futures import ThreadPoolExecutor
 from schema_definitions import schema_dict
-from database import get_database_info
 from config import TRIAGE_SYSTEM_PROMPT
-import sqlite3
-from openai import OpenAI
+from page_manifest import PageManifest, file_digest, page_key, point_id
+from embedding_service import EmbeddingCache, EmbeddingService, OpenAIEmbedder
+from page_store import PageImageStore
+from page_renderer import RenderedPage, render_pdf, stream_pdf_pages
+from analysis_runner import AsyncJobRunner, Checkpoint, RateLimiter
+from query_service import QueryService
+from openai import AsyncOpenAI, OpenAI
 import qdrant_client
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
@@ -23,6 +24,7 @@ from qdrant_client.http.models import VectorParams, Distance
 
 # %%
 
+# pip install -r requirements.txt  (PyMuPDF provides the `fitz` module used by page_renderer.py)
 # docker run -d -p 6333:6333 qdrant/qdrant
 
 # Set up logging
@@ -35,72 +37,116 @@ logger = logging.getLogger(__name__)
 
 class Config:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # e.g. http://localhost:8000/v1 for mock_openai_server.py
     QDRANT_HOST = 'localhost'
     QDRANT_PORT = 6333
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")  # "local" searches an in-process index instead
+    LOCAL_VECTOR_INDEX_PATH = "./vector_index"
     SLIDES_FOLDER = "./earnings_reports_sample"
     TABLE_JSON_FOLDER = "./table_json"
-    BASE64_OUTPUT_FOLDER = "./base64_images"
+    DATABASE_PATH = "./earnings.db"
+    DATABASE_POOL_SIZE = 4
+    DATABASE_QUERY_TIMEOUT = 5.0  # seconds
+    DATABASE_MAX_ROWS = 200
+    PAGE_IMAGE_FOLDER = "./page_images"
+    PAGE_IMAGE_CACHE_SIZE = 64
+    RENDER_WORKERS = None  # one process per CPU
+    RENDER_QUEUE_DEPTH = 16  # rendered pages waiting for the main process, at most
+    MANIFEST_PATH = "./index_manifest.json"
     COLLECTION_NAME = "image_embeddings"
     EMBEDDING_MODEL = "text-embedding-3-small"
+    EMBEDDING_CACHE_PATH = "./embedding_cache.sqlite3"
+    EMBEDDING_BATCH_SIZE = 256
+    EMBEDDING_MAX_CONCURRENCY = 4
     GPT_MODEL = "gpt-4o-2024-08-06"
+    # Vision analysis: starting limits, corrected from the API's rate-limit headers at run time
+    ANALYSIS_CONCURRENCY = 8
+    ANALYSIS_REQUESTS_PER_MINUTE = 500
+    ANALYSIS_TOKENS_PER_MINUTE = 30_000
+    ANALYSIS_TOKENS_PER_REQUEST = 2_000  # estimate for one high-detail slide plus prompt and output
+    ANALYSIS_MAX_RETRIES = 6
+    ANALYSIS_CHECKPOINT_PATH = "./analysis_checkpoint.jsonl"
 
 
 # Initialize clients
 api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
-qdrant_client = QdrantClient(host=Config.QDRANT_HOST, port=Config.QDRANT_PORT)
-
-
-def encode_image(image: Image) -> str:
-    """
-    Encodes a PIL Image into a base64 string.
-    """
-    buffered = io.BytesIO()
-    image.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-    return img_str
+client = OpenAI(api_key=api_key, base_url=Config.OPENAI_BASE_URL)
+if Config.VECTOR_BACKEND == "local":
+    # Same client interface, served from memory-mapped files; no Qdrant server needed.
+    from local_vector_index import LocalQdrantClient
+    qdrant_client = LocalQdrantClient(
+        Config.LOCAL_VECTOR_INDEX_PATH, index_fields=["image_category", "quarter_info"])
+else:
+    qdrant_client = QdrantClient(host=Config.QDRANT_HOST, port=Config.QDRANT_PORT)
+# Set `embedding_service.embedder` to a `HashEmbedder` to embed deterministically without API calls.
+embedding_service = EmbeddingService(
+    OpenAIEmbedder(client),
+    Config.EMBEDDING_MODEL,
+    cache=EmbeddingCache(Config.EMBEDDING_CACHE_PATH),
+    max_batch_size=Config.EMBEDDING_BATCH_SIZE,
+    max_concurrency=Config.EMBEDDING_MAX_CONCURRENCY,
+)
+page_store = PageImageStore(Config.PAGE_IMAGE_FOLDER, Config.PAGE_IMAGE_CACHE_SIZE)
 
 
-def pdf_to_base64_images(pdf_path: str) -> List[str]:
+def pdf_to_page_images(pdf_path: str) -> List[Tuple[str, bytes]]:
     """
-    Converts each page of a PDF into a base64-encoded PNG image.
+    Converts each page of a PDF into a (pixel digest, PNG bytes) pair in this process.
     """
     try:
-        pdf_document = fitz.open(pdf_path)
-        base64_images = []
-
-        for page_num in range(len(pdf_document)):
-            page = pdf_document.load_page(page_num)
-            pix = page.get_pixmap()
-            img = Image.open(io.BytesIO(pix.tobytes()))
-            base64_image = encode_image(img)
-            base64_images.append(base64_image)
-
-        logger.info(f"Processed {len(base64_images)} pages from {pdf_path}")
-        return base64_images
+        pages = render_pdf(pdf_path)
+        logger.info(f"Processed {len(pages)} pages from {pdf_path}")
+        return pages
 
     except Exception as e:
         logger.error(f"Error processing PDF {pdf_path}: {e}")
         return []
 
 
-def save_base64_image(base64_image: str, folder: str, filename: str) -> str:
+def pdf_to_base64_images(pdf_path: str) -> List[str]:
     """
-    Saves a base64 encoded image to a file and returns the file path.
+    Converts each page of a PDF into a base64-encoded PNG image.
     """
-    os.makedirs(folder, exist_ok=True)
-    file_path = os.path.join(folder, filename)
-    with open(file_path, "w") as f:
-        f.write(base64_image)
-    return file_path
+    return [base64.b64encode(image).decode("utf-8") for _, image in pdf_to_page_images(pdf_path)]
 
 
-def process_folder(folder: str, base64_output_folder: str) -> List[Dict[str, str]]:
+def load_page_base64(image_ref: str) -> str:
+    """
+    Returns the base64 PNG for a page: a key in the page image store, or the path of a
+    base64 .txt file written by older versions of this script.
     """
-    Processes all PDFs in a folder and extracts base64 images along with their quarter information.
+    if image_ref in page_store:
+        return page_store.get_base64(image_ref)
+    with open(image_ref, 'r') as f:
+        return f.read()
+
+
+def process_folder(
+    folder: str,
+    image_store: PageImageStore,
+    manifest: Optional[PageManifest] = None,
+    on_page: Optional[Callable[[Dict[str, str]], None]] = None
+) -> List[Dict[str, str]]:
+    """
+    Processes all PDFs in a folder, stores their page images and returns each page's key
+    along with its quarter information.
+
+    PDFs are rendered in a process pool and each page is passed to `on_page` as soon as it is
+    stored, so analysis can start while other pages are still rendering. With a manifest, PDFs
+    whose contents are unchanged (and whose page images are still stored) are not rendered
+    again; their pages are listed from the manifest.
     """
-    images_data = []
     quarter_pattern = r'Q[1-4]\d{2}'
+    documents = []
+    page_keys: Dict[str, List[str]] = {}
+    to_render = []
+
+    def page_record(pdf_path: str, quarter_info: str, key: str) -> Dict[str, str]:
+        return {
+            'quarter_info': quarter_info,
+            'original_pdf_path': pdf_path,
+            'page_key': key
+        }
 
     for file in os.listdir(folder):
         if file.endswith(".pdf"):
@@ -108,23 +154,58 @@ def process_folder(folder: str, base64_output_folder: str) -> List[Dict[str, str
             if match:
                 quarter_info = match.group()
                 pdf_path = os.path.join(folder, file)
-                base64_images = pdf_to_base64_images(pdf_path)
-                for i, base64_image in enumerate(base64_images):
-                    base64_filename = f"{os.path.splitext(file)[0]}_page_{i}.txt"
-                    base64_path = save_base64_image(
-                        base64_image, base64_output_folder, base64_filename)
-                    images_data.append({
-                        'quarter_info': quarter_info,
-                        'base64_image_path': base64_path,
-                        'original_pdf_path': pdf_path
-                    })
+                sha256 = file_digest(pdf_path) if manifest is not None else None
+                documents.append((pdf_path, quarter_info, sha256))
+
+                keys = manifest.unchanged_pages(pdf_path, sha256) if manifest is not None else None
+                if keys is None or not all(key in image_store for key in keys):
+                    to_render.append(pdf_path)
+                    continue
+                logger.info(f"Skipping unchanged PDF {pdf_path} ({len(keys)} pages)")
+                page_keys[pdf_path] = keys
+                if on_page:
+                    for key in keys:
+                        on_page(page_record(pdf_path, quarter_info, key))
             else:
                 logger.warning(
                     f"No quarter information found in filename: {file}")
-    return images_data
+
+    quarters = {pdf_path: quarter_info for pdf_path, quarter_info, _ in documents}
+    digests = {pdf_path: sha256 for pdf_path, _, sha256 in documents}
+    rendered: Dict[str, Dict[int, str]] = {pdf_path: {} for pdf_path in to_render}
+    for event in stream_pdf_pages(to_render, Config.RENDER_WORKERS, Config.RENDER_QUEUE_DEPTH):
+        pdf_path = event.pdf_path
+        if isinstance(event, RenderedPage):
+            key = page_key(event.digest, quarters[pdf_path])
+            image_store.put(key, event.image)
+            rendered[pdf_path][event.page_number] = key
+            if on_page:
+                on_page(page_record(pdf_path, quarters[pdf_path], key))
+            continue
+
+        keys = [rendered[pdf_path][number] for number in sorted(rendered[pdf_path])]
+        page_keys[pdf_path] = keys
+        if event.error is not None:
+            logger.error(f"Error processing PDF {pdf_path}: {event.error}")
+            continue
+        logger.info(f"Processed {len(keys)} pages from {pdf_path}")
+        if manifest is not None and keys:
+            manifest.set_document(pdf_path, digests[pdf_path], keys)
+
+    image_store.flush()
+    if manifest is not None:
+        manifest.retain_documents(quarters)
+    return [
+        page_record(pdf_path, quarter_info, key)
+        for pdf_path, quarter_info, _ in documents
+        for key in page_keys.get(pdf_path, [])
+    ]
 
 
-def analyze_image(base64_image: str, quarter_info: str) -> Dict:
+def analysis_request(base64_image: str, quarter_info: str) -> Dict:
+    """
+    Builds the chat completion arguments that classify a page and summarize its graphs.
+    """
     system_prompt = f"""
     Analyze the image below and determine if it contains graphs or tabular data. 
 
@@ -142,7 +223,7 @@ def analyze_image(base64_image: str, quarter_info: str) -> Dict:
 
     The quarter information is: {quarter_info}. Please use that as the value for the JSON key "quarter_info".
     """
-    response = client.chat.completions.create(
+    return dict(
         model=Config.GPT_MODEL,
         response_format={
             "type": "json_schema",
@@ -176,21 +257,25 @@ def analyze_image(base64_image: str, quarter_info: str) -> Dict:
         ],
         temperature=0.0,
     )
+
+
+def analyze_image(base64_image: str, quarter_info: str) -> Dict:
+    response = client.chat.completions.create(**analysis_request(base64_image, quarter_info))
     response_string = response.choices[0].message.content
     response_dict = json.loads(response_string)
     return response_dict
 
 
-def parse_table(base64_image: str, table_title: str, report_date: str) -> Dict:
+def table_request(base64_image: str, table_title: str, report_date: str) -> Optional[Dict]:
     """
-    Parses a table from an image, formats it according to a predefined JSON schema,
-    and saves the resulting JSON to the TABLE_JSON_FOLDER.
+    Builds the chat completion arguments that extract a table into its predefined JSON schema,
+    or returns None if there is no schema for the table title.
     """
     relevant_schema = schema_dict.get(table_title)
 
     if relevant_schema is None:
         logger.warning(f"No schema found for table title: {table_title}")
-        return {}
+        return None
 
     # Convert the schema to a formatted JSON string
     system_prompt = f"""
@@ -223,23 +308,36 @@ def parse_table(base64_image: str, table_title: str, report_date: str) -> Dict:
         }
     ]
 
-    try:
-        response = client.chat.completions.create(
-            model=Config.GPT_MODEL,
-            response_format=relevant_schema,
-            messages=messages,
-            temperature=0.0
-        )
+    return dict(
+        model=Config.GPT_MODEL,
+        response_format=relevant_schema,
+        messages=messages,
+        temperature=0.0
+    )
 
-        response_json = json.loads(response.choices[0].message.content)
 
-        os.makedirs(Config.TABLE_JSON_FOLDER, exist_ok=True)
-        filename = f"{table_title}_{report_date}.json".replace(" ", "_")
-        file_path = os.path.join(Config.TABLE_JSON_FOLDER, filename)
-        with open(file_path, 'w') as json_file:
-            json.dump(response_json, json_file, indent=4)
-        logger.info(f"Saved parsed table JSON to {file_path}")
+def save_table_json(response_json: Dict, table_title: str, report_date: str) -> None:
+    os.makedirs(Config.TABLE_JSON_FOLDER, exist_ok=True)
+    filename = f"{table_title}_{report_date}.json".replace(" ", "_")
+    file_path = os.path.join(Config.TABLE_JSON_FOLDER, filename)
+    with open(file_path, 'w') as json_file:
+        json.dump(response_json, json_file, indent=4)
+    logger.info(f"Saved parsed table JSON to {file_path}")
+
+
+def parse_table(base64_image: str, table_title: str, report_date: str) -> Dict:
+    """
+    Parses a table from an image, formats it according to a predefined JSON schema,
+    and saves the resulting JSON to the TABLE_JSON_FOLDER.
+    """
+    request = table_request(base64_image, table_title, report_date)
+    if request is None:
+        return {}
 
+    try:
+        response = client.chat.completions.create(**request)
+        response_json = json.loads(response.choices[0].message.content)
+        save_table_json(response_json, table_title, report_date)
         return response_json
     except Exception as e:
         logger.error(f"Error in parse_table: {e}")
@@ -250,16 +348,15 @@ def process_single_image(image_data: Dict[str, str]) -> Dict:
     """
     Processes a single image: analyzes it and, if it's a table, parses it.
     """
-    with open(image_data['base64_image_path'], 'r') as f:
-        base64_image = f.read()
+    base64_image = page_store.get_base64(image_data['page_key'])
     quarter_info = image_data['quarter_info']
     analysis = analyze_image(base64_image, quarter_info)
 
     if not analysis:
         return {}
 
-    analysis['base64_image_path'] = image_data['base64_image_path']
     analysis['original_pdf_path'] = image_data['original_pdf_path']
+    analysis['page_key'] = image_data['page_key']
 
     if analysis.get('image_category') == 'table':
         table_title = analysis['content_output']
@@ -278,12 +375,95 @@ def process_images_concurrently(images_data: List[Dict[str, str]]) -> List[Dict]
     return results
 
 
+def analysis_complete(analysis: Optional[Dict]) -> bool:
+    """
+    A page analysis is kept only if it succeeded, including the table parse for table pages;
+    anything else is retried on the next run.
+    """
+    if not analysis:
+        return False
+    return analysis.get('image_category') != 'table' or bool(analysis.get('parsed_table_data'))
+
+
+async def create_completion_async(runner: AsyncJobRunner, llm: AsyncOpenAI, request: Dict):
+    return await runner.request(
+        lambda: llm.chat.completions.with_raw_response.create(**request),
+        tokens=Config.ANALYSIS_TOKENS_PER_REQUEST)
+
+
+async def parse_table_async(runner: AsyncJobRunner, llm: AsyncOpenAI, base64_image: str, table_title: str, report_date: str) -> Dict:
+    request = table_request(base64_image, table_title, report_date)
+    if request is None:
+        return {}
+
+    try:
+        response = await create_completion_async(runner, llm, request)
+        response_json = json.loads(response.choices[0].message.content)
+        save_table_json(response_json, table_title, report_date)
+        return response_json
+    except Exception as e:
+        logger.error(f"Error in parse_table: {e}")
+        return {}
+
+
+async def process_single_image_async(runner: AsyncJobRunner, llm: AsyncOpenAI, image_data: Dict[str, str]) -> Dict:
+    """
+    Async counterpart of process_single_image whose API calls are rate limited and retried by the runner.
+    """
+    base64_image = page_store.get_base64(image_data['page_key'])
+    quarter_info = image_data['quarter_info']
+    response = await create_completion_async(runner, llm, analysis_request(base64_image, quarter_info))
+    analysis = json.loads(response.choices[0].message.content)
+
+    if not analysis:
+        return {}
+
+    analysis['original_pdf_path'] = image_data['original_pdf_path']
+    analysis['page_key'] = image_data['page_key']
+
+    if analysis.get('image_category') == 'table':
+        table_title = analysis['content_output']
+        analysis['parsed_table_data'] = await parse_table_async(
+            runner, llm, base64_image, table_title, quarter_info)
+
+    return analysis
+
+
+def make_analysis_runner() -> AsyncJobRunner:
+    """
+    Page analysis runner: bounded concurrency, rate limiting driven by response headers,
+    exponential backoff, and a per-page checkpoint so an interrupted run resumes where it stopped.
+    """
+    # Retries are done by the runner, which also knows about the shared rate limit.
+    llm = AsyncOpenAI(api_key=api_key, base_url=Config.OPENAI_BASE_URL, max_retries=0)
+    runner = AsyncJobRunner(
+        lambda image_data: process_single_image_async(runner, llm, image_data),
+        limiter=RateLimiter(Config.ANALYSIS_REQUESTS_PER_MINUTE, Config.ANALYSIS_TOKENS_PER_MINUTE),
+        concurrency=Config.ANALYSIS_CONCURRENCY,
+        max_retries=Config.ANALYSIS_MAX_RETRIES,
+        checkpoint=Checkpoint(Config.ANALYSIS_CHECKPOINT_PATH),
+        is_complete=analysis_complete,
+        on_close=llm.close,
+    )
+    return runner
+
+
 def get_embedding(text: str, model: str = Config.EMBEDDING_MODEL) -> List[float]:
     """
     Retrieves the embedding for the provided text using OpenAI's embedding model.
+    Served from the embedding cache when the text has been embedded before.
+    """
+    return embedding_service.embed(text, model)
+
+
+def get_qdrant_vector_size(collection_name: str) -> Optional[int]:
     """
-    text = text.replace("\n", " ")
-    return client.embeddings.create(input=[text], model=model).data[0].embedding
+    Returns the vector size of an existing Qdrant collection, or None if the collection does not exist.
+    """
+    existing = {collection.name for collection in qdrant_client.get_collections().collections}
+    if collection_name not in existing:
+        return None
+    return qdrant_client.get_collection(collection_name).config.params.vectors.size
 
 
 def create_qdrant_collection(collection_name: str, vector_size: int, distance_metric: str = 'Cosine'):
@@ -331,6 +511,18 @@ def insert_data_to_qdrant(
         f"Inserted {len(points)} records into collection '{collection_name}'.")
 
 
+def delete_points_from_qdrant(client: QdrantClient, collection_name: str, ids: List[str]):
+    """
+    Deletes the points with the given ids from the specified Qdrant collection.
+    """
+    client.delete(
+        collection_name=collection_name,
+        points_selector=models.PointIdsList(points=ids)
+    )
+    logger.info(
+        f"Deleted {len(ids)} records from collection '{collection_name}'.")
+
+
 def query_qdrant(
     query: str,
     collection_name: str,
@@ -353,121 +545,192 @@ def query_qdrant(
         payload = result.payload
         title = f"{payload['image_category']} - {payload['quarter_info']}"
         text = payload['content_output']
-        base64_image_path = payload['base64_image_path']
+        # Points indexed before the page image store carry a base64 file path instead of a page key.
+        image_ref = payload.get('page_key') or payload['base64_image_path']
         original_pdf_path = payload['original_pdf_path']
-        output.append((title, text, base64_image_path, original_pdf_path))
+        output.append((title, text, image_ref, original_pdf_path))
 
     return output
 
 
-def ask_database(conn, query):
+def ask_database(query):
     """Function to query SQLite database with a provided SQL query."""
     try:
-        results = str(conn.execute(query).fetchall())
+        rows = query_service.execute(query)
+        results = str(list(rows))
+        if rows.truncated:
+            results += f"\n(only the first {len(rows)} rows are shown; refine the query to narrow the result)"
     except Exception as e:
         results = f"query failed with error: {e}"
     return results
 
 
-conn = sqlite3.connect("./earnings.db")
-print("Opened database successfully")
-
-database_schema_dict = get_database_info(conn)
-database_schema_string = "\n".join(
-    [
-        f"Table: {table['table_name']}\nColumns: {', '.join(table['column_names'])}"
-        for table in database_schema_dict
-    ]
+# Read-only and pooled: tool queries can run concurrently, and cannot modify the database.
+query_service = QueryService(
+    Config.DATABASE_PATH,
+    pool_size=Config.DATABASE_POOL_SIZE,
+    timeout=Config.DATABASE_QUERY_TIMEOUT,
+    max_rows=Config.DATABASE_MAX_ROWS,
 )
 
-TOOLS = [
-    {
-        "type": "function",
-        "function": {
-            "name": "ask_database",
-            "description": "Use this function to retrieve structured financial data from the SQL database. Input should be a fully formed SQL query.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": f"""
-                            SQL query extracting the necessary information to answer the user's question.
-                            The SQL query should be written using the following database schema:
-                            {database_schema_string}
-                            Ensure the query is syntactically correct and returns the data needed to fully address the user's request.
-                            The query should be returned in plain text, not in JSON.
-                        """,
-                    }
-                },
-                "required": ["query"],
-                "additionalProperties": False,
-            },
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "query_qdrant",
-            "description": "Use this function to handle queries that require semantic understanding or retrieval from unstructured data sources using vector embeddings. Suitable for complex questions, trend analyses, and contextual information not directly available in the SQL database.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "A detailed and clear version of the user's original query capturing the intent and context of the information being sought.",
-                    },
-                    "filter": {
-                        "type": "string",
-                        "description": "Optional. Specific keywords or phrases to narrow down the search results for more precise retrieval. Should consist of 2 or 3 relevant words. Leave empty if no specific filter is needed.",
+
+def get_database_schema_string() -> str:
+    database_schema_dict = query_service.schema()
+    return "\n".join(
+        [
+            f"Table: {table['table_name']}\nColumns: {', '.join(table['column_names'])}"
+            for table in database_schema_dict
+        ]
+    )
+
+
+def get_tools() -> List[Dict]:
+    """
+    Tool definitions for the triage model. Built on first use rather than at import, since the
+    ask_database description embeds the database schema.
+    """
+    database_schema_string = get_database_schema_string()
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "ask_database",
+                "description": "Use this function to retrieve structured financial data from the SQL database. Input should be a fully formed SQL query.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": f"""
+                                SQL query extracting the necessary information to answer the user's question.
+                                The SQL query should be written using the following database schema:
+                                {database_schema_string}
+                                Ensure the query is syntactically correct and returns the data needed to fully address the user's request.
+                                The query should be returned in plain text, not in JSON.
+                            """,
+                        }
                     },
-                    "top_k": {
-                        "type": "integer",
-                        "description": "Optional. The number of top relevant results to retrieve. Use higher numbers (e.g., 50) for broader queries requiring extensive information. Defaults to 10 if not specified.",
-                        "default": 1,
+                    "required": ["query"],
+                    "additionalProperties": False,
+                },
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "query_qdrant",
+                "description": "Use this function to handle queries that require semantic understanding or retrieval from unstructured data sources using vector embeddings. Suitable for complex questions, trend analyses, and contextual information not directly available in the SQL database.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": "A detailed and clear version of the user's original query capturing the intent and context of the information being sought.",
+                        },
+                        "filter": {
+                            "type": "string",
+                            "description": "Optional. Specific keywords or phrases to narrow down the search results for more precise retrieval. Should consist of 2 or 3 relevant words. Leave empty if no specific filter is needed.",
+                        },
+                        "top_k": {
+                            "type": "integer",
+                            "description": "Optional. The number of top relevant results to retrieve. Use higher numbers (e.g., 50) for broader queries requiring extensive information. Defaults to 10 if not specified.",
+                            "default": 1,
+                        },
                     },
+                    "required": ["query"],
+                    "additionalProperties": False,
                 },
-                "required": ["query"],
-                "additionalProperties": False,
-            },
+            }
         }
-    }
-]
+    ]
 
 
 class RAGSystem:
     def __init__(self):
         self.collection_name = Config.COLLECTION_NAME
 
-    def process_folder(self):
+    def process_folder(self, manifest: Optional[PageManifest] = None, on_page=None):
         images_data = process_folder(
-            Config.SLIDES_FOLDER, Config.BASE64_OUTPUT_FOLDER)
+            Config.SLIDES_FOLDER, page_store, manifest, on_page)
         if not images_data:
             logger.info("No images to process.")
             return None
         return images_data
 
-    def analyze_images(self, images_data):
-        image_categorizations = process_images_concurrently(images_data)
-        logger.info(f"Processed {len(image_categorizations)} images.")
-        return [item for item in image_categorizations if item]
-
-    def prepare_data_for_indexing(self, image_categorizations):
+    def analyze_images(self, images_data, manifest: Optional[PageManifest] = None,
+                       runner: Optional[AsyncJobRunner] = None):
+        if manifest is None:
+            image_categorizations = process_images_concurrently(images_data)
+            logger.info(f"Processed {len(image_categorizations)} images.")
+            return [item for item in image_categorizations if item]
+
+        # Only pages the manifest has no analysis for are sent to the model.
+        pending = {}
+        for image_data in images_data:
+            key = image_data['page_key']
+            if manifest.analysis(key) is None and key not in pending:
+                pending[key] = image_data
+        if pending:
+            # Pages already submitted while rendering are awaited, not re-submitted.
+            if runner is not None:
+                analyses = runner.map(pending)
+            else:
+                analyses = dict(zip(pending, process_images_concurrently(list(pending.values()))))
+            for key, analysis in analyses.items():
+                # Leave failed pages (including tables that did not parse) out so the next run retries them.
+                if analysis_complete(analysis):
+                    manifest.set_analysis(key, analysis)
+            manifest.save()
+        logger.info(
+            f"Analyzed {len(pending)} new or changed pages; reused {len(images_data) - len(pending)} from the manifest.")
+
+        image_categorizations = []
+        for image_data in images_data:
+            analysis = manifest.analysis(image_data['page_key'])
+            if analysis:
+                item = dict(
+                    analysis,
+                    original_pdf_path=image_data['original_pdf_path'],
+                    page_key=image_data['page_key'])
+                item.pop('base64_image_path', None)
+                image_categorizations.append(item)
+        return image_categorizations
+
+    def prepare_data_for_indexing(self, image_categorizations, manifest: Optional[PageManifest] = None):
         non_table_images = [item for item in image_categorizations if item.get(
             'image_category') != 'table']
+        if manifest is not None:
+            # Only pages without a point in the collection, once each.
+            pending = {}
+            for item in non_table_images:
+                key = item['page_key']
+                if not manifest.is_indexed(key) and key not in pending:
+                    pending[key] = item
+            non_table_images = list(pending.values())
         if not non_table_images:
             logger.info("No non-table images to process.")
             return None, None
 
         texts = [item['content_output'] for item in non_table_images]
-        embeddings = [get_embedding(text) for text in texts]
+        if manifest is None:
+            embeddings = embedding_service.embed_many(texts)
+        else:
+            embeddings = [manifest.embedding(item['page_key'], Config.EMBEDDING_MODEL)
+                          for item in non_table_images]
+            missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+            if missing:
+                fresh = embedding_service.embed_many([texts[i] for i in missing])
+                for i, embedding in zip(missing, fresh):
+                    embeddings[i] = embedding
+                    manifest.set_embedding(
+                        non_table_images[i]['page_key'], embedding, Config.EMBEDDING_MODEL)
         payloads = [
             {
                 "image_category": item['image_category'],
                 "content_output": item['content_output'],
                 "quarter_info": item['quarter_info'],
-                "base64_image_path": item['base64_image_path'],
-                "original_pdf_path": item['original_pdf_path']
+                "original_pdf_path": item['original_pdf_path'],
+                "page_key": item['page_key']
             }
             for item in non_table_images
         ]
@@ -479,6 +742,39 @@ class RAGSystem:
         insert_data_to_qdrant(
             qdrant_client, self.collection_name, embeddings, payloads)
 
+    def sync_collection(self, image_categorizations, manifest: PageManifest, stale_keys: List[str], rebuild: bool = False):
+        """
+        Upserts points for pages that are not in the collection yet and deletes the points of pages
+        that are gone. The collection is only recreated when it is missing, its vector size changed,
+        or a rebuild is requested.
+        """
+        vector_size = None if rebuild else get_qdrant_vector_size(self.collection_name)
+        if vector_size is None:
+            rebuild = True
+            manifest.mark_all_unindexed()
+        embeddings, payloads = self.prepare_data_for_indexing(image_categorizations, manifest)
+
+        if not rebuild and embeddings and len(embeddings[0]) != vector_size:
+            logger.info(f"Vector size changed from {vector_size}; rebuilding '{self.collection_name}'.")
+            rebuild = True
+            manifest.mark_all_unindexed()
+            embeddings, payloads = self.prepare_data_for_indexing(image_categorizations, manifest)
+
+        if rebuild:
+            if not embeddings:
+                logger.warning("No embeddings or payloads generated for indexing.")
+                return
+            create_qdrant_collection(self.collection_name, len(embeddings[0]))
+        elif stale_keys:
+            delete_points_from_qdrant(
+                qdrant_client, self.collection_name, [point_id(key) for key in stale_keys])
+
+        if embeddings:
+            keys = [payload['page_key'] for payload in payloads]
+            insert_data_to_qdrant(
+                qdrant_client, self.collection_name, embeddings, payloads, ids=[point_id(key) for key in keys])
+            manifest.mark_indexed(keys)
+
     def query(self, query_text: str, top_k: int = 1) -> List[Tuple[str, str, str, str]]:
         return query_qdrant(query_text, top_k)
 
@@ -491,9 +787,8 @@ class RAGSystem:
             {"role": "user", "content": [{"type": "text", "text": query}]}
         ]
 
-        for title, text, base64_image_path, _ in retrieved_results:
-            with open(base64_image_path, 'r') as f:
-                base64_image = f.read()
+        for title, text, image_ref, _ in retrieved_results:
+            base64_image = load_page_base64(image_ref)
 
             messages.append({
                 "role": "user",
@@ -514,23 +809,38 @@ class RAGSystem:
         return response.choices[0].message.content
 
 
-def process_and_index_data():
+def process_and_index_data(full_rebuild: bool = False):
     """
     Processes PDFs, extracts images, analyzes them, generates embeddings, and indexes them into Qdrant.
+
+    Work is recorded in a manifest keyed by PDF and page content hash, so a re-run only renders
+    changed PDFs, only analyzes and embeds new pages, and only upserts or deletes the points that
+    changed. The collection is rebuilt from the manifest when there is no manifest yet or
+    `full_rebuild` is set.
     """
+    manifest = PageManifest.load(Config.MANIFEST_PATH)
+    rebuild = full_rebuild or not manifest.documents
     rag_system = RAGSystem()
-    images_data = rag_system.process_folder()
-    if images_data:
-        image_categorizations = rag_system.analyze_images(images_data)
-        embeddings, payloads = rag_system.prepare_data_for_indexing(
-            image_categorizations)
-        if embeddings and payloads:
-            rag_system.create_and_populate_collection(embeddings, payloads)
-            logger.info("Data processing and indexing completed successfully.")
-        else:
-            logger.warning("No embeddings or payloads generated for indexing.")
-    else:
-        logger.warning("No images data found for processing.")
+    with make_analysis_runner() as runner:
+        def start_analysis(image_data):
+            # Called as each page is stored, so analysis overlaps with rendering.
+            if manifest.analysis(image_data['page_key']) is None:
+                runner.submit(image_data['page_key'], image_data)
+
+        images_data = rag_system.process_folder(manifest, on_page=start_analysis)
+        if not images_data:
+            logger.warning("No images data found for processing.")
+        image_categorizations = rag_system.analyze_images(
+            images_data, manifest, runner) if images_data else []
+    # Every finished analysis is in the saved manifest now.
+    runner.checkpoint.clear()
+    stale_keys = manifest.prune_pages()
+    dropped = page_store.compact(manifest.referenced_pages())
+    if dropped:
+        logger.info(f"Dropped {dropped} unreferenced page images from the page store.")
+    rag_system.sync_collection(image_categorizations, manifest, stale_keys, rebuild)
+    manifest.save()
+    logger.info("Data processing and indexing completed successfully.")
 
 
 def query_qdrant(query: str, top_k: int = 1) -> str:
@@ -551,9 +861,9 @@ def query_qdrant(query: str, top_k: int = 1) -> str:
             payload = result.payload
             title = f"{payload['image_category']} - {payload['quarter_info']}"
             text = payload['content_output']
-            base64_image_path = payload['base64_image_path']
+            image_ref = payload.get('page_key') or payload['base64_image_path']
             original_pdf_path = payload['original_pdf_path']
-            output.append((title, text, base64_image_path, original_pdf_path))
+            output.append((title, text, image_ref, original_pdf_path))
 
         return output
 
@@ -569,10 +879,10 @@ def query_rag_system(user_query):
     rag_system = RAGSystem()
     results = rag_system.query(user_query)
     if results:
-        for title, text, base64_image_path, original_pdf_path in results:
+        for title, text, image_ref, original_pdf_path in results:
             logger.info(f"Title: {title}")
             logger.info(f"Content: {text}")
-            logger.info(f"Base64 Image Path: {base64_image_path}")
+            logger.info(f"Page Image: {image_ref}")
             logger.info(f"Original PDF Path: {original_pdf_path}")
             logger.info("---")
 
@@ -600,7 +910,7 @@ def main_loop():
         response = client.chat.completions.create(
             model='gpt-4o',
             messages=messages,
-            tools=TOOLS,
+            tools=get_tools(),
             tool_choice="required")
 
         # Step 2: determine if the response from the model includes a tool call.
@@ -614,7 +924,7 @@ def main_loop():
 
             # Step 3: Call the function and retrieve results. Append the results to the messages list.
             if tool_function_name == 'ask_database':
-                results = ask_database(conn, tool_query_string)
+                results = ask_database(tool_query_string)
 
                 messages.append({
                     "role": "tool",
@@ -0,0 +1,170 @@
+"""
+Minimal local stand-in for the OpenAI chat completions and embeddings endpoints, for exercising the
+ingestion pipeline (rate limiting, retries, checkpoint/resume) without spending API credits.
+
+    python mock_openai_server.py --port 8000 --rpm 60 --tpm 20000 --error-rate 0.1
+    OPENAI_BASE_URL=http://localhost:8000/v1 OPENAI_API_KEY=test \
+        python -c "import mmrag_bh; mmrag_bh.process_and_index_data()"
+
+Structured outputs are filled with placeholder values that match the requested JSON schema, and
+every response carries `x-ratelimit-*` headers. Requests over the configured limits get a 429.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def placeholder(schema: dict, name: str = ""):
+    """Returns a value of the type a JSON schema asks for."""
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != "null"), "null")
+    if "enum" in schema:
+        return schema["enum"][0]
+    if kind == "object":
+        return {key: placeholder(value, key) for key, value in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [placeholder(schema.get("items", {}), name)]
+    if kind in ("number", "integer"):
+        return 0
+    if kind == "boolean":
+        return False
+    if kind == "string":
+        return "graphs" if name == "image_category" else f"mock {name}".strip()
+    return None
+
+
+class Window:
+    """Requests and tokens used in the current one-minute window."""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm, self.tpm = rpm, tpm
+        self.lock = threading.Lock()
+        self.start, self.requests, self.tokens = time.monotonic(), 0, 0
+
+    def take(self, tokens: int):
+        """Returns (allowed, headers)."""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.start >= 60:
+                self.start, self.requests, self.tokens = now, 0, 0
+            allowed = self.requests < self.rpm and self.tokens + tokens <= self.tpm
+            if allowed:
+                self.requests += 1
+                self.tokens += tokens
+            reset = max(0.0, 60 - (now - self.start))
+            headers = {
+                "x-ratelimit-limit-requests": str(self.rpm),
+                "x-ratelimit-remaining-requests": str(max(0, self.rpm - self.requests)),
+                "x-ratelimit-reset-requests": f"{reset:.3f}s",
+                "x-ratelimit-limit-tokens": str(self.tpm),
+                "x-ratelimit-remaining-tokens": str(max(0, self.tpm - self.tokens)),
+                "x-ratelimit-reset-tokens": f"{reset:.3f}s",
+            }
+            if not allowed:
+                headers["retry-after"] = str(math.ceil(reset))
+            return allowed, headers
+
+
+def make_handler(window: Window, error_rate: float, latency: float, dimensions: int):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status: int, body: dict, headers: dict):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            # Rough token count: characters / 4, with a flat cost per image.
+            raw = json.dumps(body)
+            tokens = len(re.sub(r"base64,[A-Za-z0-9+/=]*", "", raw)) // 4 + 765 * raw.count('"image_url"')
+            allowed, headers = window.take(max(1, tokens))
+            if not allowed:
+                self.send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}}, headers)
+                return
+            time.sleep(latency)
+            if random.random() < error_rate:
+                self.send_json(500, {"error": {"message": "Mock server error", "type": "server_error"}}, headers)
+                return
+
+            if self.path.endswith("/chat/completions"):
+                self.send_json(200, self.chat_completion(body, tokens), headers)
+            elif self.path.endswith("/embeddings"):
+                self.send_json(200, self.embeddings(body, tokens), headers)
+            else:
+                self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}}, headers)
+
+        def chat_completion(self, body: dict, tokens: int) -> dict:
+            response_format = body.get("response_format") or {}
+            schema = response_format.get("json_schema", {}).get("schema")
+            content = json.dumps(placeholder(schema)) if schema else "Mock response."
+            return {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": tokens, "completion_tokens": 0, "total_tokens": tokens},
+            }
+
+        def embeddings(self, body: dict, tokens: int) -> dict:
+            texts = body.get("input")
+            texts = [texts] if isinstance(texts, str) else texts
+            data = []
+            for index, text in enumerate(texts):
+                values = []
+                counter = 0
+                while len(values) < dimensions:
+                    block = hashlib.sha256(f"{counter}\0{text}".encode("utf-8")).digest()
+                    values.extend(byte / 127.5 - 1.0 for byte in block)
+                    counter += 1
+                norm = math.sqrt(sum(value * value for value in values[:dimensions])) or 1.0
+                data.append({"object": "embedding", "index": index,
+                             "embedding": [value / norm for value in values[:dimensions]]})
+            return {"object": "list", "data": data, "model": body.get("model", "mock"),
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--rpm", type=int, default=500, help="Requests per minute before 429s.")
+    parser.add_argument("--tpm", type=int, default=30_000, help="Tokens per minute before 429s.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail with a 500.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds to wait before answering.")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Embedding size.")
+    args = parser.parse_args()
+
+    window = Window(args.rpm, args.tpm)
+    server = ThreadingHTTPServer((args.host, args.port),
+                                 make_handler(window, args.error_rate, args.latency, args.dimensions))
+    print(f"Mock OpenAI API on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
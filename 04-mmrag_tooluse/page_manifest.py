@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+from typing import Dict, Iterable, List, Optional, Set
+
+MANIFEST_VERSION = 1
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def page_key(pixel_digest: str, quarter_info: str) -> str:
+    """
+    Key a rendered page by its pixels and the quarter it is analyzed for,
+    since the quarter is part of the analysis prompt.
+    """
+    return hashlib.sha256(f"{quarter_info}\0{pixel_digest}".encode("utf-8")).hexdigest()
+
+
+def point_id(key: str) -> str:
+    """Stable Qdrant point id (a UUID) derived from a page key."""
+    return str(uuid.UUID(key[:32]))
+
+
+class PageManifest:
+    """
+    Records what has already been ingested so re-runs only pay for new or changed pages.
+
+    documents: pdf path -> {"sha256": file digest, "pages": [page key, ...]}
+    pages:     page key -> {"analysis": process_single_image output,
+                            "embedding": [...] or None, "embedding_model": str,
+                            "indexed": bool}
+    """
+
+    def __init__(self, path: str, documents: Optional[Dict] = None, pages: Optional[Dict] = None):
+        self.path = path
+        self.documents: Dict[str, Dict] = documents or {}
+        self.pages: Dict[str, Dict] = pages or {}
+
+    @classmethod
+    def load(cls, path: str) -> "PageManifest":
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls(path)
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, data.get("documents", {}), data.get("pages", {}))
+
+    def save(self) -> None:
+        """Write the manifest atomically so a crash never leaves it half-written."""
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".manifest.", suffix=".tmp", dir=folder)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": MANIFEST_VERSION, "documents": self.documents, "pages": self.pages}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    # Documents
+
+    def unchanged_pages(self, pdf_path: str, sha256: str) -> Optional[List[str]]:
+        """Return the page keys recorded for a PDF if its contents have not changed."""
+        document = self.documents.get(pdf_path)
+        if document is None or document.get("sha256") != sha256:
+            return None
+        return list(document.get("pages", []))
+
+    def set_document(self, pdf_path: str, sha256: str, keys: List[str]) -> None:
+        self.documents[pdf_path] = {"sha256": sha256, "pages": list(keys)}
+
+    def retain_documents(self, pdf_paths: Iterable[str]) -> None:
+        """Forget PDFs that are no longer in the source folder."""
+        keep = set(pdf_paths)
+        for pdf_path in list(self.documents):
+            if pdf_path not in keep:
+                del self.documents[pdf_path]
+
+    # Pages
+
+    def analysis(self, key: str) -> Optional[Dict]:
+        page = self.pages.get(key)
+        return page.get("analysis") if page else None
+
+    def set_analysis(self, key: str, analysis: Dict) -> None:
+        self.pages[key] = {"analysis": analysis, "embedding": None, "indexed": False}
+
+    def embedding(self, key: str, model: str) -> Optional[List[float]]:
+        page = self.pages.get(key)
+        if not page or page.get("embedding_model") != model:
+            return None
+        return page.get("embedding")
+
+    def set_embedding(self, key: str, embedding: List[float], model: str) -> None:
+        self.pages[key]["embedding"] = list(embedding)
+        self.pages[key]["embedding_model"] = model
+
+    def is_indexed(self, key: str) -> bool:
+        return bool(self.pages.get(key, {}).get("indexed"))
+
+    def mark_indexed(self, keys: Iterable[str], indexed: bool = True) -> None:
+        for key in keys:
+            if key in self.pages:
+                self.pages[key]["indexed"] = indexed
+
+    def mark_all_unindexed(self) -> None:
+        for page in self.pages.values():
+            page["indexed"] = False
+
+    def referenced_pages(self) -> Set[str]:
+        return {key for document in self.documents.values() for key in document.get("pages", [])}
+
+    def prune_pages(self) -> List[str]:
+        """
+        Drop pages no document references any more and return the keys of the
+        dropped pages that still have a point in the collection.
+        """
+        referenced = self.referenced_pages()
+        stale_indexed = []
+        for key in list(self.pages):
+            if key not in referenced:
+                if self.pages[key].get("indexed"):
+                    stale_indexed.append(key)
+                del self.pages[key]
+        return stale_indexed
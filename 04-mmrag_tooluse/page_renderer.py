@@ -0,0 +1,115 @@
+import hashlib
+import multiprocessing
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import fitz  # PyMuPDF
+
+# Kept free of API clients and database connections so pool workers import it cheaply.
+
+
+class RenderedPage(NamedTuple):
+    pdf_path: str
+    page_number: int
+    digest: str
+    image: bytes  # PNG
+
+
+class RenderedDocument(NamedTuple):
+    pdf_path: str
+    page_count: int
+    error: Optional[str] = None
+
+
+def pixmap_digest(pix) -> str:
+    """
+    Returns a SHA-256 digest of a rendered page's pixels (independent of the PNG encoder).
+    """
+    digest = hashlib.sha256(f"{pix.width}x{pix.height}x{pix.n}:".encode("utf-8"))
+    digest.update(pix.samples)
+    return digest.hexdigest()
+
+
+def render_page(document, page_number: int) -> Tuple[str, bytes]:
+    """
+    Renders one page straight to PNG bytes with PyMuPDF (no PIL decode/re-encode).
+    """
+    pix = document.load_page(page_number).get_pixmap()
+    return pixmap_digest(pix), pix.tobytes("png")
+
+
+def render_pdf(pdf_path: str) -> List[Tuple[str, bytes]]:
+    """
+    Renders every page of a PDF in this process and returns (pixel digest, PNG bytes) pairs.
+    """
+    with fitz.open(pdf_path) as document:
+        return [render_page(document, page_number) for page_number in range(len(document))]
+
+
+_pages: Optional["multiprocessing.Queue"] = None
+
+
+def _init_worker(pages: "multiprocessing.Queue") -> None:
+    global _pages
+    _pages = pages
+
+
+def _render_into_queue(pdf_path: str) -> int:
+    with fitz.open(pdf_path) as document:
+        for page_number in range(len(document)):
+            digest, image = render_page(document, page_number)
+            # Blocks while the queue is full, which bounds how far rendering runs ahead.
+            _pages.put(RenderedPage(pdf_path, page_number, digest, image))
+        return len(document)
+
+
+def stream_pdf_pages(
+    pdf_paths: List[str],
+    max_workers: Optional[int] = None,
+    queue_depth: int = 16,
+) -> Iterator[Union[RenderedPage, RenderedDocument]]:
+    """
+    Renders PDFs in a process pool (one document per worker) and yields each page as soon as it is
+    rendered, followed by a RenderedDocument once all of a document's pages have been yielded (or
+    rendering failed). At most `queue_depth` rendered pages wait in memory at any time.
+    """
+    if not pdf_paths:
+        return
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(pdf_paths)))
+    pages = multiprocessing.Queue(maxsize=max(1, queue_depth))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pages,)) as executor:
+        futures = {executor.submit(_render_into_queue, pdf_path): pdf_path for pdf_path in pdf_paths}
+        received: Dict[str, int] = {pdf_path: 0 for pdf_path in pdf_paths}
+        finished: Dict[str, RenderedDocument] = {}
+        try:
+            while len(finished) < len(pdf_paths):
+                try:
+                    page = pages.get(timeout=0.1)
+                except queue.Empty:
+                    page = None
+                if page is not None and page.pdf_path not in finished:
+                    received[page.pdf_path] += 1
+                    yield page
+                for future, pdf_path in futures.items():
+                    if pdf_path in finished or not future.done():
+                        continue
+                    error = future.exception()
+                    if error is not None:
+                        # Pages that arrive after the failure is reported are skipped.
+                        finished[pdf_path] = RenderedDocument(pdf_path, received[pdf_path], str(error))
+                        yield finished[pdf_path]
+                    elif received[pdf_path] == future.result():
+                        # The worker returns before its last puts are flushed; wait until every page arrived.
+                        finished[pdf_path] = RenderedDocument(pdf_path, future.result())
+                        yield finished[pdf_path]
+        finally:
+            for future in futures:
+                future.cancel()
+            # Unblock workers still waiting on a full queue so the pool can shut down.
+            while not all(future.done() for future in futures):
+                try:
+                    pages.get(timeout=0.1)
+                except queue.Empty:
+                    pass
@@ -0,0 +1,148 @@
+import base64
+import json
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+INDEX_FILE = "pages.idx.json"
+
+
+class PageImageStore:
+    """
+    Packed store for rendered page images.
+
+    PNG bytes of every page are appended back to back to a single data file, and a small JSON index
+    names that file and maps each page key to its (offset, length). Reads are slices of a memory map
+    of the data file, so attaching an image never opens a file. Base64 is produced only when a page
+    is sent to the model, and the most recently encoded pages are kept in an LRU.
+
+    Replacing the index is the commit point: compaction writes a new data file and only switches to
+    it when the new index is in place, so an interrupted run never mixes offsets from two files.
+    """
+
+    def __init__(self, folder: str, cache_size: int = 64):
+        self.folder = folder
+        self.index_path = os.path.join(folder, INDEX_FILE)
+        self.cache_size = max(0, cache_size)
+        os.makedirs(folder, exist_ok=True)
+        self._lock = threading.RLock()
+        self.data_file = "pages.0.bin"
+        self._index: Dict[str, List[int]] = self._load_index()
+        self._dirty = False
+        self._map: Optional[mmap.mmap] = None
+        self._map_size = 0
+        self._encoded: "OrderedDict[str, str]" = OrderedDict()
+
+    @property
+    def data_path(self) -> str:
+        return os.path.join(self.folder, self.data_file)
+
+    def _load_index(self) -> Dict[str, List[int]]:
+        try:
+            with open(self.index_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        self.data_file = data.get("data_file", self.data_file)
+        data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        # Ignore entries that point past the end of the data file (e.g. a truncated copy).
+        return {key: span for key, span in data.get("pages", {}).items() if span[0] + span[1] <= data_size}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._index)
+
+    def put(self, key: str, image_bytes: bytes) -> None:
+        """Append a page image unless a page with the same key is already stored."""
+        with self._lock:
+            if key in self._index:
+                return
+            with open(self.data_path, "ab") as f:
+                offset = f.tell()
+                f.write(image_bytes)
+            self._index[key] = [offset, len(image_bytes)]
+            self._dirty = True
+
+    def get_bytes(self, key: str) -> memoryview:
+        """Zero-copy view of a page's PNG bytes."""
+        with self._lock:
+            offset, length = self._index[key]
+            if offset + length > self._map_size:
+                self._remap()
+            return memoryview(self._map)[offset:offset + length]
+
+    def get_base64(self, key: str) -> str:
+        with self._lock:
+            encoded = self._encoded.get(key)
+            if encoded is not None:
+                self._encoded.move_to_end(key)
+                return encoded
+        encoded = base64.b64encode(self.get_bytes(key)).decode("ascii")
+        if self.cache_size:
+            with self._lock:
+                self._encoded[key] = encoded
+                self._encoded.move_to_end(key)
+                while len(self._encoded) > self.cache_size:
+                    self._encoded.popitem(last=False)
+        return encoded
+
+    def _remap(self) -> None:
+        # Earlier maps stay valid for views still holding them and are released with those views.
+        with open(self.data_path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._map_size = len(self._map)
+
+    def flush(self) -> None:
+        """Persist the index atomically; pages appended since the last flush become durable."""
+        with self._lock:
+            if not self._dirty:
+                return
+            fd, tmp_path = tempfile.mkstemp(prefix=".pages.", suffix=".tmp", dir=self.folder)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump({"data_file": self.data_file, "pages": self._index}, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.index_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            self._dirty = False
+
+    def compact(self, keep: Iterable[str]) -> int:
+        """Rewrite the data file with only the given pages; returns the number of pages dropped."""
+        keep = set(keep)
+        with self._lock:
+            dropped = [key for key in self._index if key not in keep]
+            if not dropped:
+                return 0
+            if os.path.exists(self.data_path) and os.path.getsize(self.data_path) > self._map_size:
+                self._remap()
+            generation = int(self.data_file.split(".")[1]) + 1
+            old_path, new_file = self.data_path, f"pages.{generation}.bin"
+            index: Dict[str, List[int]] = {}
+            with open(os.path.join(self.folder, new_file), "wb") as f:
+                for key, (offset, length) in self._index.items():
+                    if key in keep:
+                        index[key] = [f.tell(), length]
+                        f.write(self._map[offset:offset + length])
+                f.flush()
+                os.fsync(f.fileno())
+            self.data_file, self._index = new_file, index
+            self._map, self._map_size = None, 0
+            for key in dropped:
+                self._encoded.pop(key, None)
+            self._dirty = True
+            self.flush()
+            os.unlink(old_path)
+            return len(dropped)
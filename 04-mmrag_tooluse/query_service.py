@@ -0,0 +1,176 @@
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from urllib.parse import quote
+
+from database import get_database_info
+
+_STRING_LITERAL = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace outside string literals and drop trailing semicolons, for cache keys."""
+    parts = _STRING_LITERAL.split(sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\s+", " ", parts[i])
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+class QueryResult(list):
+    """Rows of a query; `truncated` is set when more rows matched than were returned."""
+
+    def __init__(self, rows=(), truncated: bool = False):
+        super().__init__(rows)
+        self.truncated = truncated
+
+
+class QueryService:
+    """
+    Read-only access to a SQLite database for concurrent callers.
+
+    Connections are opened with `mode=ro` (or `immutable=1`, which also skips locking, when the file
+    cannot change under us) and kept in a pool, so concurrent queries run on separate connections.
+    Each connection caches its prepared statements. Results are kept in an LRU keyed by the
+    normalized SQL and parameters, and the cache is invalidated whenever the database file changes.
+    Every query runs under a time limit enforced by a progress handler and returns at most `max_rows` rows.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        pool_size: int = 4,
+        timeout: float = 5.0,
+        max_rows: int = 1000,
+        cache_size: int = 256,
+        immutable: Optional[bool] = None,
+    ):
+        self.db_path = os.path.abspath(db_path)
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self.cache_size = max(0, cache_size)
+        # By default, only files we could not write to anyway are treated as immutable.
+        self.immutable = not os.access(self.db_path, os.W_OK) if immutable is None else immutable
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[tuple, QueryResult]" = OrderedDict()
+        self._schema: Optional[Tuple[tuple, List[Dict]]] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = f"file:{quote(self.db_path)}?mode=ro"
+        if self.immutable:
+            uri += "&immutable=1"
+        # Autocommit: a failed write attempt must not leave a transaction (and its read lock) open.
+        return sqlite3.connect(
+            uri, uri=True, check_same_thread=False, cached_statements=256, isolation_level=None)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.pool_size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except BaseException:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def _version(self) -> tuple:
+        """Changes whenever the database (or its WAL) is written."""
+        version = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                stat = os.stat(path)
+                version.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                version.append(None)
+        return tuple(version)
+
+    def stream(self, sql: str, params: Union[Sequence, Mapping] = (), max_rows: Optional[int] = None,
+               batch_size: int = 256, timeout: Optional[float] = None) -> Iterator[tuple]:
+        """
+        Yields up to `max_rows` rows (None for no limit) while holding one pooled connection.
+        The time limit applies to the whole iteration.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self.connection() as conn:
+            deadline = time.monotonic() + timeout if timeout else None
+            if deadline is not None:
+                # Checked every 1000 VM instructions; returning True interrupts the query.
+                conn.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+            try:
+                cursor = conn.execute(sql, params)
+                remaining = max_rows
+                while remaining is None or remaining > 0:
+                    rows = cursor.fetchmany(batch_size if remaining is None else min(batch_size, remaining))
+                    if not rows:
+                        break
+                    if remaining is not None:
+                        remaining -= len(rows)
+                    yield from rows
+                cursor.close()
+            finally:
+                conn.set_progress_handler(None, 0)
+
+    def execute(self, sql: str, params: Union[Sequence, Mapping] = (), max_rows: Optional[int] = None,
+                timeout: Optional[float] = None) -> QueryResult:
+        """Runs a query and returns at most `max_rows` (default `self.max_rows`) rows, from the cache when possible."""
+        max_rows = self.max_rows if max_rows is None else max_rows
+        # Named parameters are keyed by name and value; iterating a dict alone would only yield its keys.
+        param_key = tuple(sorted(params.items())) if isinstance(params, Mapping) else tuple(params)
+        key = (self._version(), normalize_sql(sql), param_key, max_rows)
+        if self.cache_size:
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    return QueryResult(cached, cached.truncated)
+
+        # One extra row tells us whether the result was cut off.
+        rows = list(self.stream(sql, params, max_rows + 1, timeout=timeout))
+        result = QueryResult(rows[:max_rows], truncated=len(rows) > max_rows)
+        if self.cache_size:
+            with self._lock:
+                self._cache[key] = result
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return QueryResult(result, result.truncated)
+
+    def schema(self) -> List[Dict]:
+        """Table names and columns, introspected on first use and again only after the file changes."""
+        version = self._version()
+        if self._schema is None or self._schema[0] != version:
+            with self.connection() as conn:
+                self._schema = (version, get_database_info(conn))
+        return self._schema[1]
+
+    def close(self) -> None:
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+            self._cache.clear()
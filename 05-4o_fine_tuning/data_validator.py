@@ -3,17 +3,21 @@ This module provides a DataValidator class to help validate and analyze JSONL da
 It includes methods to check for data overlaps, format errors, and various data statistics.
 """
 
+import hashlib
 import json
 import logging
 import os
 import uuid
-from collections import defaultdict
+from array import array
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Optional
+from functools import partial
+from typing import Dict, Iterator, List, Optional
 
 import numpy as np
 import tiktoken
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -21,11 +25,172 @@ logger = logging.getLogger(__name__)
 # init tiktoken encoding
 encoding = tiktoken.get_encoding("o200k_base")
 
+STAT_NAMES = ("num_messages_per_example", "num_total_tokens_per_example", "num_assistant_tokens_per_example")
+
+
+class Distribution:
+    """
+    Streaming summary of integer values. Values are kept as a histogram, so memory is bounded by the
+    number of distinct values (e.g. the longest conversation), not by the number of examples, and
+    quantiles match `np.quantile` exactly.
+    """
+
+    def __init__(self):
+        self.histogram: Counter = Counter()
+        self.count = 0
+        self.total = 0
+
+    def update(self, histogram: Counter) -> None:
+        self.histogram.update(histogram)
+        self.count += sum(histogram.values())
+        self.total += sum(value * n for value, n in histogram.items())
+
+    def min(self) -> int:
+        return min(self.histogram)
+
+    def max(self) -> int:
+        return max(self.histogram)
+
+    def mean(self) -> float:
+        return self.total / self.count
+
+    def quantile(self, q: float) -> float:
+        """Linear interpolation between the closest ranks, as `np.quantile` does by default."""
+        position = q * (self.count - 1)
+        lower_rank, fraction = int(position), position - int(position)
+        lower = upper = None
+        seen = 0
+        for value in sorted(self.histogram):
+            seen += self.histogram[value]
+            if lower is None and seen > lower_rank:
+                lower = value
+            if seen > lower_rank + 1 or (seen > lower_rank and fraction == 0):
+                upper = value
+                break
+        return float(lower + (upper - lower) * fraction)
+
+
+def _record_digest(example) -> int:
+    """64-bit hash of the record's canonical JSON, so overlap can be checked without keeping the records."""
+    canonical = json.dumps(example, sort_keys=True).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(canonical, digest_size=8).digest(), "little")
+
+
+def _check_format(ex, format_errors: Counter) -> None:
+    if not isinstance(ex, dict):
+        format_errors["data_type"] += 1
+        return
+
+    messages = ex.get("messages", None)
+    if not messages:
+        format_errors["missing_messages_list"] += 1
+        return
+
+    for message in messages:
+        if "role" not in message or "content" not in message:
+            format_errors["message_missing_key"] += 1
+
+        if any(k not in ("role", "content", "name", "function_call", "weight") for k in message):
+            format_errors["message_unrecognized_key"] += 1
+
+        if message.get("role", None) not in ("system", "user", "assistant", "function"):
+            format_errors["unrecognized_role"] += 1
+
+        content = message.get("content", None)
+        function_call = message.get("function_call", None)
+
+        if (not content and not function_call) or not isinstance(content, str):
+            format_errors["missing_content"] += 1
+
+    if not any(message.get("role", None) == "assistant" for message in messages):
+        format_errors["example_missing_assistant_message"] += 1
+
+
+def _profile_chunk(lines: List[bytes], keep_digests: bool = True, tokens_per_message: int = 3, tokens_per_name: int = 1) -> dict:
+    """
+    Format checks, token counts and record hashes for a chunk of JSONL lines. Runs in a worker process;
+    all texts of the chunk are tokenized in one batch.
+    """
+    format_errors: Counter = Counter()
+    digests = array("Q")
+    n_examples = n_missing_system = n_missing_user = 0
+    first_example = None
+    n_messages, base_tokens = [], []
+    texts, owners = [], []  # owners[i] = (example index, counts as assistant tokens)
+
+    for line in lines:
+        if not line.strip():
+            continue
+        n_examples += 1
+        try:
+            ex = json.loads(line)
+        except ValueError:
+            format_errors["invalid_json"] += 1
+            continue
+        if first_example is None:
+            first_example = ex
+        if keep_digests:
+            digests.append(_record_digest(ex))
+        _check_format(ex, format_errors)
+
+        messages = ex.get("messages") if isinstance(ex, dict) else None
+        if not isinstance(messages, list) or not all(isinstance(message, dict) for message in messages):
+            continue
+        index = len(n_messages)
+        roles = {message.get("role") for message in messages}
+        n_missing_system += "system" not in roles
+        n_missing_user += "user" not in roles
+        n_messages.append(len(messages))
+        base_tokens.append(3 + tokens_per_message * len(messages))
+        for message in messages:
+            for key, value in message.items():
+                if key == "name":
+                    base_tokens[index] += tokens_per_name
+                texts.append(value if isinstance(value, str) else json.dumps(value))
+                owners.append((index, key == "content" and message.get("role") == "assistant"))
+
+    total_tokens = list(base_tokens)
+    assistant_tokens = [0] * len(base_tokens)
+    for (index, is_assistant), tokens in zip(owners, encoding.encode_ordinary_batch(texts, num_threads=1)):
+        total_tokens[index] += len(tokens)
+        if is_assistant:
+            assistant_tokens[index] += len(tokens)
+
+    return {
+        "n_examples": n_examples,
+        "first_example": first_example,
+        "format_errors": format_errors,
+        "n_missing_system": n_missing_system,
+        "n_missing_user": n_missing_user,
+        "histograms": dict(zip(STAT_NAMES, (Counter(n_messages), Counter(total_tokens), Counter(assistant_tokens)))),
+        "digests": digests,
+    }
+
+
+def _read_chunks(path: str, chunk_size: int) -> Iterator[List[bytes]]:
+    with open(path, "rb") as f:
+        chunk = []
+        for line in f:
+            chunk.append(line)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
 
 class DataValidator(BaseModel):
+    """
+    Each file is read once, in chunks that are checked in parallel by `workers` processes (default:
+    all cores) with a bounded number of chunks in flight, so memory stays flat however large the file.
+    The check_* methods report from that single pass.
+    """
     train_file: str
     validation_file: Optional[str] = None
     log_file: Optional[str] = None
+    workers: Optional[int] = None
+    chunk_size: int = 1000
+    _profiles: Dict[str, dict] = PrivateAttr(default_factory=dict)
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -41,6 +206,57 @@ class DataValidator(BaseModel):
         logger.addHandler(file_handler)
         logger.info(f"Log report will be saved in {log_file_path}")
 
+    def profile(self, data_path: str) -> dict:
+        """
+        Streams a JSONL file once and returns its format errors, statistics and record hashes.
+        Results are cached, so every check reuses the same pass.
+        """
+        if data_path in self._profiles:
+            return self._profiles[data_path]
+        if not data_path.endswith('.jsonl'):
+            raise ValueError(f"Invalid JSONL file: `{data_path}`")
+
+        profile = {
+            "n_examples": 0,
+            "first_example": None,
+            "format_errors": Counter(),
+            "n_missing_system": 0,
+            "n_missing_user": 0,
+            "distributions": {name: Distribution() for name in STAT_NAMES},
+            "digests": array("Q"),
+        }
+
+        def merge(chunk: dict) -> None:
+            if profile["first_example"] is None:
+                profile["first_example"] = chunk["first_example"]
+            for key in ("n_examples", "n_missing_system", "n_missing_user"):
+                profile[key] += chunk[key]
+            profile["format_errors"].update(chunk["format_errors"])
+            for name, histogram in chunk["histograms"].items():
+                profile["distributions"][name].update(histogram)
+            profile["digests"].extend(chunk["digests"])
+
+        # Record hashes are only needed to compare the training and validation files.
+        profile_chunk = partial(_profile_chunk, keep_digests=self.validation_file is not None)
+        chunks = _read_chunks(data_path, self.chunk_size)
+        workers = self.workers or os.cpu_count() or 1
+        if workers == 1:
+            for chunk in chunks:
+                merge(profile_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # Chunks are merged in file order, with at most two per worker in flight.
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(executor.submit(profile_chunk, chunk))
+                    if len(pending) >= 2 * workers:
+                        merge(pending.popleft().result())
+                while pending:
+                    merge(pending.popleft().result())
+
+        self._profiles[data_path] = profile
+        return profile
+
     def check_data_overlap(self):
         if not self.validation_file:
             logger.info(
@@ -52,10 +268,10 @@ class DataValidator(BaseModel):
             if not file.endswith('.jsonl'):
                 raise ValueError(f"Invalid JSONL file: {file}")
 
-        data_sets = {file: {json.dumps(json.loads(
-            line.strip()), sort_keys=True) for line in open(file)} for file in files_to_check}
-        overlaps = {(file1, file2): len(data_sets[file1] & data_sets[file2]) for i, file1 in enumerate(
-            files_to_check) for file2 in files_to_check[i+1:]}
+        digests = {file: np.unique(np.frombuffer(self.profile(file)["digests"], dtype=np.uint64))
+                   for file in files_to_check}
+        overlaps = {(file1, file2): int(np.intersect1d(digests[file1], digests[file2], assume_unique=True).size)
+                    for i, file1 in enumerate(files_to_check) for file2 in files_to_check[i+1:]}
 
         for (file1, file2), count in overlaps.items():
             logger.info(
@@ -87,54 +303,22 @@ class DataValidator(BaseModel):
                 raise ValueError(
                     f"The provided dataset path `{data_path}` is not a valid JSONL file.")
 
-            # Load dataset
-            with open(data_path) as f:
-                dataset = [json.loads(line) for line in f]
+            profile = self.profile(data_path)
 
             logger.info(
                 f"Checking format errors in {data_path}")
 
             # initial dataset stats
             try:
-                logger.info(f"Number of examples: {len(dataset)}")
+                logger.info(f"Number of examples: {profile['n_examples']}")
                 logger.info("First example:")
-                for message in dataset[0]["messages"]:
+                for message in profile["first_example"]["messages"]:
                     logger.info(message)
-            except KeyError:
+            except (KeyError, TypeError):
                 logger.error(
                     "\033[91mNo messages found in the first example.\033[0m")
 
-            # Format error checks
-            format_errors = defaultdict(int)
-
-            for ex in dataset:
-                if not isinstance(ex, dict):
-                    format_errors["data_type"] += 1
-                    continue
-
-                messages = ex.get("messages", None)
-                if not messages:
-                    format_errors["missing_messages_list"] += 1
-                    continue
-
-                for message in messages:
-                    if "role" not in message or "content" not in message:
-                        format_errors["message_missing_key"] += 1
-
-                    if any(k not in ("role", "content", "name", "function_call", "weight") for k in message):
-                        format_errors["message_unrecognized_key"] += 1
-
-                    if message.get("role", None) not in ("system", "user", "assistant", "function"):
-                        format_errors["unrecognized_role"] += 1
-
-                    content = message.get("content", None)
-                    function_call = message.get("function_call", None)
-
-                    if (not content and not function_call) or not isinstance(content, str):
-                        format_errors["missing_content"] += 1
-
-                if not any(message.get("role", None) == "assistant" for message in messages):
-                    format_errors["example_missing_assistant_message"] += 1
+            format_errors = profile["format_errors"]
 
             if format_errors:
                 data_format_errors[data_path] = True
@@ -158,34 +342,24 @@ class DataValidator(BaseModel):
         if not data_path.endswith('.jsonl'):
             raise ValueError(f"Invalid JSONL file: `{data_path}`")
 
-        with open(data_path) as f:
-            dataset = [json.loads(line) for line in f]
+        profile = self.profile(data_path)
 
         logger.info(f"Checking data stats in {data_path}")
 
-        def num_tokens_from_messages(messages, tokens_per_message=3, tokens_per_name=1):
-            return sum(tokens_per_message + sum(len(encoding.encode(value)) + (tokens_per_name if key == "name" else 0) for key, value in message.items()) for message in messages) + 3
-
-        def num_assistant_tokens_from_messages(messages):
-            return sum(len(encoding.encode(message["content"])) for message in messages if message["role"] == "assistant")
-
-        def print_distribution(values, name):
+        def print_distribution(distribution: Distribution, name):
             logger.info(f"\n#### Distribution of {name}:")
-            logger.info(f"  min / max: {min(values)}, {max(values)}")
+            if not distribution.count:
+                logger.info("  no examples")
+                return
+            logger.info(f"  min / max: {distribution.min()}, {distribution.max()}")
             logger.info(
-                f"  mean / median: {np.mean(values)}, {np.median(values)}")
+                f"  mean / median: {distribution.mean()}, {distribution.quantile(0.5)}")
             logger.info(
-                f"  p5 / p95: {np.quantile(values, 0.1)}, {np.quantile(values, 0.9)}")
-
-        n_missing_system = sum(1 for ex in dataset if not any(
-            message["role"] == "system" for message in ex["messages"]))
-        n_missing_user = sum(1 for ex in dataset if not any(
-            message["role"] == "user" for message in ex["messages"]))
-        n_messages = [len(ex["messages"]) for ex in dataset]
-        convo_lens = [num_tokens_from_messages(
-            ex["messages"]) for ex in dataset]
-        assistant_message_lens = [num_assistant_tokens_from_messages(
-            ex["messages"]) for ex in dataset]
+                f"  p5 / p95: {distribution.quantile(0.1)}, {distribution.quantile(0.9)}")
+
+        n_missing_system = profile["n_missing_system"]
+        n_missing_user = profile["n_missing_user"]
+        n_messages, convo_lens, assistant_message_lens = (profile["distributions"][name] for name in STAT_NAMES)
 
         logger.info(
             f"\n\033[94mNum examples missing system message:\033[0m\n{n_missing_system}")
@@ -3,24 +3,20 @@ The training dataset and evaluations used in this script are derived from https:
 """
 
 import argparse
+import asyncio
 import datetime
-import json
 import multiprocessing
 import os
 import re
-from functools import partial
+from typing import Dict, List, Optional
 
-import numpy as np
 from datasets import load_dataset
-from openai import OpenAI
-from sentence_transformers import CrossEncoder, SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-from tenacity import retry, stop_after_attempt, wait_random_exponential
+from few_shot_index import fetch_few_shot_examples_batch, init_few_shot_worker
+from generation import CompletionGenerator, ResponseCache, response_key
+from semgrep_scanner import SemgrepScanner
 from tqdm import tqdm
 from util import clean_code_snippet, get_semgrep_version, is_fully_commented
 
-client = OpenAI()
-
 
 def fetch_few_shot_train_examples(prompt: str, num_examples: int = 0, use_similarity: bool = False):
     """
@@ -42,71 +38,29 @@ def fetch_few_shot_train_examples(prompt: str, num_examples: int = 0, use_simila
         b. Reranking: Uses a cross-encoder model to rerank the initially retrieved examples and selects the top num_examples.
 
     The function returns a list of few-shot training examples, excluding system messages.
+    The dataset, models and corpus embeddings are loaded once per process (see few_shot_index.py);
+    use fetch_few_shot_examples_batch to retrieve examples for many prompts at once.
     """
-    dataset = load_dataset("patched-codes/synth-vuln-fixes", split="train")
-    if use_similarity:
-        # lightweight model for initial retrieval
-        retrieval_model = SentenceTransformer('all-MiniLM-L6-v2')
-        # cross-encoder model for reranking
-        rerank_model = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-        # Extract user messages
-        user_messages = [
-            next(msg['content']
-                 for msg in item['messages'] if msg['role'] == 'user')
-            for item in dataset
-        ]
-        # encode the prompt and user messages for initial retrieval
-        prompt_embedding = retrieval_model.encode(
-            prompt, convert_to_tensor=False)
-        corpus_embeddings = retrieval_model.encode(
-            user_messages, convert_to_tensor=False, show_progress_bar=True)
-
-        similarities = cosine_similarity(
-            [prompt_embedding], corpus_embeddings)[0]
-        top_k = min(100, len(dataset))
-        top_indices = similarities.argsort()[-top_k:][::-1]
-
-        # reranking
-        rerank_pairs = [[prompt, user_messages[idx]] for idx in top_indices]
-
-        # rerank using the cross-encoder model
-        rerank_scores = rerank_model.predict(rerank_pairs)
-
-        # Select top num_examples based on rerank scores
-        reranked_indices = [top_indices[i]
-                            for i in np.argsort(rerank_scores)[::-1][:num_examples]]
-        top_indices = reranked_indices
-    else:
-        top_indices = np.random.choice(
-            len(dataset), num_examples, replace=False)
-
-    few_shot_messages = []
-    for index in top_indices:
-        py_index = int(index)
-        messages = dataset[py_index]["messages"]
-
-        dialogue = [msg for msg in messages if msg['role'] != 'system']
-        few_shot_messages.extend(dialogue)
-
-    return few_shot_messages
+    return fetch_few_shot_examples_batch([prompt], num_examples, use_similarity)[0]
 
 
 def clean_filename(name: str) -> str:
     return re.sub(r'[^a-zA-Z0-9\-_]', '*', name.replace(':', '_'))
 
 
-@retry(wait=wait_random_exponential(min=20, max=60), stop=stop_after_attempt(3))
-def get_fixed_code_fine_tuned(prompt: str,
-                              few_shot_messages,
-                              model_name: str):
+async def get_fixed_code_fine_tuned(generator: CompletionGenerator,
+                                    prompt: str,
+                                    few_shot_messages,
+                                    model_name: str):
     """
     Generates corrected code for a given piece of code identified with vulnerabilities.
 
     Steps:
     1. Constructs a system message to set the context for the model.
     2. Compiles messages from both the system and user, including the vulnerability report and original code, along with few-shot examples.
-    3. Cleans the corrected code snippet returned from the chat completion response.
-    4. Returns the cleaned, corrected code.
+    3. Requests a chat completion, or reuses the cached one for the same model, prompt and few-shot examples.
+    4. Cleans the corrected code snippet returned from the chat completion response.
+    5. Returns the cleaned, corrected code.
     """
     system_message = (
         "You are an AI assistant specialized in fixing code vulnerabilities. "
@@ -122,7 +76,8 @@ def get_fixed_code_fine_tuned(prompt: str,
     messages.extend(few_shot_messages)
     messages.append({"role": "user", "content": prompt})
 
-    response = client.chat.completions.create(
+    content = await generator.complete(
+        response_key(model_name, prompt, few_shot_messages),
         model=model_name,
         messages=messages,
         max_tokens=4096,
@@ -130,127 +85,125 @@ def get_fixed_code_fine_tuned(prompt: str,
         top_p=0.95
     )
 
-    fixed_code = clean_code_snippet(response.choices[0].message.content)
+    fixed_code = clean_code_snippet(content)
     return fixed_code
 
 
-def process_file(test_case, fixed_files, model_name: str, n_shot: int, use_similarity: bool):
+def build_prompt(cwe: str, lines: str, message: str, file_text: str) -> str:
+    return f"""Vulnerability Report:
+    - Type: {cwe}
+    - Location: {lines}
+    - Description: {message}
+    Original Code:
+    ```
+    {file_text}
+    ```
+    Task: Fix the vulnerability in the code above. Provide only the complete fixed code without explanations or comments. Make minimal changes necessary to address the security issue while preserving the original functionality."""
+
+
+def build_case_prompt(test_case, report: Optional[dict]) -> Optional[str]:
     """
-    Processes a given test case file to identify and fix vulnerabilities using a specified model.
+    Builds the prompt for fixing the first vulnerability `semgrep` found in a test case.
 
-    Steps:
-    1. Writes the source code from the test case to a new file in the 'staticeval' directory.
-    2. Uses the free version of `semgrep` to scan the newly written file for vulnerabilities.
-    3. If vulnerabilities are found, constructs a prompt detailing the vulnerability, optionally fetches few-shot training examples, and calls `get_fixed_code_fine_tuned`.
-    4. Writes the returned corrected code to a new file and rescans it with `semgrep` to verify the fix.
-    5. Updates the list of fixed files if the fix is successful.
+    Returns:
+        str: The prompt, or None if the file has no vulnerabilities or could not be scanned.
+    """
+    input_file = os.path.join("staticeval", test_case["file_name"])
+    if report is None:
+        tqdm.write(f"Semgrep failed to create output file for {input_file}")
+        return None
+    if len(report.get("errors", [])) > 0:
+        tqdm.write(f"Error processing {input_file} ...")
+        return None
+    if len(report.get("results", [])) == 0:
+        tqdm.write(input_file + " has no vulnerabilities")
+        return None
+
+    tqdm.write(f"Vulnerability found in {input_file}...")
+    lines = report["results"][0]["extra"]["lines"]
+    message = report["results"][0]["extra"]["message"]
+    return build_prompt(test_case['cwe'], lines, message, test_case["source"])
+
+
+async def generate_fix(generator: CompletionGenerator, case, model_name: str) -> Optional[str]:
+    """
+    Calls `get_fixed_code_fine_tuned` for a vulnerable test case.
 
     Args:
-        test_case(dict): A dictionary containing the test case details, including 'source' and 'file_name'.
-        fixed_files(list): A list to store the names of files that have been successfully fixed.
+        generator(CompletionGenerator): Sends (or replays from the cache) the chat completion.
+        case(dict): The test case, with its 'prompt' and 'few_shot_messages'.
         model_name(str): The name of the model used for generating fixes.
-        n_shot(int): The number of few-shot examples to use.
-        use_similarity(bool): A flag to determine if similarity-based retrieval of examples should be used.
-    """
-    file_text = test_case["source"]
-    file_name = test_case["file_name"]
-    input_file = os.path.join("staticeval", file_name)
-
-    output_file = f"{input_file}_fixed.py"
-    tmp_file = f"{input_file}.output.json"
 
+    Returns:
+        str: The fixed code, or None if the model's response is not a usable fix.
+    """
     try:
-        os.makedirs(os.path.dirname(input_file), exist_ok=True)
-
-        with open(input_file, "w") as file_object:
-            file_object.write(file_text)
-
-        if os.path.exists(tmp_file):
-            os.remove(tmp_file)
+        fixed_code = await get_fixed_code_fine_tuned(
+            generator,
+            prompt=case["prompt"],
+            few_shot_messages=case["few_shot_messages"],
+            model_name=model_name)
+    except Exception as e:
+        tqdm.write(f"Error processing {case['file_name']}: {str(e)}")
+        return None
 
-        # Scan the file for vulnerabilities
-        tqdm.write("Scanning file " + input_file + "...")
-        scan_command_input = f"semgrep --config auto {input_file} --output {tmp_file} --json > /dev/null 2>&1"
-        os.system(scan_command_input)
+    # Check if the fixed code is valid
+    if len(fixed_code) < 512 or is_fully_commented(fixed_code):
+        return None
+    return fixed_code
 
-        # Check if the scan output file exists
-        if not os.path.exists(tmp_file):
-            tqdm.write(
-                f"Semgrep failed to create output file for {input_file}")
-            return False
 
-        # Check if there are any errors or no vulnerabilities
-        with open(tmp_file, 'r') as jf:
-            data = json.load(jf)
+async def generate_fixes(cases: List[dict], model_name: str, concurrency: int, cache_path: str,
+                         base_url: Optional[str] = None) -> List[Optional[str]]:
+    """
+    Generates fixes for all cases concurrently. Responses are cached in `cache_path`, so a rerun
+    (or a run resumed after a crash) only requests the fixes it does not have yet.
+    """
+    async with CompletionGenerator(ResponseCache(cache_path), concurrency=concurrency, base_url=base_url) as generator:
+        with tqdm(total=len(cases), desc="Fixing") as progress:
+            async def fix(case):
+                fixed_code = await generate_fix(generator, case, model_name)
+                progress.update(1)
+                return fixed_code
 
-        if len(data.get("errors", [])) > 0:
-            tqdm.write(f"Error processing {input_file} ...")
-            return False
+            return await asyncio.gather(*(fix(case) for case in cases))
 
-        if len(data.get("results", [])) == 0:
-            tqdm.write(input_file + " has no vulnerabilities")
-            result = False
 
-        # handle the case where there are vulnerabilities
+def verify_fixes(scanner: SemgrepScanner, fixes: Dict[str, str]) -> List[str]:
+    """
+    Rescans all fixed files in one batch and returns the names of the test cases whose fix leaves no findings.
+    """
+    reports = scanner.scan({f"{file_name}_fixed.py": code for file_name, code in fixes.items()})
+    fixed_files = []
+    for file_name in fixes:
+        input_file = os.path.join("staticeval", file_name)
+        report = reports[f"{file_name}_fixed.py"]
+        if report is None:
+            tqdm.write(f"Semgrep failed to create output file for {input_file}_fixed.py")
+        elif len(report["results"]) == 0:
+            tqdm.write("Passing response for " + input_file + " at 1 ...")
+            fixed_files.append(file_name)
         else:
-            tqdm.write(f"Vulnerability found in {input_file}...")
-            cwe = test_case['cwe']
-            lines = data["results"][0]["extra"]["lines"]
-            message = data["results"][0]["extra"]["message"]
+            tqdm.write("Failing response for " + input_file + " at " + str(len(report["results"])))
+            print(report["results"])
+    return fixed_files
 
-            prompt = f"""Vulnerability Report:
-    - Type: {cwe}
-    - Location: {lines}
-    - Description: {message}
-    Original Code:
-    ```
-    {file_text}
-    ```
-    Task: Fix the vulnerability in the code above. Provide only the complete fixed code without explanations or comments. Make minimal changes necessary to address the security issue while preserving the original functionality."""
 
-            few_shot_messages = fetch_few_shot_train_examples(
-                prompt=prompt,
-                num_examples=n_shot,
-                use_similarity=use_similarity)
-
-            fixed_code = get_fixed_code_fine_tuned(
-                prompt=prompt,
-                few_shot_messages=few_shot_messages,
-                model_name=model_name)
-
-            # Check if the fixed code is valid
-            if len(fixed_code) < 512 or is_fully_commented(fixed_code):
-                result = False
-            else:
-                # Remove the output file and tmp file if they exist
-                if os.path.exists(output_file):
-                    os.remove(output_file)
-                with open(output_file, 'w') as wf:
-                    wf.write(fixed_code)
-                if os.path.exists(tmp_file):
-                    os.remove(tmp_file)
-                scan_command_output = f"semgrep --config auto {output_file} --output {tmp_file} --json > /dev/null 2>&1"
-                os.system(scan_command_output)
-                with open(tmp_file, 'r') as jf:
-                    data = json.load(jf)
-                if len(data["results"]) == 0:
-                    tqdm.write("Passing response for " +
-                               input_file + " at 1 ...")
-                    result = True
-                    fixed_files.append(file_name)
-                else:
-                    tqdm.write("Failing response for " +
-                               input_file + " at " + str(len(data["results"])))
-                    print(data["results"])
-                    result = False
-
-        if os.path.exists(tmp_file):
-            os.remove(tmp_file)
-
-        return result
-    except Exception as e:
-        tqdm.write(f"Error processing {input_file}: {str(e)}")
-        return False
+def fetch_few_shot_for_cases(cases: List[dict], n_shot: int, use_similarity: bool, seed: int = 0) -> None:
+    """
+    Adds 'few_shot_messages' to every case. Retrieval runs in one worker process whose initializer
+    loads the dataset, models and corpus embeddings once; all prompts are then embedded, matched
+    and reranked as one batch. Keeping torch out of this process also keeps it safe to fork the
+    other pools. Random examples are seeded per prompt, so reruns reuse the cached responses.
+    """
+    if n_shot > 0 and cases:
+        with multiprocessing.Pool(processes=1, initializer=init_few_shot_worker, initargs=(use_similarity,)) as pool:
+            few_shot = pool.apply(fetch_few_shot_examples_batch,
+                                  ([case["prompt"] for case in cases], n_shot, use_similarity, seed))
+    else:
+        few_shot = [[] for _ in cases]
+    for case, messages in zip(cases, few_shot):
+        case["few_shot_messages"] = messages
 
 
 def create_log_file(log_file_name: str,
@@ -260,7 +213,8 @@ def create_log_file(log_file_name: str,
                     total_tests: int,
                     fixed_files: list,
                     n_shot: int,
-                    use_similarity: bool):
+                    use_similarity: bool,
+                    semgrep_config: str = "auto"):
     """
     Creates a log file to record the evaluation results.
 
@@ -273,6 +227,7 @@ def create_log_file(log_file_name: str,
         fixed_files(list): A list of files that were fixed.
         n_shot(int): The number of few-shot examples used.
         use_similarity(bool): Whether similarity-based retrieval was used for n_shot.
+        semgrep_config(str): The semgrep rules used for scanning.
     """
     os.makedirs('logs', exist_ok=True)
     with open(os.path.join('logs', log_file_name), 'w') as log_file:
@@ -283,6 +238,7 @@ def create_log_file(log_file_name: str,
             f"Model: {model_name}",
             f"Score: {score:.2f}%",
             f"Semgrep Version: {get_semgrep_version()}",
+            f"Semgrep Config: {semgrep_config}",
             f"Passing Tests: {passing_tests} out of {total_tests}",
             f"Number of few-shot examples: {n_shot}",
             f"Use similarity for examples: {'Yes' if use_similarity else 'No'}",
@@ -308,10 +264,26 @@ def main():
     parser.add_argument("--use_similarity", action="store_true",
                         help="Enable similarity-based retrieval of dataset examples")
 
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for random few-shot selection (without --use_similarity)")
+
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Maximum number of model requests in flight")
+
+    parser.add_argument("--responses_cache", type=str, default="responses_cache.jsonl",
+                        help="JSONL file where model responses are cached and reused across runs")
+
+    parser.add_argument("--base_url", type=str, default=None,
+                        help="OpenAI-compatible endpoint to use instead of the OpenAI API, e.g. http://localhost:8000/v1 for mock_openai_server.py")
+
+    parser.add_argument("--semgrep_config", type=str, default="auto",
+                        help="Semgrep rules: 'auto', a registry pack such as 'p/python' (downloaded once and cached), or a local rules file")
+
     args = parser.parse_args()
     model_name = args.model
     n_shot = args.n_shot
     use_similarity = args.use_similarity
+    semgrep_config = args.semgrep_config
 
     # Load the eval dataset
     eval_dataset = load_dataset("patched-codes/static-analysis-eval",
@@ -319,21 +291,26 @@ def main():
     data = [{"file_name": item["file_name"], "source": item["source"],
              "cwe": item["cwe"]} for item in eval_dataset]
 
-    manager = multiprocessing.Manager()
-    fixed_files = manager.list()
-    process_func = partial(process_file,
-                           fixed_files=fixed_files,
-                           model_name=model_name,
-                           n_shot=n_shot,
-                           use_similarity=use_similarity)
     total_tests = len(data)
 
-    # Run the evals in parallel
-    with multiprocessing.Pool(processes=max(1, multiprocessing.cpu_count() - 2)) as pool:
-        results = list(tqdm(pool.imap(process_func, data), total=total_tests))
+    # Scan all test cases in one semgrep run and build prompts for the vulnerable ones
+    scanner = SemgrepScanner(workspace="staticeval", config=semgrep_config)
+    reports = scanner.scan({test_case["file_name"]: test_case["source"] for test_case in data})
+    cases = []
+    for test_case in data:
+        prompt = build_case_prompt(test_case, reports[test_case["file_name"]])
+        if prompt is not None:
+            cases.append({"file_name": test_case["file_name"], "prompt": prompt})
+
+    fetch_few_shot_for_cases(cases, n_shot, use_similarity, args.seed)
+
+    # Generate the fixes concurrently, then rescan all of them in one semgrep run
+    fixed_code = asyncio.run(generate_fixes(cases, model_name, args.concurrency, args.responses_cache, args.base_url))
+    fixes = {case["file_name"]: code for case, code in zip(cases, fixed_code) if code is not None}
+    fixed_files = verify_fixes(scanner, fixes)
 
     # Aggregate results and log
-    passing_tests = sum(results)
+    passing_tests = len(fixed_files)
     score = passing_tests / total_tests * 100
     sanitized_model_name = f"{clean_filename(model_name)}-{n_shot}-shot" + (
         "-sim" if use_similarity else "")
@@ -345,7 +322,8 @@ def main():
                     total_tests=total_tests,
                     fixed_files=fixed_files,
                     n_shot=n_shot,
-                    use_similarity=use_similarity)
+                    use_similarity=use_similarity,
+                    semgrep_config=semgrep_config)
 
     print(
         f"Results for static analysis eval: {score:.2f}%\nLog file with results: {log_file_name}")
@@ -0,0 +1,188 @@
+"""
+Few-shot example retrieval over the "patched-codes/synth-vuln-fixes" training set.
+
+The corpus embeddings are computed once and saved next to a manifest holding a hash of the corpus
+and the model name, so later runs memory-map the saved array instead of re-encoding the dataset.
+"""
+
+import hashlib
+import json
+import os
+from typing import List, Optional
+
+import numpy as np
+from datasets import load_dataset
+
+DATASET_PATH = "patched-codes/synth-vuln-fixes"
+RETRIEVAL_MODEL = 'all-MiniLM-L6-v2'
+RERANK_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+INDEX_DIR = "few_shot_index"
+
+
+def user_message(item: dict) -> str:
+    return next(msg['content'] for msg in item['messages'] if msg['role'] == 'user')
+
+
+def corpus_hash(texts: List[str], model_name: str) -> str:
+    """
+    Hashes the corpus together with the embedding model, so the index is rebuilt when either changes.
+    """
+    digest = hashlib.sha256(model_name.encode("utf-8"))
+    for text in texts:
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_corpus_embeddings(texts: List[str], retrieval_model, model_name: str, index_dir: str = INDEX_DIR) -> np.ndarray:
+    """
+    Returns L2-normalized embeddings of `texts`, memory-mapped from `index_dir` when the saved
+    manifest matches the corpus, otherwise encoded and saved there first.
+
+    Args:
+        texts (list): The corpus to embed.
+        retrieval_model (SentenceTransformer): The model used to encode the corpus.
+        model_name (str): The model's name, recorded in the manifest.
+        index_dir (str, optional): Where the embeddings and manifest are stored. Defaults to INDEX_DIR.
+
+    Returns:
+        np.ndarray: A (len(texts), dim) float32 array.
+    """
+    embeddings_path = os.path.join(index_dir, "embeddings.npy")
+    manifest_path = os.path.join(index_dir, "manifest.json")
+    content_hash = corpus_hash(texts, model_name)
+
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get("content_hash") == content_hash:
+            embeddings = np.load(embeddings_path, mmap_mode='r')
+            if embeddings.shape[0] == len(texts):
+                return embeddings
+    except (OSError, ValueError):
+        pass
+
+    embeddings = retrieval_model.encode(
+        texts, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=True).astype(np.float32)
+
+    # The manifest is written last, so an interrupted build is never mistaken for a valid index.
+    os.makedirs(index_dir, exist_ok=True)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    tmp_path = embeddings_path + ".tmp.npy"
+    np.save(tmp_path, embeddings)
+    os.replace(tmp_path, embeddings_path)
+    with open(manifest_path, 'w') as f:
+        json.dump({"content_hash": content_hash, "model": model_name,
+                   "count": int(embeddings.shape[0]), "dim": int(embeddings.shape[1])}, f, indent=2)
+    return np.load(embeddings_path, mmap_mode='r')
+
+
+def prompt_rng(prompt: str, seed: int) -> np.random.Generator:
+    digest = hashlib.sha256(f"{seed}\0{prompt}".encode("utf-8")).digest()
+    return np.random.default_rng(int.from_bytes(digest[:8], "little"))
+
+
+class FewShotIndex:
+    """
+    The training dataset plus, for similarity-based selection, the retrieval and rerank models and
+    the corpus embeddings. Built once per process; selection works on batches of prompts.
+    """
+
+    def __init__(self, use_similarity: bool = False, index_dir: str = INDEX_DIR):
+        self.dataset = load_dataset(DATASET_PATH, split="train")
+        self.use_similarity = use_similarity
+        self.retrieval_model = None
+        self.rerank_model = None
+        self.embeddings: Optional[np.ndarray] = None
+        if use_similarity:
+            from sentence_transformers import CrossEncoder, SentenceTransformer
+
+            self.user_messages = [user_message(item) for item in self.dataset]
+            # lightweight model for initial retrieval
+            self.retrieval_model = SentenceTransformer(RETRIEVAL_MODEL)
+            # cross-encoder model for reranking
+            self.rerank_model = CrossEncoder(RERANK_MODEL)
+            self.embeddings = load_corpus_embeddings(
+                self.user_messages, self.retrieval_model, RETRIEVAL_MODEL, index_dir)
+
+    def retrieve(self, prompts: List[str], top_k: int = 100) -> np.ndarray:
+        """
+        Returns, for each prompt, the indices of the `top_k` most similar training examples, best first.
+        """
+        prompt_embeddings = self.retrieval_model.encode(
+            prompts, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+        # Both sides are normalized, so the dot product is the cosine similarity.
+        similarities = prompt_embeddings @ np.asarray(self.embeddings).T
+        top_k = min(top_k, similarities.shape[1])
+        candidates = np.argpartition(-similarities, top_k - 1, axis=1)[:, :top_k]
+        order = np.argsort(-np.take_along_axis(similarities, candidates, axis=1), axis=1)
+        return np.take_along_axis(candidates, order, axis=1)
+
+    def rerank(self, prompts: List[str], candidates: np.ndarray, num_examples: int) -> List[List[int]]:
+        """
+        Reranks every prompt's candidates with the cross-encoder in a single batched call and keeps the best `num_examples`.
+        """
+        pairs = [[prompt, self.user_messages[idx]] for prompt, row in zip(prompts, candidates) for idx in row]
+        scores = np.asarray(self.rerank_model.predict(pairs)).reshape(len(prompts), -1)
+        return [[int(row[i]) for i in np.argsort(row_scores)[::-1][:num_examples]]
+                for row, row_scores in zip(candidates, scores)]
+
+    def select(self, prompts: List[str], num_examples: int, seed: int = 0) -> List[List[int]]:
+        """
+        Random selection is seeded from `seed` and each prompt, so the same prompt always gets the same
+        examples and cached responses keyed on them stay valid across runs.
+        """
+        if num_examples <= 0 or not prompts:
+            return [[] for _ in prompts]
+        if not self.use_similarity:
+            return [[int(i) for i in prompt_rng(prompt, seed).choice(len(self.dataset), num_examples, replace=False)]
+                    for prompt in prompts]
+        return self.rerank(prompts, self.retrieve(prompts), num_examples)
+
+    def few_shot_messages(self, indices: List[int]) -> List[dict]:
+        """
+        The dialogues of the given training examples, excluding system messages.
+        """
+        few_shot_messages = []
+        for index in indices:
+            messages = self.dataset[index]["messages"]
+            few_shot_messages.extend(msg for msg in messages if msg['role'] != 'system')
+        return few_shot_messages
+
+
+_index: Optional[FewShotIndex] = None
+
+
+def init_few_shot_worker(use_similarity: bool) -> None:
+    """
+    Pool initializer: loads the dataset, models and embeddings once per worker process.
+    """
+    global _index
+    _index = FewShotIndex(use_similarity=use_similarity)
+
+
+def get_few_shot_index(use_similarity: bool) -> FewShotIndex:
+    global _index
+    if _index is None or _index.use_similarity != use_similarity:
+        _index = FewShotIndex(use_similarity=use_similarity)
+    return _index
+
+
+def fetch_few_shot_examples_batch(prompts: List[str], num_examples: int = 0, use_similarity: bool = False,
+                                  seed: int = 0) -> List[List[dict]]:
+    """
+    Fetches few-shot training examples for several prompts at once.
+
+    Args:
+        prompts (list): The input prompts for which few-shot examples are to be fetched.
+        num_examples (int, optional): The number of few-shot examples per prompt. Defaults to 0.
+        use_similarity (bool, optional): If True, selects the most similar examples (cosine retrieval,
+            then cross-encoder reranking); otherwise selects them at random. Defaults to False.
+        seed (int, optional): Seed for the random selection, combined with each prompt. Defaults to 0.
+
+    Returns:
+        list: For each prompt, a list of few-shot training examples in the form of dialogue messages.
+    """
+    index = get_few_shot_index(use_similarity)
+    return [index.few_shot_messages(indices) for indices in index.select(prompts, num_examples, seed)]
@@ -0,0 +1,147 @@
+"""
+Async chat completion requests with bounded concurrency, retries and a persistent response cache.
+
+Every response is appended to a JSONL cache as soon as it arrives, keyed by the model, the prompt and
+the few-shot examples, so an interrupted or repeated run only sends the requests it has no answer for.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+from openai import APIConnectionError, AsyncOpenAI
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def content_hash(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def response_key(model_name: str, prompt: str, few_shot_messages: List[dict]) -> str:
+    return content_hash([model_name, content_hash(prompt), content_hash(few_shot_messages)])
+
+
+class ResponseCache:
+    """
+    Append-only JSONL of completions (`{"key": ..., "content": ...}` per line), flushed after every response.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.responses: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line torn by an interrupted run
+                    self.responses[entry["key"]] = entry["content"]
+        self._file = None
+
+    def get(self, key: str) -> Optional[str]:
+        return self.responses.get(key)
+
+    def record(self, key: str, content: str, **metadata) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a")
+        self._file.write(json.dumps({"key": key, **metadata, "content": content}) + "\n")
+        self._file.flush()
+        self.responses[key] = content
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def is_retryable(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(error, (APIConnectionError, asyncio.TimeoutError))
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """The wait the server asked for, from the `retry-after-ms` or `retry-after` header."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers.get(name)) * scale
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class CompletionGenerator:
+    """
+    Sends chat completions with at most `concurrency` requests in flight. Transient errors are
+    retried with exponential backoff and jitter, honoring the server's retry-after; a 429 pauses
+    every request, not just the one that hit it. Successful responses go to the cache.
+
+    Args:
+        cache (ResponseCache): Where responses are looked up and recorded.
+        concurrency (int): Maximum number of requests in flight.
+        max_retries (int): Retries per request for transient errors.
+        base_url (str, optional): An OpenAI-compatible endpoint, e.g. a local mock for tests.
+            Defaults to the OPENAI_BASE_URL environment variable or the OpenAI API.
+    """
+
+    def __init__(self, cache: ResponseCache, concurrency: int = 8, max_retries: int = 6,
+                 base_delay: float = 1.0, max_delay: float = 60.0, base_url: Optional[str] = None):
+        self.cache = cache
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.base_url = base_url
+        self.client: Optional[AsyncOpenAI] = None
+        self.paused_until = 0.0
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> "CompletionGenerator":
+        # Retries are handled here, so the client's own retry loop is disabled.
+        self.client = AsyncOpenAI(base_url=self.base_url, max_retries=0)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.client.close()
+        self.cache.close()
+
+    async def complete(self, key: str, **request) -> str:
+        """
+        Returns the message content of a chat completion for `request`, from the cache when `key` is in it.
+        """
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        async with self._slots:
+            for attempt in range(self.max_retries + 1):
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                try:
+                    response = await self.client.chat.completions.create(**request)
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries or not is_retryable(e):
+                        raise
+                    delay = retry_after(e)
+                    if delay is None:
+                        delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                    if getattr(e, "status_code", None) == 429:
+                        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                    await asyncio.sleep(delay)
+
+        content = response.choices[0].message.content
+        if content is None:
+            raise ValueError("The model returned no content")
+        self.cache.record(key, content, model=request.get("model"))
+        return content
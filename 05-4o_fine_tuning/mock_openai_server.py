@@ -0,0 +1,94 @@
+"""
+Minimal local stand-in for the OpenAI chat completions endpoint, for exercising eval.py (concurrency,
+retries, the response cache) without spending API credits.
+
+    python mock_openai_server.py --port 8000 --rate-limit-rate 0.1 --error-rate 0.05
+    OPENAI_API_KEY=test python eval.py --base_url http://localhost:8000/v1 --responses_cache mock_responses.jsonl
+
+Every completion echoes back the original code from the prompt, so the fixes it returns are long
+enough to be rescanned (and still fail). A fraction of requests get a 429 with a `retry-after-ms`
+header or a 500.
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def echo_code(prompt: str) -> str:
+    """The code between the first pair of ``` fences in the prompt, fenced as the model would."""
+    match = re.search(r"```\n(.*?)\n\s*```", prompt, re.DOTALL)
+    code = match.group(1) if match else prompt
+    return f"```python\n{code}\n```"
+
+
+def make_handler(latency: float, rate_limit_rate: float, error_rate: float):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status: int, body: dict, headers: dict = None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            roll = random.random()
+            if roll < rate_limit_rate:
+                self.send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                               {"retry-after-ms": "500"})
+                return
+            time.sleep(latency)
+            if roll < rate_limit_rate + error_rate:
+                self.send_json(500, {"error": {"message": "Mock server error", "type": "server_error"}})
+                return
+
+            prompt = body.get("messages", [{}])[-1].get("content", "")
+            self.send_json(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": echo_code(prompt)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 0, "total_tokens": len(prompt) // 4},
+            })
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds to wait before answering.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with a 429.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail with a 500.")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port),
+                                 make_handler(args.latency, args.rate_limit_rate, args.error_rate))
+    print(f"Mock OpenAI API on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,13 @@ The main goal is to produce detailed, step-by-step explanations outlining the re
 """
 
 import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from openai import OpenAI
+from openai import AsyncOpenAI
 from pydantic import BaseModel
 from tenacity import retry, stop_after_attempt, wait_random_exponential
-from tqdm import tqdm
+from util import transform_jsonl
 
-client = OpenAI()
+client = AsyncOpenAI()
 
 chain_of_thought_prompt_template = """You are an AI assistant specializing in code security analysis.
 You will be provided with training data sample containing single vulnerability report, original code, and the corrected code (within the assistant response) that addresses the reported issue.
@@ -44,14 +43,14 @@ def clean_training_data_sample(training_data_sample: str) -> str:
 
 
 @retry(wait=wait_random_exponential(min=20, max=60), stop=stop_after_attempt(3))
-def get_cot_response(training_data_sample: str) -> str:
+async def get_cot_response(training_data_sample: str) -> str:
     messages = [
         {"role": "system", "content": chain_of_thought_prompt_template},
         {"role": "user",
             "content": f"Training Data Sample:\n{clean_training_data_sample(training_data_sample)}"},
     ]
 
-    completion = client.beta.chat.completions.parse(
+    completion = await client.beta.chat.completions.parse(
         model="gpt-4o-2024-08-06",
         messages=messages,
         temperature=0.2,
@@ -64,47 +63,40 @@ def get_cot_response(training_data_sample: str) -> str:
         return message.refusal
 
 
-def process_training_data_sample(training_data_sample: str, func):
-    response = func(training_data_sample)
-    return response
+def add_reasoning_to_sample(training_data_sample: str, response: str) -> dict:
+    """
+    Prepends the reasoning, as a single comment line, to the assistant message of a training data sample.
+    """
+    data = json.loads(training_data_sample)
+    if "messages" in data:
+        for i, message in enumerate(data["messages"]):
+            if message["role"] == "assistant":
+                message["content"] = f'# {response.replace(chr(10), " ")}\n' + \
+                    message["content"]
+                break
+        else:
+            raise ValueError(
+                f"No assistant message found in data: {data}")
+    else:
+        raise KeyError(f"Key 'messages' not found on line: {training_data_sample}")
+    return data
 
 
 def process_file(func: callable, file_path: str, samples: int = None, output_file_suffix: str = None, workers: int = 20):
     """
-    Processes JSONL line by line using the provided function to augment the training data with CoT
-    """
-    with open(file_path, 'r') as file:
-        if samples is not None:
-            lines = [file.readline() for _ in range(samples)]
-        else:
-            lines = file.readlines()
+    Processes JSONL line by line using the provided async function to augment the training data with CoT.
 
+    Lines are streamed with at most `workers` requests in flight and written in input order as they finish.
+    An interrupted run picks up where it stopped when started again (see `util.transform_jsonl`).
+    """
     new_file_path = f"{file_path.rsplit('.', 1)[0]}-{output_file_suffix}.jsonl"
 
-    updated_lines = []
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        future_to_line = {executor.submit(
-            process_training_data_sample, line, func): line for line in lines}
-        for future in tqdm(as_completed(future_to_line), total=len(lines), desc="Processing lines"):
-            response = future.result()
-            line = future_to_line[future]
-            data = json.loads(line)
-            if "messages" in data:
-                for i, message in enumerate(data["messages"]):
-                    if message["role"] == "assistant":
-                        message["content"] = f'# {response.replace(chr(10), " ")}\n' + \
-                            message["content"]
-                        break
-                else:
-                    raise ValueError(
-                        f"No assistant message found in data: {data}")
-            else:
-                raise KeyError(f"Key 'messages' not found on line: {line}")
-            updated_lines.append(json.dumps(data) + "\n")
-
-    with open(new_file_path, 'w') as new_file:
-        new_file.writelines(updated_lines)
-        print(f"File written: {new_file.name}")
+    async def augment(line: str) -> dict:
+        response = await func(line)
+        return add_reasoning_to_sample(line, response)
+
+    transform_jsonl(file_path, new_file_path, augment, window=workers, limit=samples)
+    print(f"File written: {new_file_path}")
 
 
 if __name__ == "__main__":
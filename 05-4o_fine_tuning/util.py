@@ -1,8 +1,15 @@
+import asyncio
 import json
+import os
+import shutil
 import subprocess
-from collections import OrderedDict
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Any, Awaitable, Callable, Optional
 
 from datasets import load_dataset
+from tqdm import tqdm
 
 
 def get_semgrep_version():
@@ -61,25 +68,144 @@ def clean_code_snippet(response):
     return response.strip()
 
 
-def _load_hf_dataset_and_export_to_jsonl(path: str, split_name: str, output_file: str):
+def _export_shard(split_data, num_shards: int, index: int, output_file: str, batch_size: int) -> int:
+    """
+    Writes one contiguous shard of a dataset split as JSONL, converting Arrow record batches to rows a batch at a time.
+    """
+    shard = split_data.shard(num_shards=num_shards, index=index, contiguous=True)
+    counter = 0
+    with open(output_file, "w") as f:
+        for table in shard.with_format("arrow").iter(batch_size=batch_size):
+            rows = table.to_pylist()
+            f.write("".join(json.dumps(row) + "\n" for row in rows))
+            counter += len(rows)
+    return counter
+
+
+def _load_hf_dataset_and_export_to_jsonl(path: str, split_name: str, output_file: str,
+                                         num_proc: Optional[int] = None, batch_size: int = 10_000):
     """
     Loads a huggingface dataset using a given split and exports it to a JSONL file.
+
+    The split is cut into `num_proc` contiguous shards (default: one per core) that are exported in
+    parallel and concatenated in order, so the output matches a row-by-row export.
     """
     try:
         dataset = load_dataset(path=path)
         split_data = dataset[split_name]
 
-        counter = 0
-        with open(output_file, "w") as f:
-            for item in split_data:
-                json.dump(OrderedDict(item), f)
-                counter += f.write("\n")
+        num_proc = max(1, min(num_proc or os.cpu_count() or 1, len(split_data)))
+        if num_proc == 1:
+            counter = _export_shard(split_data, 1, 0, output_file, batch_size)
+        else:
+            part_files = [f"{output_file}.part{index}" for index in range(num_proc)]
+            try:
+                with ProcessPoolExecutor(max_workers=num_proc) as executor:
+                    counter = sum(executor.map(_export_shard, repeat(split_data), repeat(num_proc),
+                                               range(num_proc), part_files, repeat(batch_size)))
+                with open(output_file, "wb") as f:
+                    for part_file in part_files:
+                        with open(part_file, "rb") as part:
+                            shutil.copyfileobj(part, f)
+            finally:
+                for part_file in part_files:
+                    if os.path.exists(part_file):
+                        os.remove(part_file)
 
         print(f"{counter} lines converted and saved to {output_file}")
     except Exception as e:
         print(f"An error occurred while loading or exporting the dataset: {e}")
 
 
+def transform_jsonl(input_file: str,
+                    output_file: str,
+                    transform: Callable[[str], Awaitable[Any]],
+                    window: int = 20,
+                    limit: Optional[int] = None,
+                    checkpoint_every: int = 100,
+                    desc: str = "Processing lines") -> int:
+    """
+    Streams a JSONL file through an async transform and writes the results, in input order, to another JSONL file.
+
+    At most `window` lines are in flight at once, so memory stays flat however large the file is.
+    Every `checkpoint_every` lines the input and output byte offsets are saved to `<output_file>.checkpoint`.
+    If the run is interrupted or a transform fails, calling this again resumes after the last checkpointed line.
+    The checkpoint is removed once the whole input has been processed.
+
+    Args:
+        input_file (str): The JSONL file to read.
+        output_file (str): The JSONL file to write.
+        transform (callable): Async function receiving an input line and returning a JSON-serializable result.
+        window (int, optional): Maximum number of lines being transformed at once. Defaults to 20.
+        limit (int, optional): Stop after this many lines. Defaults to None (the whole file).
+        checkpoint_every (int, optional): Lines written between checkpoints. Defaults to 100.
+        desc (str, optional): Progress bar label.
+
+    Returns:
+        int: The number of lines in the output file.
+    """
+    return asyncio.run(_transform_jsonl(input_file, output_file, transform, max(1, window), limit,
+                                        max(1, checkpoint_every), desc))
+
+
+async def _transform_jsonl(input_file, output_file, transform, window, limit, checkpoint_every, desc) -> int:
+    checkpoint_file = f"{output_file}.checkpoint"
+    state = {"input_offset": 0, "output_offset": 0, "lines": 0}
+    if os.path.exists(checkpoint_file) and os.path.exists(output_file):
+        with open(checkpoint_file, "r") as f:
+            state = json.load(f)
+        print(f"Resuming {output_file} after {state['lines']} lines")
+
+    def save_checkpoint(dst) -> None:
+        dst.flush()
+        state["output_offset"] = dst.tell()
+        with open(checkpoint_file + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(checkpoint_file + ".tmp", checkpoint_file)
+
+    with open(input_file, "rb") as src, open(output_file, "r+b" if state["lines"] else "wb") as dst, \
+            tqdm(total=limit, initial=state["lines"], desc=desc) as progress:
+        # Anything written after the last checkpoint is dropped and redone.
+        dst.truncate(state["output_offset"])
+        dst.seek(state["output_offset"])
+        src.seek(state["input_offset"])
+        input_offset = state["input_offset"]
+        pending = deque()  # (task, offset just past its input line)
+
+        async def write_oldest():
+            task, end_offset = pending.popleft()
+            result = await task
+            dst.write((json.dumps(result) + "\n").encode("utf-8"))
+            state["input_offset"] = end_offset
+            state["lines"] += 1
+            progress.update(1)
+            if state["lines"] % checkpoint_every == 0:
+                save_checkpoint(dst)
+
+        try:
+            while limit is None or state["lines"] + len(pending) < limit:
+                line = src.readline()
+                if not line:
+                    break
+                input_offset += len(line)
+                if not line.strip():
+                    continue
+                pending.append((asyncio.ensure_future(transform(line.decode("utf-8"))), input_offset))
+                if len(pending) >= window:
+                    await write_oldest()
+            while pending:
+                await write_oldest()
+        except BaseException:
+            for task, _ in pending:
+                task.cancel()
+            save_checkpoint(dst)
+            raise
+
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    return state["lines"]
+
+
 if __name__ == "__main__":
     _load_hf_dataset_and_export_to_jsonl(
         "patched-codes/synth-vuln-fixes", "train", "synth-vuln-fixes-train.jsonl")
@@ -4,9 +4,20 @@ class Config:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     QDRANT_HOST = 'localhost'
     QDRANT_PORT = 6333
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")  # "local" searches an in-process index instead
+    LOCAL_VECTOR_INDEX_PATH = "vector_index"
     CSV_FILE_PATH = "upload-data/fake_hardware_data.csv"
+    CATALOG_DIR = "upload-data/catalog"  # binary copy of the CSV: vectors.npy + payloads.parquet
     COLLECTION_NAME = "fake_hardware_data"
     EMBEDDING_MODEL = "text-embedding-3-small"  
+    EMBEDDING_CACHE_PATH = "embedding_cache.sqlite3"
+    EMBEDDING_BATCH_SIZE = 256
+    EMBEDDING_MAX_CONCURRENCY = 4
+    EXPANSION_CACHE_SIZE = 256  # (query, past purchases) -> expanded categories
+    QUERY_EMBEDDING_CACHE_SIZE = 1024
+    SEARCH_CACHE_SIZE = 1024  # (query, category, top_k) -> results
+    SEARCH_CACHE_TTL = 300  # seconds before cached results are re-fetched
+    SEARCH_MAX_WORKERS = 8  # concurrent category searches
     VECTOR_SIZE = 1536  
     MAX_WORKERS = 100  
     BATCH_SIZE = 100 
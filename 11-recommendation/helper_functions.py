@@ -1,21 +1,96 @@
+import hashlib
 import json
 import logging
+import threading
+import time
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import Any, Dict, List
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
 
 from openai import OpenAI
 from pydantic import BaseModel
 from qdrant_client import QdrantClient, models
 
 from config import Config
+from embedding_service import EmbeddingCache, EmbeddingService, OpenAIEmbedder
 
 openai_client = OpenAI()  # Corrected client initialization
-qdrant_client = QdrantClient(host=Config.QDRANT_HOST, port=Config.QDRANT_PORT)
+if Config.VECTOR_BACKEND == "local":
+    # Same client interface, served from memory-mapped files; no Qdrant server needed.
+    from local_vector_index import LocalQdrantClient
+    qdrant_client = LocalQdrantClient(Config.LOCAL_VECTOR_INDEX_PATH, index_fields=["category"])
+else:
+    qdrant_client = QdrantClient(host=Config.QDRANT_HOST, port=Config.QDRANT_PORT)
+# Batches and caches embedding requests; set `embedding_service.embedder` to a `HashEmbedder` to run offline.
+embedding_service = EmbeddingService(
+    OpenAIEmbedder(openai_client),
+    Config.EMBEDDING_MODEL,
+    cache=EmbeddingCache(Config.EMBEDDING_CACHE_PATH),
+    max_batch_size=Config.EMBEDDING_BATCH_SIZE,
+    max_concurrency=Config.EMBEDDING_MAX_CONCURRENCY,
+)
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class LRUCache:
+    """
+    Small thread-safe LRU; the caches below live for the whole Streamlit server process.
+    With `ttl` set, entries older than `ttl` seconds are treated as missing.
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key not in self._items:
+                return None
+            value, stored_at = self._items[key]
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._items[key] = (value, time.monotonic())
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+expansion_cache = LRUCache(Config.EXPANSION_CACHE_SIZE)
+query_embedding_cache = LRUCache(Config.QUERY_EMBEDDING_CACHE_SIZE)
+# Results expire so a collection rebuilt by upload-to-qdrant.py (another process) is picked up.
+search_cache = LRUCache(Config.SEARCH_CACHE_SIZE, ttl=Config.SEARCH_CACHE_TTL)
+
+
+def clear_search_cache() -> None:
+    """Drop cached search results, e.g. after the collection has been re-uploaded."""
+    search_cache.clear()
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def past_purchases_fingerprint(past_history: List[Dict[str, Any]]) -> str:
+    """Stable hash of the purchases that shape an expansion, independent of their order."""
+    items = sorted(json.dumps(purchase, sort_keys=True, default=str) for purchase in past_history)
+    return hashlib.sha256("\n".join(items).encode("utf-8")).hexdigest()
+
 ## Both Pages:  User Info
 
 def get_past_purchases() -> List[Dict[str, Any]]:
@@ -255,7 +330,13 @@ def expand_query_with_llm(query: str,  past_history: List[Dict[str, Any]]) -> st
     :param query: The user's input message.
     :param past_history: A list of dictionaries representing the user's past history.
     :return: An expanded query string.
+    Successful expansions are cached per (query, past purchases).
     """
+    cache_key = (normalize_query(query), past_purchases_fingerprint(past_history))
+    cached = expansion_cache.get(cache_key)
+    if cached is not None:
+        logger.info("Query expansion served from cache.")
+        return cached
     try:
         # Prepare the prompt for the language model
         # Format past purchases as per the expected template
@@ -314,6 +395,7 @@ def expand_query_with_llm(query: str,  past_history: List[Dict[str, Any]]) -> st
         # Extract the generated text
         expanded_query = response.choices[0].message.content
         logger.info("Query expanded successfully using LLM.")
+        expansion_cache.put(cache_key, expanded_query)
         return expanded_query
 
     except Exception as e:
@@ -324,16 +406,74 @@ def expand_query_with_llm(query: str,  past_history: List[Dict[str, Any]]) -> st
 def generate_embeddings(text: str) -> List[float]:
     """
     Generates embeddings for a given text using OpenAI's embedding model.
+    Recent texts are served from memory, older ones from the local embedding cache.
     """     
     try:
-        response = openai_client.embeddings.create(input=[text], model=Config.EMBEDDING_MODEL)
+        embedding = query_embedding_cache.get(text)
+        if embedding is None:
+            embedding = embedding_service.embed(text)
+            query_embedding_cache.put(text, embedding)
         logger.info(f"Embedding retrieved successfully.")
-        return response.data[0].embedding
+        return list(embedding)
     except Exception as e:
         logger.error(f"Failed to get embedding for text '{text}': {e}")
         return []
 
+def generate_embeddings_batch(texts: List[str]) -> List[List[float]]:
+    """
+    Generates embeddings for many texts at once, in as few batched requests as possible.
+
+    :param texts: The texts to embed.
+    :return: One embedding per text, in order (an empty list for every text if the request fails).
+    """
+    try:
+        return embedding_service.embed_many(texts)
+    except Exception as e:
+        logger.error(f"Failed to get embeddings for {len(texts)} texts: {e}")
+        return [[] for _ in texts]
+
 ## Query Qdrant
+def category_filter(category: str) -> models.Filter:
+    return models.Filter(
+        must=[
+            models.FieldCondition(
+                key="category",
+                match=models.MatchValue(
+                    value=category,
+                ),
+            )
+        ]
+    )
+
+
+def search_category(query: str, query_vector: List[float], category: str, top_k: int = 10) -> List[Dict[str, Any]]:
+    """
+    Searches one category with an already embedded query; results are cached per (query, category, top_k).
+    """
+    # Keyed on the exact text that is embedded, so differently cased queries do not share results.
+    cache_key = (query, category, top_k)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    search_result = qdrant_client.search(
+        collection_name=Config.COLLECTION_NAME,
+        query_vector=query_vector,
+        limit=top_k,
+        query_filter=category_filter(category),
+        search_params=models.SearchParams(exact=False),
+    )
+    results = [
+        {
+            "id": hit.id,
+            "payload": hit.payload
+        }
+        for hit in search_result
+    ]
+    search_cache.put(cache_key, results)
+    return results
+
+
 def query_qdrant(query: str, category: str, top_k: int = 10) -> List[Dict[str, Any]]:
     """
     Queries the Qdrant collection to find the top K most similar items to the given query vector.
@@ -350,42 +490,54 @@ def query_qdrant(query: str, category: str, top_k: int = 10) -> List[Dict[str, A
             logger.error("Empty query string. Cannot perform query.")
             return []
         else:   
+            cached = search_cache.get((query, category, top_k))
+            if cached is not None:
+                logger.info(f"Query served from cache. Retrieved {len(cached)} results.")
+                return cached
             # Generate embeddings for the query
             query_vector = generate_embeddings(query)
             # Perform the search with filter
-            search_result = qdrant_client.search(
-                collection_name=Config.COLLECTION_NAME,
-                query_vector=query_vector,
-                limit=top_k,
-                query_filter=models.Filter(
-                    must=[
-                        models.FieldCondition(
-                            key="category",
-                            match=models.MatchValue(
-                                value=category,
-                            ),
-                        )
-                    ]
-                ),
-                search_params=models.SearchParams(exact=False),
-            )
-            
-            logger.info(f"Query successful. Retrieved {len(search_result)} results.")
-            
-            # Extract and return the results
-            results = [
-                {
-                    "id": hit.id,
-                    "payload": hit.payload
-                }
-                for hit in search_result
-            ]
+            results = search_category(query, query_vector, category, top_k)
+            logger.info(f"Query successful. Retrieved {len(results)} results.")
             return results
     
     except Exception as e:
         logger.error(f"Failed to query Qdrant: {e}")
         return []
 
+
+def query_qdrant_all_categories(query: str, categories: Sequence[str], top_k: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Searches several categories for the same query: the query is embedded once and the filtered
+    searches run concurrently, so the wait is one search round trip rather than one per category.
+
+    :param query: The query string.
+    :param categories: The categories to search.
+    :param top_k: The number of results per category.
+    :return: The results for each category (an empty list for categories whose search failed).
+    """
+    if not query or not categories:
+        return {category: [] for category in categories}
+    cached = {category: search_cache.get((query, category, top_k)) for category in categories}
+    if all(results is not None for results in cached.values()):
+        return cached
+    query_vector = generate_embeddings(query)
+    if not query_vector:
+        return {category: [] for category in categories}
+
+    def search(category: str) -> List[Dict[str, Any]]:
+        try:
+            return search_category(query, query_vector, category, top_k)
+        except Exception as e:
+            logger.error(f"Failed to query Qdrant for category '{category}': {e}")
+            return []
+
+    max_workers = max(1, min(len(categories), Config.SEARCH_MAX_WORKERS))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(zip(categories, executor.map(search, categories)))
+    logger.info(f"Searched {len(categories)} categories with query: '{query}'")
+    return results
+
 ### Page 2: 
 def get_propensity_recommendations() -> List[Dict[str, Any]]:
     """
@@ -0,0 +1,463 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.f32"
+POINTS_FILE = "points.jsonl"
+IVF_FILE = "ivf.npz"
+SUPPORTED_DISTANCES = ("Cosine", "Dot")
+
+
+class ScoredPoint(NamedTuple):
+    id: Any
+    score: float
+    payload: Dict
+
+
+def _atomic_write(path: str, write) -> None:
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp.", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _index_values(value) -> List:
+    """Payload values that are lists are indexed element by element, as Qdrant does."""
+    values = value if isinstance(value, (list, tuple)) else [value]
+    return [v for v in values if isinstance(v, (str, int, float, bool))]
+
+
+class LocalVectorIndex:
+    """
+    In-process vector collection stored in a folder.
+
+    Vectors are appended as raw float32 rows to `vectors.f32` and searched through a read-only
+    memory map with one matrix-vector product and `argpartition` for the top k, so opening a
+    collection only maps the file and reads its point log. `points.jsonl` records every upsert
+    (id, row, payload) and delete; replaying it rebuilds the id map, and rows that were replaced
+    or deleted are skipped until `compact` rewrites the files.
+
+    Payload fields listed in `index_fields` get an inverted index (value -> rows), so filters on
+    them select candidate rows without touching payloads. With `mode="ivf"` and a built IVF
+    (`build_ivf`), unfiltered or broadly filtered searches only score the rows of the `n_probe`
+    lists closest to the query; narrow filters are always scored exactly.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        dim: Optional[int] = None,
+        distance: str = "Cosine",
+        index_fields: Sequence[str] = (),
+        mode: str = "exact",
+        n_probe: int = 8,
+        exact_below: int = 20_000,
+    ):
+        self.folder = folder
+        self.n_probe = n_probe
+        self.exact_below = exact_below
+        self._lock = threading.RLock()
+        meta_path = os.path.join(folder, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+        else:
+            if dim is None:
+                raise ValueError(f"No vector index in {folder}; a dimension is needed to create one.")
+            if distance not in SUPPORTED_DISTANCES:
+                raise ValueError(f"Unsupported distance '{distance}'; expected one of {SUPPORTED_DISTANCES}.")
+            os.makedirs(folder, exist_ok=True)
+            meta = {"dim": dim, "distance": distance, "index_fields": list(index_fields), "mode": mode}
+            _atomic_write(meta_path, lambda f: f.write(json.dumps(meta).encode("utf-8")))
+        self.dim = meta["dim"]
+        self.distance = meta["distance"]
+        self.index_fields = list(meta["index_fields"])
+        self.mode = meta.get("mode", "exact")
+        self._load()
+
+    # Loading
+
+    def _load(self) -> None:
+        self._ids: List[Any] = []
+        self._payloads: List[Optional[Dict]] = []
+        self._row_of: Dict[Any, int] = {}
+        self._postings: Dict[str, Dict[Any, List[int]]] = {field: {} for field in self.index_fields}
+        self._posting_arrays: Dict[tuple, np.ndarray] = {}
+        rows_on_disk = self._rows_on_disk()
+        try:
+            with open(os.path.join(self.folder, POINTS_FILE), "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line torn by a crash
+                    if entry.get("deleted"):
+                        self._forget(entry["id"])
+                    elif entry["row"] < rows_on_disk:
+                        self._remember(entry["id"], entry["row"], entry.get("payload") or {})
+        except OSError:
+            pass
+        self._alive = np.zeros(len(self._ids), dtype=bool)
+        for row in self._row_of.values():
+            self._alive[row] = True
+        self._map_vectors(len(self._ids))
+        self._load_ivf()
+
+    def _rows_on_disk(self) -> int:
+        path = os.path.join(self.folder, VECTORS_FILE)
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // (4 * self.dim)
+
+    def _map_vectors(self, rows: int) -> None:
+        if rows == 0:
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            return
+        self._matrix = np.memmap(
+            os.path.join(self.folder, VECTORS_FILE), dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def _remember(self, point_id, row: int, payload: Dict) -> None:
+        self._forget(point_id)
+        while len(self._ids) <= row:
+            self._ids.append(None)
+            self._payloads.append(None)
+        self._ids[row] = point_id
+        self._payloads[row] = payload
+        self._row_of[point_id] = row
+        for field in self.index_fields:
+            for value in _index_values(payload.get(field)):
+                self._postings[field].setdefault(value, []).append(row)
+        self._posting_arrays.clear()
+
+    def _forget(self, point_id) -> None:
+        row = self._row_of.pop(point_id, None)
+        if row is None:
+            return
+        # Posting lists keep the dead row; it is masked out by `_alive` at query time.
+        self._ids[row] = None
+        self._payloads[row] = None
+        if row < len(getattr(self, "_alive", ())):
+            self._alive[row] = False
+
+    # Writing
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def upsert(self, ids: Sequence, vectors, payloads: Optional[Sequence[Dict]] = None) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids for {len(vectors)} vectors.")
+        payloads = list(payloads) if payloads is not None else [{} for _ in ids]
+        if self.distance == "Cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+        with self._lock:
+            start = self._rows_on_disk()
+            with open(os.path.join(self.folder, VECTORS_FILE), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(os.path.join(self.folder, POINTS_FILE), "a") as f:
+                for offset, (point_id, payload) in enumerate(zip(ids, payloads)):
+                    f.write(json.dumps({"id": point_id, "row": start + offset, "payload": payload}) + "\n")
+            self._alive = np.concatenate([self._alive, np.zeros(len(ids), dtype=bool)])
+            for offset, (point_id, payload) in enumerate(zip(ids, payloads)):
+                self._remember(point_id, start + offset, payload or {})
+                self._alive[start + offset] = True
+            # A later duplicate id in the same batch replaces the earlier one.
+            for offset, point_id in enumerate(ids):
+                self._alive[start + offset] = self._row_of.get(point_id) == start + offset
+            self._map_vectors(start + len(ids))
+            if self._ivf is not None:
+                self._assign_new_rows()
+
+    def delete(self, ids: Iterable) -> None:
+        with self._lock:
+            ids = [point_id for point_id in ids if point_id in self._row_of]
+            if not ids:
+                return
+            with open(os.path.join(self.folder, POINTS_FILE), "a") as f:
+                for point_id in ids:
+                    f.write(json.dumps({"id": point_id, "deleted": True}) + "\n")
+            for point_id in ids:
+                self._forget(point_id)
+            if len(self._ids) > 1000 and len(self._row_of) < len(self._ids) // 2:
+                self.compact()
+
+    def compact(self) -> None:
+        """Rewrite the vector file and point log with live rows only."""
+        with self._lock:
+            rows = np.flatnonzero(self._alive)
+            matrix = np.asarray(self._matrix[rows]) if len(rows) else np.zeros((0, self.dim), np.float32)
+            entries = [(self._ids[row], self._payloads[row]) for row in rows]
+            ivf_assignments = self._ivf_assignments[rows] if self._ivf is not None else None
+
+            _atomic_write(os.path.join(self.folder, VECTORS_FILE), lambda f: f.write(matrix.tobytes()))
+            lines = "".join(
+                json.dumps({"id": point_id, "row": row, "payload": payload}) + "\n"
+                for row, (point_id, payload) in enumerate(entries))
+            _atomic_write(os.path.join(self.folder, POINTS_FILE), lambda f: f.write(lines.encode("utf-8")))
+            if ivf_assignments is not None:
+                self._save_ivf(self._ivf, ivf_assignments)
+            self._load()
+
+    # IVF
+
+    def _load_ivf(self) -> None:
+        self._ivf: Optional[np.ndarray] = None
+        self._ivf_assignments = np.zeros(0, dtype=np.int32)
+        self._ivf_lists: List[np.ndarray] = []
+        path = os.path.join(self.folder, IVF_FILE)
+        if self.mode != "ivf" or not os.path.exists(path):
+            return
+        with np.load(path) as data:
+            self._ivf = data["centroids"]
+            assignments = data["assignments"]
+        self._ivf_assignments = assignments[:len(self._ids)]
+        self._assign_new_rows()
+
+    def _save_ivf(self, centroids: np.ndarray, assignments: np.ndarray) -> None:
+        _atomic_write(os.path.join(self.folder, IVF_FILE),
+                      lambda f: np.savez(f, centroids=centroids, assignments=assignments))
+
+    def _nearest_centroids(self, rows: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+        out = np.empty(len(rows), dtype=np.int32)
+        for start in range(0, len(rows), chunk_size):
+            block = np.asarray(self._matrix[rows[start:start + chunk_size]])
+            out[start:start + chunk_size] = np.argmax(block @ self._ivf.T, axis=1)
+        return out
+
+    def _assign_new_rows(self) -> None:
+        done = len(self._ivf_assignments)
+        if done < len(self._ids):
+            new_rows = np.arange(done, len(self._ids))
+            self._ivf_assignments = np.concatenate([self._ivf_assignments, self._nearest_centroids(new_rows)])
+        order = np.argsort(self._ivf_assignments, kind="stable")
+        bounds = np.searchsorted(self._ivf_assignments[order], np.arange(len(self._ivf) + 1))
+        self._ivf_lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self._ivf))]
+
+    def build_ivf(self, n_lists: Optional[int] = None, iterations: int = 10, sample_size: int = 100_000,
+                  seed: int = 0) -> None:
+        """
+        Cluster the live vectors with spherical k-means (default: sqrt(n) lists) and switch the
+        index to IVF mode. Points added later are assigned to their nearest existing list.
+        """
+        with self._lock:
+            rows = np.flatnonzero(self._alive)
+            if len(rows) == 0:
+                return
+            n_lists = min(len(rows), n_lists or max(1, int(np.sqrt(len(rows)))))
+            rng = np.random.default_rng(seed)
+            sample = np.asarray(self._matrix[np.sort(rng.choice(rows, min(sample_size, len(rows)), replace=False))])
+            centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                for i in range(n_lists):
+                    members = sample[labels == i]
+                    if len(members):
+                        centroids[i] = members.mean(axis=0)
+                norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+                centroids /= np.where(norms == 0, 1, norms)
+            self._ivf = centroids.astype(np.float32)
+            self._ivf_assignments = self._nearest_centroids(np.arange(len(self._ids)))
+            self._assign_new_rows()
+            self._save_ivf(self._ivf, self._ivf_assignments)
+            if self.mode != "ivf":
+                self.mode = "ivf"
+                meta = {"dim": self.dim, "distance": self.distance, "index_fields": self.index_fields, "mode": "ivf"}
+                _atomic_write(os.path.join(self.folder, META_FILE), lambda f: f.write(json.dumps(meta).encode("utf-8")))
+
+    # Searching
+
+    def _posting_rows(self, field: str, values: Sequence) -> np.ndarray:
+        key = (field, tuple(values))
+        rows = self._posting_arrays.get(key)
+        if rows is None:
+            postings = self._postings[field]
+            parts = [np.asarray(postings[value], dtype=np.int64) for value in values if value in postings]
+            rows = np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+            self._posting_arrays[key] = rows
+        return rows
+
+    def _filter_rows(self, filter: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Rows matching every field (any of its values); None means no filter."""
+        rows = None
+        for field, value in filter.items():
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            if field in self._postings:
+                matches = self._posting_rows(field, values)
+            else:
+                wanted = set(values)
+                matches = np.array([
+                    row for row, payload in enumerate(self._payloads)
+                    if payload is not None and wanted.intersection(_index_values(payload.get(field)))
+                ], dtype=np.int64)
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+        return rows
+
+    def search(self, vector, limit: int = 10, filter: Optional[Dict[str, Any]] = None,
+               exact: bool = False) -> List[ScoredPoint]:
+        """
+        Top `limit` points by similarity (cosine or dot product). `filter` maps payload fields to
+        a value or a list of accepted values; all fields must match.
+        """
+        query = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if self.distance == "Cosine":
+            norm = np.linalg.norm(query)
+            query = query / norm if norm else query
+        with self._lock:
+            rows = self._filter_rows(filter) if filter else None
+            candidates = len(self._row_of) if rows is None else len(rows)
+            if self._ivf is not None and not exact and candidates >= self.exact_below:
+                probes = np.argsort(-(self._ivf @ query))[:self.n_probe]
+                probed = np.sort(np.concatenate([self._ivf_lists[i] for i in probes]))
+                rows = probed if rows is None else np.intersect1d(rows, probed, assume_unique=True)
+
+            if rows is None:
+                scores = np.asarray(self._matrix @ query)
+                scores[~self._alive] = -np.inf
+                rows = np.arange(len(scores))
+            else:
+                rows = rows[self._alive[rows]]
+                scores = np.asarray(self._matrix[rows] @ query) if len(rows) else np.zeros(0, np.float32)
+
+            k = min(limit, int(np.isfinite(scores).sum()))
+            if k <= 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [ScoredPoint(self._ids[rows[i]], float(scores[i]), self._payloads[rows[i]]) for i in top]
+
+
+class LocalQdrantClient:
+    """
+    Drop-in for the part of `QdrantClient` these demos use (get_collections, get_collection,
+    collection_exists, recreate_collection, upsert, delete, search), backed by one LocalVectorIndex
+    per collection under `path`. Lets the apps run without a Qdrant server.
+    """
+
+    def __init__(self, path: str, index_fields: Sequence[str] = (), mode: str = "exact"):
+        self.path = path
+        self.index_fields = list(index_fields)
+        self.mode = mode
+        self._collections: Dict[str, LocalVectorIndex] = {}
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _folder(self, collection_name: str) -> str:
+        return os.path.join(self.path, collection_name)
+
+    def collection(self, collection_name: str) -> LocalVectorIndex:
+        with self._lock:
+            index = self._collections.get(collection_name)
+            if index is None:
+                if not os.path.exists(os.path.join(self._folder(collection_name), META_FILE)):
+                    raise ValueError(f"Collection '{collection_name}' not found")
+                index = self._collections[collection_name] = LocalVectorIndex(self._folder(collection_name))
+            return index
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return os.path.exists(os.path.join(self._folder(collection_name), META_FILE))
+
+    def get_collections(self):
+        names = sorted(name for name in os.listdir(self.path) if self.collection_exists(name))
+        return SimpleNamespace(collections=[SimpleNamespace(name=name) for name in names])
+
+    def get_collection(self, collection_name: str):
+        index = self.collection(collection_name)
+        vectors = SimpleNamespace(size=index.dim, distance=index.distance)
+        return SimpleNamespace(
+            config=SimpleNamespace(params=SimpleNamespace(vectors=vectors)),
+            points_count=len(index))
+
+    def create_collection(self, collection_name: str, vectors_config, **kwargs) -> bool:
+        if self.collection_exists(collection_name):
+            raise ValueError(f"Collection '{collection_name}' already exists")
+        distance = getattr(vectors_config.distance, "value", vectors_config.distance)
+        index = LocalVectorIndex(
+            self._folder(collection_name), vectors_config.size, distance, self.index_fields, self.mode)
+        with self._lock:
+            self._collections[collection_name] = index
+        return True
+
+    def recreate_collection(self, collection_name: str, vectors_config, **kwargs) -> bool:
+        self.delete_collection(collection_name)
+        return self.create_collection(collection_name, vectors_config)
+
+    def delete_collection(self, collection_name: str, **kwargs) -> bool:
+        with self._lock:
+            self._collections.pop(collection_name, None)
+        if os.path.exists(self._folder(collection_name)):
+            shutil.rmtree(self._folder(collection_name))
+            return True
+        return False
+
+    def upsert(self, collection_name: str, points, **kwargs):
+        def field(point, name):
+            return point[name] if isinstance(point, dict) else getattr(point, name)
+
+        points = list(points)
+        if points:
+            self.collection(collection_name).upsert(
+                [field(p, "id") for p in points],
+                [field(p, "vector") for p in points],
+                [field(p, "payload") or {} for p in points])
+        return SimpleNamespace(status="completed")
+
+    def delete(self, collection_name: str, points_selector, **kwargs):
+        ids = getattr(points_selector, "points", points_selector)
+        self.collection(collection_name).delete(ids)
+        return SimpleNamespace(status="completed")
+
+    def search(self, collection_name: str, query_vector, limit: int = 10, query_filter=None,
+               search_params=None, **kwargs) -> List[ScoredPoint]:
+        exact = bool(getattr(search_params, "exact", False))
+        return self.collection(collection_name).search(
+            query_vector, limit, self._convert_filter(query_filter), exact=exact)
+
+    @staticmethod
+    def _convert_filter(query_filter) -> Optional[Dict[str, Any]]:
+        """
+        Translates a Qdrant Filter of `must` match conditions, or `should` match conditions on a
+        single field, into a {field: accepted values} filter.
+        """
+        if query_filter is None:
+            return None
+
+        def accepted(condition) -> List:
+            match = condition.match
+            if getattr(match, "any", None) is not None:
+                return list(match.any)
+            return [match.value]
+
+        result: Dict[str, List] = {}
+        for condition in getattr(query_filter, "must", None) or []:
+            values = accepted(condition)
+            if condition.key in result:
+                values = [value for value in result[condition.key] if value in values]
+            result[condition.key] = values
+        should = getattr(query_filter, "should", None) or []
+        if should:
+            keys = {condition.key for condition in should}
+            if len(keys) != 1:
+                raise ValueError("Only `should` conditions on a single field are supported locally.")
+            values = [value for condition in should for value in accepted(condition)]
+            key = keys.pop()
+            result[key] = [value for value in result[key] if value in values] if key in result else values
+        if getattr(query_filter, "must_not", None):
+            raise ValueError("`must_not` filters are not supported locally.")
+        return result
@@ -2,7 +2,8 @@ import streamlit as st
 from helper_functions import (
     expand_query_with_llm,
     get_past_purchases,
-    query_qdrant
+    query_qdrant,
+    query_qdrant_all_categories
 )
 import json
 import logging
@@ -57,6 +58,21 @@ def main():
 
     if st.session_state.expanded_query:
         categories_data = st.session_state.expanded_query.get("categories", [])
+        category_names = [category.get("item", "Unknown Category") for category in categories_data]
+
+        # One search across every category: the query is embedded once and the categories are searched concurrently
+        with st.form(key='search_form_all_categories'):
+            search_all_query = st.text_input("Search all categories:", key='search_input_all_categories')
+            search_all_button = st.form_submit_button(label="Search all categories")
+
+            if search_all_button:
+                if search_all_query.strip() == "":
+                    st.warning("Please enter a search query.")
+                else:
+                    with st.spinner("Searching all categories..."):
+                        st.session_state.search_results.update(
+                            query_qdrant_all_categories(search_all_query, category_names))
+
         for category in categories_data:
             category_name = category.get("item", "Unknown Category")
             st.header(category_name)
@@ -100,7 +116,7 @@ def main():
                         st.write(f"**Title:** {item.get('payload', {}).get('product_name', 'No Title')}")
                         st.write(f"**Description:** {item.get('payload', {}).get('detailed_description', 'No Description')}")
                         st.markdown("---")
-            elif search_button:
+            elif search_button or search_all_button:
                 st.info("No results found.")
 
 if __name__ == "__main__":
@@ -1,8 +1,15 @@
 import csv
+import json
 import logging
-import ast
-from typing import List, Dict, Any
+import os
+import shutil
+import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Tuple
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 from qdrant_client import QdrantClient
 from qdrant_client.http.models import VectorParams, PointStruct
 from config import Config
@@ -13,37 +20,112 @@ logger = logging.getLogger(__name__)
 # Configuration
 
 # Initialize Qdrant client 
-qdrant_client = QdrantClient(host=Config.QDRANT_HOST, port=Config.QDRANT_PORT)
+if Config.VECTOR_BACKEND == "local":
+    # Writes the in-process index the app reads when VECTOR_BACKEND=local.
+    from local_vector_index import LocalQdrantClient
+    qdrant_client = LocalQdrantClient(Config.LOCAL_VECTOR_INDEX_PATH, index_fields=["category"])
+else:
+    qdrant_client = QdrantClient(host=Config.QDRANT_HOST, port=Config.QDRANT_PORT)
 
-def read_csv_data(csv_file_path: str) -> List[Dict[str, Any]]:
+PAYLOAD_COLUMNS = ["product_id", "product_name", "category", "price", "detailed_description"]
+
+
+def catalog_paths(catalog_dir: str) -> Dict[str, str]:
+    return {
+        "vectors": os.path.join(catalog_dir, "vectors.npy"),
+        "payloads": os.path.join(catalog_dir, "payloads.parquet"),
+        "meta": os.path.join(catalog_dir, "meta.json"),
+    }
+
+
+def source_fingerprint(csv_file_path: str) -> Dict[str, Any]:
+    stat = os.stat(csv_file_path)
+    return {"source": os.path.abspath(csv_file_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def parse_embedding(embedding_str: str, vector_size: int) -> Optional[np.ndarray]:
     """
-    Reads data from a CSV file and returns a list of dictionaries.
+    Parses a "[0.1, 0.2, ...]" embedding string straight into float32, or returns None if it is
+    missing or malformed.
     """
-    data_entries = []
+    if not embedding_str:
+        return None
+    text = embedding_str.strip()
+    if text.startswith("[") and text.endswith("]"):
+        text = text[1:-1]
     try:
-        with open(csv_file_path, mode='r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                # Convert data types as necessary
-                row['price'] = float(row['price']) if row['price'] else None
-                embedding_str = row.get('embedded_description')
-                if embedding_str:
-                    try:
-                        row['embedded_description'] = ast.literal_eval(embedding_str)
-                        if not isinstance(row['embedded_description'], list):
-                            logger.error(f"Embedding for row {row} is not a list.")
-                            row['embedded_description'] = []
-                    except (ValueError, SyntaxError) as e:
-                        logger.error(f"Error parsing embedding for row {row}: {e}")
-                        row['embedded_description'] = []
-                else:
-                    row['embedded_description'] = []
-                
-                data_entries.append(row)
-        logger.info(f"Read {len(data_entries)} entries from {csv_file_path}")
-    except Exception as e:
-        logger.error(f"Error reading CSV file {csv_file_path}: {e}")
-    return data_entries
+        with warnings.catch_warnings():
+            # NumPy only warns on trailing garbage; treat it as malformed.
+            warnings.simplefilter("error", DeprecationWarning)
+            vector = np.fromstring(text, dtype=np.float32, sep=",")
+    except (ValueError, DeprecationWarning):
+        return None
+    return vector if vector.shape == (vector_size,) else None
+
+
+def convert_csv_to_catalog(csv_file_path: str, catalog_dir: str, vector_size: int = Config.VECTOR_SIZE) -> int:
+    """
+    One-time conversion of the CSV into a columnar catalog: a float32 `vectors.npy` matrix
+    (row i is CSV row i) and a `payloads.parquet` table with the point payloads and a
+    `has_embedding` flag. Returns the number of rows converted.
+    """
+    os.makedirs(catalog_dir, exist_ok=True)
+    paths = catalog_paths(catalog_dir)
+    columns: Dict[str, List[Any]] = {name: [] for name in PAYLOAD_COLUMNS + ["has_embedding"]}
+    zeros = np.zeros(vector_size, dtype=np.float32)
+    raw_path = paths["vectors"] + ".raw"
+    rows = 0
+
+    with open(csv_file_path, mode='r', encoding='utf-8') as csvfile, open(raw_path, "wb") as raw:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            vector = parse_embedding(row.get('embedded_description'), vector_size)
+            if vector is None:
+                logger.error(f"Missing or malformed embedding for row {rows}; it will not be uploaded.")
+            raw.write((zeros if vector is None else vector).tobytes())
+            columns["product_id"].append(row.get("id"))
+            columns["product_name"].append(row.get("product_name"))
+            columns["category"].append(row.get("category"))
+            columns["price"].append(float(row['price']) if row.get('price') else None)
+            columns["detailed_description"].append(row.get("detailed_description"))
+            columns["has_embedding"].append(vector is not None)
+            rows += 1
+
+    # Prefix the raw rows with an .npy header so the matrix can be memory-mapped with np.load.
+    header = {"descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+              "fortran_order": False, "shape": (rows, vector_size)}
+    tmp_vectors = paths["vectors"] + ".tmp"
+    with open(tmp_vectors, "wb") as out, open(raw_path, "rb") as raw:
+        np.lib.format.write_array_header_1_0(out, header)
+        shutil.copyfileobj(raw, out, 1 << 24)
+    os.replace(tmp_vectors, paths["vectors"])
+    os.unlink(raw_path)
+
+    pq.write_table(pa.table(columns), paths["payloads"])
+    with open(paths["meta"], "w") as f:
+        json.dump(dict(source_fingerprint(csv_file_path), rows=rows, vector_size=vector_size), f)
+    logger.info(f"Converted {rows} rows from {csv_file_path} to {catalog_dir}")
+    return rows
+
+
+def catalog_is_current(csv_file_path: str, catalog_dir: str) -> bool:
+    paths = catalog_paths(catalog_dir)
+    if not all(os.path.exists(path) for path in paths.values()):
+        return False
+    with open(paths["meta"], "r") as f:
+        meta = json.load(f)
+    return all(meta.get(key) == value for key, value in source_fingerprint(csv_file_path).items())
+
+
+def load_catalog(catalog_dir: str) -> Tuple[np.ndarray, Dict[str, List[Any]]]:
+    """
+    Returns the memory-mapped vector matrix and the payload columns of a converted catalog.
+    """
+    paths = catalog_paths(catalog_dir)
+    vectors = np.load(paths["vectors"], mmap_mode="r")
+    payloads = pq.read_table(paths["payloads"]).to_pydict()
+    logger.info(f"Loaded catalog of {len(vectors)} rows from {catalog_dir}")
+    return vectors, payloads
 
 
 def create_qdrant_collection(collection_name: str, vector_size: int, distance_metric: str = 'Cosine'):
@@ -62,70 +144,58 @@ def create_qdrant_collection(collection_name: str, vector_size: int, distance_me
 
 
 
-def insert_data_into_qdrant(data_entries: List[Dict[str, Any]]):
+def upsert_batch(vectors: np.ndarray, payloads: Dict[str, List[Any]], rows: np.ndarray) -> int:
+    points = [
+        PointStruct(
+            id=int(idx),
+            vector=vectors[idx].tolist(),
+            payload={name: payloads[name][idx] for name in PAYLOAD_COLUMNS}
+        )
+        for idx in rows
+    ]
+    qdrant_client.upsert(
+        collection_name=Config.COLLECTION_NAME,
+        points=points
+    )
+    return len(points)
+
+
+def insert_catalog_into_qdrant(vectors: np.ndarray, payloads: Dict[str, List[Any]]) -> int:
     """
-    Inserts data into the Qdrant collection using precomputed embeddings from the CSV.
+    Upserts every row with an embedding, in batches of `Config.BATCH_SIZE` sent by up to
+    `Config.MAX_WORKERS` threads. Point ids are CSV row numbers, as before. Returns the number
+    of points inserted.
     """
-    points = []
-    for idx, entry in enumerate(data_entries):
-        embedded_description = entry.get('embedded_description')
-        if not isinstance(embedded_description, list):
-            if embedded_description:
-                try:
-                    embedded_description = ast.literal_eval(embedded_description)
-                    if not isinstance(embedded_description, list):
-                        logger.warning(f"Embedding for row {idx} is not a list. Keeping original value.")
-                except (ValueError, SyntaxError) as e:
-                    logger.error(f"Error parsing embedding for row {idx}: {e}. Keeping original value.")
-            else:
-                logger.warning(f"Missing embedding for row {idx}. Converting to empty list.")
-                embedded_description = []
-        entry['embedded_description'] = embedded_description
-
-        point = PointStruct(
-            id=idx,
-            vector=embedded_description,
-            payload={
-                    "product_id": entry.get("id"),
-                    "product_name": entry.get("product_name"),
-                    "category": entry.get("category"),
-                    "price": entry.get("price"),
-                    "detailed_description": entry.get("detailed_description"),
-                }
-            )
-        points.append(point)
-
-        # Batch insertion
-        if len(points) >= Config.BATCH_SIZE:
+    rows = np.flatnonzero(np.asarray(payloads["has_embedding"], dtype=bool))
+    skipped = len(vectors) - len(rows)
+    if skipped:
+        logger.warning(f"Skipping {skipped} rows without a valid embedding.")
+    batches = [rows[start:start + Config.BATCH_SIZE] for start in range(0, len(rows), Config.BATCH_SIZE)]
+
+    inserted = 0
+    with ThreadPoolExecutor(max_workers=Config.MAX_WORKERS) as executor:
+        futures = {executor.submit(upsert_batch, vectors, payloads, batch): batch for batch in batches}
+        for future in as_completed(futures):
             try:
-                qdrant_client.upsert(
-                    collection_name=Config.COLLECTION_NAME,
-                    points=points
-                )
-                logger.info(f"Inserted batch of {len(points)} points into Qdrant.")
-                points = []
+                inserted += future.result()
             except Exception as e:
-                logger.error(f"Failed to upsert batch to Qdrant: {e}")
-
-    # Insert any remaining points
-    if points:
-        try:
-            qdrant_client.upsert(
-                collection_name=Config.COLLECTION_NAME,
-                points=points
-            )
-            logger.info(f"Inserted final batch of {len(points)} points into Qdrant.")
-        except Exception as e:
-            logger.error(f"Failed to upsert final batch to Qdrant: {e}")
+                batch = futures[future]
+                logger.error(f"Failed to upsert rows {batch[0]}-{batch[-1]} to Qdrant: {e}")
+    logger.info(f"Inserted {inserted} points into Qdrant in {len(batches)} batches.")
+    return inserted
+
 
 def spin_up_qdrant_database():
     """
     Spins up the Qdrant database by creating the collection and inserting data.
+    The CSV is converted to the binary catalog once and reconverted only when it changes.
     """
+    if not catalog_is_current(Config.CSV_FILE_PATH, Config.CATALOG_DIR):
+        convert_csv_to_catalog(Config.CSV_FILE_PATH, Config.CATALOG_DIR)
+    vectors, payloads = load_catalog(Config.CATALOG_DIR)
     create_qdrant_collection(Config.COLLECTION_NAME, Config.VECTOR_SIZE)
-    data_entries = read_csv_data(Config.CSV_FILE_PATH)
-    if data_entries:
-        insert_data_into_qdrant(data_entries)
+    if len(vectors):
+        insert_catalog_into_qdrant(vectors, payloads)
     else:
         logger.warning("No data entries found to insert into Qdrant.")
 
@@ -6,6 +6,9 @@ export const runtime = "nodejs"
 
 type TriggerPayload = {
   turns?: number
+  max_tokens?: number
+  max_tool_output_tokens?: number
+  target_ratio?: number
 }
 
 type ConfigureCompactingPayload = {
@@ -27,6 +30,16 @@ const sanitizePositive = (value: unknown): number | undefined => {
   return Math.floor(value)
 }
 
+const sanitizeRatio = (value: unknown): number | undefined => {
+  if (typeof value !== "number") {
+    return undefined
+  }
+  if (!Number.isFinite(value) || value <= 0 || value > 1) {
+    return undefined
+  }
+  return value
+}
+
 const sanitizeTrigger = (payload: unknown): TriggerPayload | undefined => {
   if (!payload || typeof payload !== "object") {
     return undefined
@@ -34,11 +47,23 @@ const sanitizeTrigger = (payload: unknown): TriggerPayload | undefined => {
 
   const trigger = payload as TriggerPayload
   const turns = sanitizePositive(trigger.turns)
+  const maxTokens = sanitizePositive(trigger.max_tokens)
+  const maxToolOutputTokens = sanitizePositive(trigger.max_tool_output_tokens)
+  const targetRatio = sanitizeRatio(trigger.target_ratio)
 
   const result: TriggerPayload = {}
   if (turns !== undefined) {
     result.turns = turns
   }
+  if (maxTokens !== undefined) {
+    result.max_tokens = maxTokens
+  }
+  if (maxToolOutputTokens !== undefined) {
+    result.max_tool_output_tokens = maxToolOutputTokens
+  }
+  if (targetRatio !== undefined) {
+    result.target_ratio = targetRatio
+  }
 
   return Object.keys(result).length > 0 ? result : undefined
 }
@@ -3,7 +3,7 @@ import { statSync } from "fs"
 import path from "path"
 import readline from "readline"
 
-import type { AgentConfig, AgentHistoryItem, AgentRunResult, AgentSummary, TokenUsageBreakdown } from "@/types/agents"
+import type { AgentConfig, AgentHistoryItem, AgentRunResult, AgentSummary, SummaryStats, TokenUsageBreakdown } from "@/types/agents"
 
 type PendingRequest<T> = {
   resolve: (value: T) => void
@@ -56,6 +56,9 @@ type ConfigureCompactingCommand = {
   enable: boolean
   trigger?: {
     turns?: number
+    max_tokens?: number
+    max_tool_output_tokens?: number
+    target_ratio?: number
   }
   keep?: number
   exclude_tools?: string[]
@@ -142,6 +145,9 @@ class PythonAgentBridge {
     enable: boolean
     trigger?: {
       turns?: number
+      max_tokens?: number
+      max_tool_output_tokens?: number
+      target_ratio?: number
     }
     keep?: number
     excludeTools?: string[]
@@ -324,6 +330,19 @@ export async function runPythonAgent(payload: {
     }
   }
 
+  let summaryStats: SummaryStats | null = null
+  const summaryStatsRaw = raw["summaryStats"]
+  if (summaryStatsRaw && typeof summaryStatsRaw === "object") {
+    const statsRecord = summaryStatsRaw as Record<string, unknown>
+    summaryStats = {
+      inputTokens: Number(statsRecord.inputTokens ?? 0) || 0,
+      fullInputTokens: Number(statsRecord.fullInputTokens ?? 0) || 0,
+      savedInputTokens: Number(statsRecord.savedInputTokens ?? 0) || 0,
+      cached: Boolean(statsRecord.cached),
+      rolling: Boolean(statsRecord.rolling),
+    }
+  }
+
   const contextTrimmedValue = raw["contextTrimmed"]
   const contextTrimmed = Boolean(contextTrimmedValue)
   const contextSummarizedValue = raw["contextSummarized"]
@@ -331,7 +350,7 @@ export async function runPythonAgent(payload: {
   const contextCompactedValue = raw["contextCompacted"]
   const contextCompacted = Boolean(contextCompactedValue)
 
-  return { response, toolResults, tokenUsage, summary, contextTrimmed, contextSummarized, contextCompacted }
+  return { response, toolResults, tokenUsage, summary, summaryStats, contextTrimmed, contextSummarized, contextCompacted }
 }
 
 export async function configureTrimmingSessions(options: {
@@ -370,6 +389,9 @@ export async function configureCompactingSessions(options: {
   enable: boolean
   trigger?: {
     turns?: number
+    max_tokens?: number
+    max_tool_output_tokens?: number
+    target_ratio?: number
   }
   keep?: number
   excludeTools?: string[]
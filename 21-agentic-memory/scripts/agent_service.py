@@ -12,14 +12,16 @@ All tool backends are mocked in-memory and resettable via the `reset` command.
 from __future__ import annotations
 
 import asyncio
-import copy
 import datetime as dt
+import hashlib
 import json
-import math
+import os
 import sys
 import uuid
-from collections import deque
+from collections import OrderedDict, deque
+from itertools import islice
 from contextvars import ContextVar
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
 
@@ -40,6 +42,9 @@ from compacting_session import (
     CompactingSession,
     _default_token_counter as compacting_default_token_counter,
 )
+from summary_store import DEFAULT_USER_ID, SummaryStore
+from session_store import LRUSessionCache, PersistentSessionMixin, SessionStore, SQLiteSessionStore
+from token_accounting import count_tokens
 
 
 # --------------------------------------------------------------------------------------
@@ -100,51 +105,9 @@ SUMMARY_OUTPUT_DIR = STATE_DIR / "summaries"
 SUMMARY_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 SUMMARY_FILE_PATH = SUMMARY_OUTPUT_DIR / "summary.txt"
 
-_SUMMARY_CACHE: Optional[str] = None
-_SUMMARY_CACHE_MTIME: Optional[float] = None
 
-
-def _extract_summary_section(raw: str) -> Optional[str]:
-    if not raw:
-        return None
-
-    lowered = raw.lower()
-    marker = "summary:"
-    idx = lowered.rfind(marker)
-    if idx == -1:
-        return None
-
-    start = idx + len(marker)
-    summary_text = raw[start:].strip()
-    return summary_text or None
-
-
-def _load_cross_session_summary() -> Optional[str]:
-    global _SUMMARY_CACHE, _SUMMARY_CACHE_MTIME
-    try:
-        stat_result = SUMMARY_FILE_PATH.stat()
-    except FileNotFoundError:
-        _SUMMARY_CACHE = None
-        _SUMMARY_CACHE_MTIME = None
-        return None
-    except OSError:
-        return None
-
-    mtime = getattr(stat_result, "st_mtime", None)
-    if _SUMMARY_CACHE is not None and mtime is not None and _SUMMARY_CACHE_MTIME == mtime:
-        return _SUMMARY_CACHE
-
-    try:
-        raw = SUMMARY_FILE_PATH.read_text(encoding="utf-8")
-    except (OSError, UnicodeDecodeError):
-        _SUMMARY_CACHE = None
-        _SUMMARY_CACHE_MTIME = None
-        return None
-
-    summary_text = _extract_summary_section(raw)
-    _SUMMARY_CACHE = summary_text
-    _SUMMARY_CACHE_MTIME = mtime
-    return summary_text
+def _load_cross_session_summary(user_id: Optional[str] = None) -> Optional[str]:
+    return SUMMARY_STORE.user_summary(user_id)
 
 
 def reset_data_stores() -> None:
@@ -341,36 +304,6 @@ def _utc_now_iso() -> str:
     return dt.datetime.now(dt.timezone.utc).isoformat()
 
 
-def _persist_summary_to_disk( shadow_line: str, summary_text: str) -> None:
-    shadow = (shadow_line or "").strip()
-    summary = (summary_text or "").strip()
-    if not shadow and not summary:
-        return
-
-    try:
-        SUMMARY_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-        file_path = SUMMARY_OUTPUT_DIR / f"summary.txt"
-        lines = [
-            f"generated_at: {_utc_now_iso()}",
-            "",
-        ]
-        if shadow:
-            lines.append("shadow_line:")
-            lines.append(shadow)
-            lines.append("")
-        if summary:
-            lines.append("summary:")
-            lines.append(summary)
-            lines.append("")
-
-        file_path.write_text("\n".join(lines).rstrip() + "\n", encoding="utf-8")
-    except Exception as exc:  # pragma: no cover - best-effort persistence
-        print(
-            f"[agents-python] Warning: failed to write summary for session: {exc}",
-            file=sys.stderr,
-        )
-
-
 # --------------------------------------------------------------------------------------
 # Token estimation helpers for session context accounting
 # --------------------------------------------------------------------------------------
@@ -380,7 +313,7 @@ def _estimate_tokens_from_text(text: str) -> int:
     if not text:
         return 0
     try:
-        return int(math.ceil(len(text) / 4.0))
+        return count_tokens(text)
     except Exception:
         return 0
 
@@ -511,25 +444,36 @@ def _is_rag_tool_item(item: TResponseInputItem) -> bool:
     return any(candidate == "searchpolicy" for candidate in candidates)
 
 
+def _estimate_usage_for_item(item: TResponseInputItem) -> Dict[str, int]:
+    usage = {"userInput": 0, "agentOutput": 0, "tools": 0, "memory": 0, "rag": 0, "basePrompt": 0}
+    role, text = _extract_role_and_text(item)
+    tokens = _estimate_tokens_from_text(text)
+    if tokens <= 0:
+        return usage
+    is_tool_role = role in {"tool", "tool_result"}
+    if role == "user":
+        usage["userInput"] += tokens
+    elif role == "assistant":
+        usage["agentOutput"] += tokens
+    elif is_tool_role:
+        usage["tools"] += tokens
+    else:
+        # Count unknown roles toward agent output for safety
+        usage["agentOutput"] += tokens
+    if is_tool_role and _is_rag_tool_item(item):
+        usage["rag"] += tokens
+    return usage
+
+
+def _add_usage(total: Dict[str, int], usage: Dict[str, int]) -> None:
+    for key, value in usage.items():
+        total[key] = total.get(key, 0) + value
+
+
 def _estimate_usage_for_items(items: List[TResponseInputItem]) -> Dict[str, int]:
     usage = {"userInput": 0, "agentOutput": 0, "tools": 0, "memory": 0, "rag": 0, "basePrompt": 0}
     for item in items or []:
-        role, text = _extract_role_and_text(item)
-        tokens = _estimate_tokens_from_text(text)
-        if tokens <= 0:
-            continue
-        is_tool_role = role in {"tool", "tool_result"}
-        if role == "user":
-            usage["userInput"] += tokens
-        elif role == "assistant":
-            usage["agentOutput"] += tokens
-        elif is_tool_role:
-            usage["tools"] += tokens
-        else:
-            # Count unknown roles toward agent output for safety
-            usage["agentOutput"] += tokens
-        if is_tool_role and tokens > 0 and _is_rag_tool_item(item):
-            usage["rag"] += tokens
+        _add_usage(usage, _estimate_usage_for_item(item))
     return usage
 
 
@@ -737,6 +681,83 @@ def _count_user_turns(items: Iterable[TResponseInputItem]) -> int:
     return sum(1 for item in items if _is_user_msg(item))
 
 
+class _TurnIndexedHistory:
+    """Session items plus a running index of user-turn starts and per-item usage.
+
+    Offsets in the turn index are absolute (they keep growing as items are
+    appended), so dropping the oldest items never renumbers the index. Appends
+    and pops are O(1) per item; trimming is O(items removed).
+    """
+
+    def __init__(self, items: Iterable[TResponseInputItem] = ()) -> None:
+        self._items: Deque[TResponseInputItem] = deque()
+        self._usage: Deque[Dict[str, int]] = deque()
+        self._turn_starts: Deque[int] = deque()
+        self._offset = 0
+        self.extend(items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    @property
+    def turn_count(self) -> int:
+        return len(self._turn_starts)
+
+    def extend(self, items: Iterable[TResponseInputItem]) -> None:
+        for item in items:
+            if _is_user_msg(item):
+                self._turn_starts.append(self._offset + len(self._items))
+            self._items.append(item)
+            self._usage.append(_estimate_usage_for_item(item))
+
+    def pop(self) -> TResponseInputItem:
+        item = self._items.pop()
+        self._usage.pop()
+        if self._turn_starts and self._turn_starts[-1] == self._offset + len(self._items):
+            self._turn_starts.pop()
+        return item
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._usage.clear()
+        self._turn_starts.clear()
+        self._offset = 0
+
+    def drop_oldest(self, count: int) -> Dict[str, int]:
+        """Remove the oldest `count` items and return their summed usage."""
+
+        removed = {"userInput": 0, "agentOutput": 0, "tools": 0, "memory": 0, "rag": 0, "basePrompt": 0}
+        count = max(0, min(count, len(self._items)))
+        for _ in range(count):
+            self._items.popleft()
+            _add_usage(removed, self._usage.popleft())
+        self._offset += count
+        while self._turn_starts and self._turn_starts[0] < self._offset:
+            self._turn_starts.popleft()
+        return removed
+
+    def suffix_length(self, turns: int) -> int:
+        """Number of trailing items that make up the last `turns` user turns.
+
+        Mirrors `TrimmingSession._trim_to_last_turns`: with fewer turns than
+        requested (or a non-positive count) the whole history is kept.
+        """
+
+        if turns <= 0 or len(self._turn_starts) < turns:
+            return len(self._items)
+        return self._offset + len(self._items) - self._turn_starts[-turns]
+
+    def tail(self, count: int) -> List[TResponseInputItem]:
+        if count >= len(self._items):
+            return list(self._items)
+        if count <= 0:
+            return []
+        return list(islice(reversed(self._items), count))[::-1]
+
+
 class _InternalTurnCounterMixin:
     """Shared helper to track per-session turns independent of global counts."""
 
@@ -763,6 +784,9 @@ class _InternalTurnCounterMixin:
     def _reset_internal_turn_counter(self) -> None:
         self._internal_turn_counter = 0
 
+    def _is_turn_start(self, item: TResponseInputItem) -> bool:
+        return _is_user_msg(item)
+
 
 SUMMARY_PROMPT = """
 You are a senior customer-support assistant for tech devices, setup, and software issues.
@@ -806,6 +830,52 @@ Rules:
 """
 
 
+@dataclass
+class SummaryReport:
+    """Input-token accounting for one summarization."""
+
+    input_tokens: int  # prompt tokens actually sent (0 when served from the cache)
+    full_input_tokens: int  # prompt tokens a from-scratch summary of the whole prefix would send
+    cached: bool = False
+    rolling: bool = False
+
+    @property
+    def saved_input_tokens(self) -> int:
+        return max(0, self.full_input_tokens - self.input_tokens)
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {
+            "inputTokens": self.input_tokens,
+            "fullInputTokens": self.full_input_tokens,
+            "savedInputTokens": self.saved_input_tokens,
+            "cached": self.cached,
+            "rolling": self.rolling,
+        }
+
+
+class SummaryCache:
+    """Process-wide LRU of summaries keyed by a hash of the exact summarization prompt."""
+
+    def __init__(self, max_entries: int = 512) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[bytes, Tuple[str, str]]" = OrderedDict()
+
+    def get(self, key: bytes) -> Optional[Tuple[str, str]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: bytes, value: Tuple[str, str]) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
 class LLMSummarizer:
     def __init__(
         self,
@@ -813,55 +883,68 @@ class LLMSummarizer:
         model: str = "gpt-4o",
         max_tokens: int = 400,
         tool_trim_limit: int = 600,
+        cache: Optional[SummaryCache] = None,
     ) -> None:
         self.client = client
         self.model = model
         self.max_tokens = max_tokens
         self.tool_trim_limit = tool_trim_limit
+        self.cache = cache
 
-    async def summarize(self, messages: List[TResponseInputItem]) -> Tuple[str, str]:
+    async def summarize(
+        self, messages: List[TResponseInputItem], previous_summary: Optional[str] = None
+    ) -> Tuple[str, str]:
         """Return a shadow user line and structured summary for the provided messages."""
 
-        user_shadow = "Summarize the conversation we had so far."
-        tool_roles = {"tool", "tool_result"}
+        shadow_line, summary_text, _ = await self.summarize_with_report(messages, previous_summary=previous_summary)
+        return shadow_line, summary_text
 
-        def _extract_content(item: TResponseInputItem) -> Tuple[str, str, Dict[str, Any]]:
-            role = "assistant"
-            content = ""
-            metadata: Dict[str, Any] = {}
-            if isinstance(item, dict):
-                role = str(item.get("role") or "assistant")
-                raw_content = item.get("content")
-                meta_candidate = item.get("metadata")
-                if isinstance(meta_candidate, dict):
-                    metadata = meta_candidate
-            else:
-                role = str(getattr(item, "role", "assistant"))
-                raw_content = getattr(item, "content", "")
-
-            if isinstance(raw_content, list):
-                content = " ".join(str(part) for part in raw_content if part)
-            else:
-                content = str(raw_content or "")
+    async def summarize_with_report(
+        self,
+        messages: List[TResponseInputItem],
+        previous_summary: Optional[str] = None,
+        full_messages: Optional[List[TResponseInputItem]] = None,
+    ) -> Tuple[str, str, SummaryReport]:
+        """Summarize `messages`, optionally rolling them into `previous_summary`.
 
-            role = role.lower()
-            if role in tool_roles and len(content) > self.tool_trim_limit:
-                content = content[: self.tool_trim_limit] + " …"
-            return role.upper(), content.strip(), metadata
+        `full_messages` is the whole prefix a from-scratch summary would read; it
+        is only used to report how many input tokens the rolling prompt saved.
+        """
 
-        snippets: List[str] = []
-        for item in messages:
-            role, content, metadata = _extract_content(item)
-            if metadata.get("summary"):
-                continue
-            if content:
-                snippets.append(f"{role}: {content}")
+        user_shadow = "Summarize the conversation we had so far."
+        previous = (previous_summary or "").strip()
+        snippets = self._snippets(messages)
+        full_snippets = snippets if full_messages is None else self._snippets(full_messages)
+        full_input_tokens = 0
+        if full_snippets:
+            full_input_tokens = _estimate_tokens_from_text(SUMMARY_PROMPT.strip()) + _estimate_tokens_from_text(
+                "\n".join(full_snippets)
+            )
 
         if not snippets:
-            return user_shadow, ""
+            # Nothing new to fold in: a previous summary is still the latest snapshot.
+            return user_shadow, previous, SummaryReport(0, full_input_tokens if previous else 0, rolling=bool(previous))
 
         system_content = SUMMARY_PROMPT.strip()
         user_content = "\n".join(snippets)
+        if previous:
+            # The system prompt stays identical; only the labels tell the model to update in place.
+            user_content = f"PREVIOUS SUMMARY (update it with the new turns):\n{previous}\n\nNEW TURNS:\n{user_content}"
+        rolling = bool(previous)
+
+        input_tokens = _estimate_tokens_from_text(system_content) + _estimate_tokens_from_text(user_content)
+        if full_messages is None:
+            full_input_tokens = input_tokens
+
+        cache = self.cache if self.cache is not None else SUMMARY_CACHE
+        cache_key = hashlib.blake2b(
+            "\x00".join((self.model, str(self.max_tokens), system_content, user_content)).encode("utf-8", "surrogatepass"),
+            digest_size=16,
+        ).digest()
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached[0], cached[1], SummaryReport(0, full_input_tokens, cached=True, rolling=rolling)
+
         prompt_messages: List[Dict[str, Any]] = []
         if system_content:
             prompt_messages.append(
@@ -888,6 +971,7 @@ class LLMSummarizer:
                 }
             )
         #print('_________________________________________________________________________________________',prompt_messages)
+        report = SummaryReport(input_tokens, full_input_tokens, rolling=rolling)
         summary_text = ""
         try:
             response = await self.client.responses.create(
@@ -900,7 +984,7 @@ class LLMSummarizer:
                 f"[agents-python] Warning: summarization call failed ({exc}); falling back to placeholder.",
                 file=sys.stderr,
             )
-            return user_shadow, "Summary of earlier conversation (unavailable)."
+            return user_shadow, "Summary of earlier conversation (unavailable).", report
 
         summary_text = getattr(response, "output_text", None) or ""
 
@@ -917,17 +1001,58 @@ class LLMSummarizer:
                         parts.append(str(getattr(content, "text")))
             summary_text = "\n".join(part for part in parts if part)
 
-        return user_shadow, summary_text.strip()
+        summary_text = summary_text.strip()
+        if summary_text:
+            cache.put(cache_key, (user_shadow, summary_text))
+        return user_shadow, summary_text, report
 
+    def _snippets(self, messages: List[TResponseInputItem]) -> List[str]:
+        tool_roles = {"tool", "tool_result"}
+
+        def _extract_content(item: TResponseInputItem) -> Tuple[str, str, Dict[str, Any]]:
+            role = "assistant"
+            content = ""
+            metadata: Dict[str, Any] = {}
+            if isinstance(item, dict):
+                role = str(item.get("role") or "assistant")
+                raw_content = item.get("content")
+                meta_candidate = item.get("metadata")
+                if isinstance(meta_candidate, dict):
+                    metadata = meta_candidate
+            else:
+                role = str(getattr(item, "role", "assistant"))
+                raw_content = getattr(item, "content", "")
 
-class DefaultSession(_InternalTurnCounterMixin, SessionABC):
+            if isinstance(raw_content, list):
+                content = " ".join(str(part) for part in raw_content if part)
+            else:
+                content = str(raw_content or "")
+
+            role = role.lower()
+            if role in tool_roles and len(content) > self.tool_trim_limit:
+                content = content[: self.tool_trim_limit] + " …"
+            return role.upper(), content.strip(), metadata
+
+        snippets: List[str] = []
+        for item in messages:
+            role, content, metadata = _extract_content(item)
+            if metadata.get("summary"):
+                continue
+            if content:
+                snippets.append(f"{role}: {content}")
+        return snippets
+
+
+class DefaultSession(_InternalTurnCounterMixin, PersistentSessionMixin, SessionABC):
     """Maintain the full conversation history without trimming."""
 
-    def __init__(self, session_id: str):
+    def __init__(self, session_id: str, store: Optional[SessionStore] = None):
         _InternalTurnCounterMixin.__init__(self)
         self.session_id = session_id
         self._items: Deque[TResponseInputItem] = deque()
         self._lock = asyncio.Lock()
+        self.store = store
+        self._store_loaded = False
         # Tracks the net token delta applied to the session context due to
         # trimming/summarization during the latest add_items operation.
         # Negative numbers indicate removal from the active context.
@@ -942,6 +1067,7 @@ class DefaultSession(_InternalTurnCounterMixin, SessionABC):
 
     async def get_items(self, limit: Optional[int] = None) -> List[TResponseInputItem]:
         async with self._lock:
+            await self._ensure_loaded()
             snapshot = list(self._items)
         return snapshot[-limit:] if (limit is not None and limit >= 0) else snapshot
 
@@ -949,18 +1075,24 @@ class DefaultSession(_InternalTurnCounterMixin, SessionABC):
         if not items:
             return
         async with self._lock:
+            await self._ensure_loaded()
             self._increment_internal_turn_counter(items)
             self._items.extend(items)
+            await self._persist_append(items)
 
     async def pop_item(self) -> Optional[TResponseInputItem]:
         async with self._lock:
+            await self._ensure_loaded()
             if not self._items:
                 return None
-            return self._items.pop()
+            item = self._items.pop()
+            await self._persist("pop_item")
+            return item
 
     async def clear_session(self) -> None:
         async with self._lock:
             self._items.clear()
+            await self._persist_clear()
             # Reset any pending context delta since the session is emptied
             self._last_context_delta_usage = {
                 "userInput": 0,
@@ -977,7 +1109,7 @@ class DefaultSession(_InternalTurnCounterMixin, SessionABC):
         return None
 
 
-class TrimmingSession(_InternalTurnCounterMixin, SessionABC):
+class TrimmingSession(_InternalTurnCounterMixin, PersistentSessionMixin, SessionABC):
     """Keep only the last N user turns, with optional hysteresis.
 
     - max_turns: threshold at which trimming triggers
@@ -987,7 +1119,13 @@ class TrimmingSession(_InternalTurnCounterMixin, SessionABC):
       When the session reaches 6 total turns, drop the earliest 2 turns (keep last 4).
     """
 
-    def __init__(self, session_id: str, max_turns: int = 8, keep_last_n_turns: Optional[int] = None):
+    def __init__(
+        self,
+        session_id: str,
+        max_turns: int = 8,
+        keep_last_n_turns: Optional[int] = None,
+        store: Optional[SessionStore] = None,
+    ):
         _InternalTurnCounterMixin.__init__(self)
         self.session_id = session_id
         self.max_turns = max(1, int(max_turns))
@@ -999,8 +1137,10 @@ class TrimmingSession(_InternalTurnCounterMixin, SessionABC):
         # Ensure keep_last_n_turns never exceeds max_turns (otherwise trimming threshold is meaningless)
         self.keep_last_n_turns = min(self.keep_last_n_turns, self.max_turns)
 
-        self._items: Deque[TResponseInputItem] = deque()
+        self._items = _TurnIndexedHistory()
         self._lock = asyncio.Lock()
+        self.store = store
+        self._store_loaded = False
         self._did_trim_recently: bool = False
         self._last_total_turns: int = 0
         self._last_context_delta_usage: Dict[str, int] = {
@@ -1014,25 +1154,26 @@ class TrimmingSession(_InternalTurnCounterMixin, SessionABC):
 
     async def get_items(self, limit: Optional[int] = None) -> List[TResponseInputItem]:
         async with self._lock:
-            trimmed, _ = self._trim_to_last_turns(list(self._items))
-        return trimmed[-limit:] if (limit is not None and limit >= 0) else trimmed
+            await self._ensure_loaded()
+            count = len(self._items) - self._trim_count()
+            if limit is not None and limit > 0:
+                count = min(count, limit)
+            return self._items.tail(count)
 
     async def add_items(self, items: List[TResponseInputItem]) -> None:
         if not items:
             return
         async with self._lock:
-            pending: List[TResponseInputItem] = list(self._items)
+            await self._ensure_loaded()
             self._increment_internal_turn_counter(items)
-            pending.extend(items)
+            self._items.extend(items)
             should_trim = self.internalTurnCounter >= self.max_turns
-            trimmed, total_turns = self._trim_to_last_turns(pending, force_trim=should_trim)
-            self._last_total_turns = total_turns
+            self._last_total_turns = self._items.turn_count
+            removed_count = self._trim_count(force_trim=should_trim)
 
-            if len(trimmed) < len(pending):
+            if removed_count:
                 self._did_trim_recently = True
-                removed_count = len(pending) - len(trimmed)
-                removed_items = pending[:removed_count]
-                delta = _estimate_usage_for_items(removed_items)
+                delta = self._items.drop_oldest(removed_count)
 
                 if not isinstance(self._last_context_delta_usage, dict):
                     self._last_context_delta_usage = {
@@ -1052,22 +1193,25 @@ class TrimmingSession(_InternalTurnCounterMixin, SessionABC):
                 current_delta.setdefault("memory", 0)
                 current_delta.setdefault("basePrompt", 0)
                 self._last_context_delta_usage = current_delta
-                self.internalTurnCounter = min(self.keep_last_n_turns, _count_user_turns(trimmed))
+                self.internalTurnCounter = min(self.keep_last_n_turns, self._items.turn_count)
             else:
                 self._did_trim_recently = False
 
-            self._items.clear()
-            self._items.extend(trimmed)
+            await self._persist_append(items, drop_prefix=removed_count)
 
     async def pop_item(self) -> Optional[TResponseInputItem]:
         async with self._lock:
+            await self._ensure_loaded()
             if not self._items:
                 return None
-            return self._items.pop()
+            item = self._items.pop()
+            await self._persist("pop_item")
+            return item
 
     async def clear_session(self) -> None:
         async with self._lock:
             self._items.clear()
+            await self._persist_clear()
             self._last_total_turns = 0
             self._did_trim_recently = False
             self._last_context_delta_usage = {
@@ -1082,6 +1226,7 @@ class TrimmingSession(_InternalTurnCounterMixin, SessionABC):
 
     async def set_max_turns(self, max_turns: int) -> None:
         async with self._lock:
+            await self._ensure_loaded()
             new_max = max(1, int(max_turns))
             if new_max == self.max_turns:
                 self.keep_last_n_turns = min(self.keep_last_n_turns, self.max_turns)
@@ -1091,20 +1236,20 @@ class TrimmingSession(_InternalTurnCounterMixin, SessionABC):
             self.max_turns = new_max
             self.keep_last_n_turns = min(self.keep_last_n_turns, self.max_turns)
 
-            current_items: List[TResponseInputItem] = list(self._items)
-            trimmed, total_turns = self._trim_to_last_turns(current_items)
-            self._last_total_turns = total_turns
-            if len(trimmed) < len(current_items):
+            self._last_total_turns = self._items.turn_count
+            removed_count = self._trim_count()
+            if removed_count:
                 self._did_trim_recently = True
-                self.internalTurnCounter = min(self.keep_last_n_turns, _count_user_turns(trimmed))
+                self._items.drop_oldest(removed_count)
+                self.internalTurnCounter = min(self.keep_last_n_turns, self._items.turn_count)
+                await self._persist("drop_prefix", removed_count)
             else:
                 self._did_trim_recently = False
                 self.internalTurnCounter = min(self.internalTurnCounter, self.max_turns)
-            self._items.clear()
-            self._items.extend(trimmed)
 
     async def set_keep_last_n_turns(self, keep_last_n_turns: int) -> None:
         async with self._lock:
+            await self._ensure_loaded()
             new_keep = max(1, int(keep_last_n_turns))
             new_keep = min(new_keep, self.max_turns)
 
@@ -1114,19 +1259,38 @@ class TrimmingSession(_InternalTurnCounterMixin, SessionABC):
 
             self.keep_last_n_turns = new_keep
 
-            current_items: List[TResponseInputItem] = list(self._items)
-            current_total_turns = _count_user_turns(current_items)
+            current_total_turns = self._items.turn_count
             force_trim = current_total_turns > self.keep_last_n_turns
-            trimmed, total_turns = self._trim_to_last_turns(current_items, force_trim=force_trim)
-            self._last_total_turns = total_turns
-            if len(trimmed) < len(current_items):
+            self._last_total_turns = current_total_turns
+            removed_count = self._trim_count(force_trim=force_trim)
+            if removed_count:
                 self._did_trim_recently = True
-                self.internalTurnCounter = min(self.keep_last_n_turns, _count_user_turns(trimmed))
+                self._items.drop_oldest(removed_count)
+                self.internalTurnCounter = min(self.keep_last_n_turns, self._items.turn_count)
+                await self._persist("drop_prefix", removed_count)
             else:
                 self._did_trim_recently = False
                 self.internalTurnCounter = min(self.internalTurnCounter, self.max_turns)
-            self._items.clear()
-            self._items.extend(trimmed)
+
+    def _load_turn_window(self) -> Optional[int]:
+        # The active history never spans more than `max_turns` user turns.
+        return self.max_turns
+
+    def _persisted_state(self) -> Dict[str, Any]:
+        state = super()._persisted_state()
+        state["lastTotalTurns"] = self._last_total_turns
+        return state
+
+    def _restore_persisted_state(self, state: Dict[str, Any]) -> None:
+        super()._restore_persisted_state(state)
+        self._last_total_turns = _positive_int(state.get("lastTotalTurns")) or 0
+
+    def _trim_count(self, *, force_trim: bool = False) -> int:
+        """How many of the oldest items `_trim_to_last_turns` would drop, read from the turn index."""
+
+        if not force_trim and self._items.turn_count < self.max_turns:
+            return 0
+        return len(self._items) - self._items.suffix_length(self.keep_last_n_turns)
 
     def _trim_to_last_turns(
         self, items: List[TResponseInputItem], *, force_trim: bool = False
@@ -1161,10 +1325,45 @@ class TrimmingSession(_InternalTurnCounterMixin, SessionABC):
         return trimmed, total_turns
 
 
+# Summarize the soon-to-be-evicted prefix in the background one turn before the
+# limit, so the turn that crosses it does not wait on the summarizer.
+SPECULATIVE_SUMMARIES: bool = os.environ.get("AGENT_SPECULATIVE_SUMMARIES", "1").strip() != "0"
+# Fold newly evicted turns into the previous summary instead of re-reading it as plain text.
+ROLLING_SUMMARIES: bool = os.environ.get("AGENT_ROLLING_SUMMARIES", "1").strip() != "0"
+
+_SummaryResult = Tuple[str, str, Optional[SummaryReport]]
+
+
+@dataclass
+class _SpeculativeSummary:
+    """A background summarization of `prefix`, keyed by the identity of its items."""
+
+    prefix: List[TResponseInputItem]
+    task: "asyncio.Task[Optional[_SummaryResult]]"
+
+    def matches(self, items: Iterable[TResponseInputItem]) -> bool:
+        count = 0
+        for expected, actual in zip(self.prefix, items):
+            if expected is not actual:
+                return False
+            count += 1
+        return count == len(self.prefix)
 
 
 class SummarizingSession(TrimmingSession):
-    """Simplified summarizing session: keeps last N turns & adds a synthetic summary."""
+    """Simplified summarizing session: keeps last N turns & adds a synthetic summary.
+
+    With `speculative=True`, once the session is one user turn away from
+    `context_limit` the prefix that turn will evict is summarized in a
+    background task. When the limit is crossed and the prefix is unchanged, the
+    finished summary is swapped in under the session lock; otherwise the
+    speculation is cancelled and the prefix is summarized inline as before.
+
+    With `rolling=True`, a prefix that starts with the previous synthetic
+    summary is summarized as "previous summary + newly evicted turns" rather
+    than re-reading the whole prefix. The input tokens this saves are exposed
+    via `get_last_summary_report`.
+    """
 
     def __init__(
         self,
@@ -1172,17 +1371,27 @@ class SummarizingSession(TrimmingSession):
         keep_last_n_turns: int = 3,
         context_limit: int = 7,
         summarizer: Optional[LLMSummarizer] = None,
+        store: Optional[SessionStore] = None,
+        speculative: bool = SPECULATIVE_SUMMARIES,
+        rolling: bool = ROLLING_SUMMARIES,
+        user_id: str = DEFAULT_USER_ID,
     ):
-        super().__init__(session_id, max_turns=context_limit)
+        super().__init__(session_id, max_turns=context_limit, store=store)
+        self.user_id = user_id
         self.keep_last_n_turns = max(0, int(keep_last_n_turns))
         self._summarizer = summarizer or LLMSummarizer(ensure_openai_client())
         self._last_summary: Optional[Dict[str, str]] = None
         # Tracks whether summarization occurred during the latest update cycle
         self._did_summarize_recently: bool = False
+        self.speculative = bool(speculative)
+        self._speculation: Optional[_SpeculativeSummary] = None
+        self.rolling = bool(rolling)
+        self._last_summary_report: Optional[SummaryReport] = None
 
     def configure_limits(self, keep_last_n_turns: int, context_limit: int) -> None:
         self.keep_last_n_turns = max(0, int(keep_last_n_turns))
         self.max_turns = max(1, int(context_limit))
+        self._cancel_speculation()
 
     async def add_items(self, items: List[TResponseInputItem]) -> None:
         if not items:
@@ -1191,24 +1400,65 @@ class SummarizingSession(TrimmingSession):
         # Combine existing items with new ones BEFORE any trimming, so we can detect
         # when we've exceeded the max user turns and produce a summary of the prefix.
         async with self._lock:
-            combined: List[TResponseInputItem] = list(self._items)
+            await self._ensure_loaded()
             self._increment_internal_turn_counter(items)
             current_turn_counter = self._internal_turn_counter
-            combined.extend(items)
 
-        should_summarize = current_turn_counter >= self.max_turns
-        if not should_summarize:
-            # Haven't reached the limit yet; keep at most the last N user turns like trimming.
-            trimmed, _ = self._trim_to_last_turns(combined)
-            trimmed_count_changed = len(trimmed) < len(combined)
+            should_summarize = current_turn_counter >= self.max_turns
+            if not should_summarize:
+                # Haven't reached the limit yet; keep at most the last N user turns like trimming.
+                self._items.extend(items)
+                removed_count = self._trim_count()
+                if removed_count:
+                    self._items.drop_oldest(removed_count)
+                    self._internal_turn_counter = max(0, min(self._items.turn_count, self.max_turns))
+                await self._persist_append(items, drop_prefix=removed_count)
+                self._maybe_start_speculation()
+                return
+
+            combined: List[TResponseInputItem] = list(self._items)
+            combined.extend(items)
+            prefix, suffix = self._split_for_summary(combined)
+
+            # Fast path: the speculative summary of exactly this prefix is ready,
+            # so the whole swap happens in this critical section.
+            pending = self._take_speculation(prefix)
+            summary_payload: Optional[Dict[str, str]] = None
+            applied = False
+            if pending is not None and pending.done() and not pending.cancelled() and pending.result() is not None:
+                summary_payload = await self._apply_summary(combined, prefix, suffix, pending.result())
+                applied = True
+
+        if not applied:
+            result = await self._summarize_prefix(prefix, pending)
             async with self._lock:
-                self._items.clear()
-                self._items.extend(trimmed)
-                if trimmed_count_changed:
-                    trimmed_user_turns = _count_user_turns(trimmed)
-                    self._internal_turn_counter = max(0, min(trimmed_user_turns, self.max_turns))
-            return
+                summary_payload = await self._apply_summary(combined, prefix, suffix, result)
 
+        if summary_payload:
+            SUMMARY_STORE.record(
+                self.session_id,
+                self.user_id,
+                summary_payload.get("shadow_line", ""),
+                summary_payload.get("summary_text", ""),
+            )
+
+    async def pop_item(self) -> Optional[TResponseInputItem]:
+        item = await super().pop_item()
+        async with self._lock:
+            if self._speculation is not None and not self._speculation.matches(self._items):
+                self._cancel_speculation()
+        return item
+
+    async def clear_session(self) -> None:
+        await super().clear_session()
+        async with self._lock:
+            self._cancel_speculation()
+            self._last_summary = None
+            self._last_summary_report = None
+
+    def _split_for_summary(
+        self, combined: List[TResponseInputItem]
+    ) -> Tuple[List[TResponseInputItem], List[TResponseInputItem]]:
         user_indices = [idx for idx, item in enumerate(combined) if _is_user_msg(item)]
         # We exceeded the context limit: summarize the earlier prefix and keep only the last K user turns.
         if self.keep_last_n_turns <= 0 or self.keep_last_n_turns >= len(user_indices):
@@ -1216,25 +1466,90 @@ class SummarizingSession(TrimmingSession):
         else:
             boundary_idx = user_indices[-self.keep_last_n_turns]
         boundary_idx = max(0, min(boundary_idx, len(combined)))
-        prefix = combined[:boundary_idx]
-        suffix = combined[boundary_idx:]
+        return combined[:boundary_idx], combined[boundary_idx:]
 
-        shadow_line = ""
-        summary_text = ""
+    async def _summarize_prefix(
+        self,
+        prefix: List[TResponseInputItem],
+        pending: Optional["asyncio.Task[Optional[_SummaryResult]]"],
+    ) -> _SummaryResult:
+        if not prefix:
+            return "", "", None
+        if pending is not None and not pending.cancelled():
+            # Still running: waiting on it is never slower than starting over.
+            result = await pending
+            if result is not None:
+                return result
+        try:
+            return await self._summarize(prefix)
+        except Exception as exc:  # pragma: no cover - defensive logging
+            print(
+                f"[agents-python] Warning: summarization failed ({exc}); using fallback text.",
+                file=sys.stderr,
+            )
+            return (
+                "Summarize the conversation we had so far.",
+                "Summary of earlier conversation (temporary fallback).",
+                None,
+            )
+
+    async def _summarize(self, prefix: List[TResponseInputItem]) -> _SummaryResult:
+        summarize_with_report = getattr(self._summarizer, "summarize_with_report", None)
+        if summarize_with_report is None:
+            shadow_line, summary_text = await self._summarizer.summarize(prefix)
+            return shadow_line, summary_text, None
+
+        messages, previous_summary = self._rolling_input(prefix)
+        return await summarize_with_report(messages, previous_summary=previous_summary, full_messages=prefix)
+
+    def _rolling_input(
+        self, prefix: List[TResponseInputItem]
+    ) -> Tuple[List[TResponseInputItem], Optional[str]]:
+        """Split off the previous synthetic summary at the head of `prefix`, if there is one."""
+
+        summary = self._last_summary
+        if not self.rolling or not summary:
+            return prefix, None
+        synthetic_items = self._synthetic_items(summary.get("shadow_line", ""), summary.get("summary_text", ""))
+        if not synthetic_items or prefix[: len(synthetic_items)] != synthetic_items:
+            return prefix, None
+        return prefix[len(synthetic_items):], summary.get("summary_text", "")
+
+    @staticmethod
+    def _synthetic_items(shadow_line: str, summary_text: str) -> List[TResponseInputItem]:
+        synthetic_items: List[TResponseInputItem] = []
+        if not summary_text:
+            return synthetic_items
+        if shadow_line:
+            synthetic_items.append(
+                {
+                    "role": "user",
+                    "content": shadow_line,
+                }
+            )
+        synthetic_items.append(
+            {
+                "role": "assistant",
+                "content": summary_text,
+            }
+        )
+        return synthetic_items
+
+    async def _apply_summary(
+        self,
+        combined: List[TResponseInputItem],
+        prefix: List[TResponseInputItem],
+        suffix: List[TResponseInputItem],
+        result: _SummaryResult,
+    ) -> Optional[Dict[str, str]]:
+        """Swap the summary in for `prefix`; the caller holds `self._lock`."""
+
+        shadow_line, summary_text, report = result
         summary_triggered = bool(prefix)
-        if prefix:
-            try:
-                shadow_line, summary_text = await self._summarizer.summarize(prefix)
-                # Mark that a summarization has been performed for this session
-                self._did_summarize_recently = True
-            except Exception as exc:  # pragma: no cover - defensive logging
-                print(
-                    f"[agents-python] Warning: summarization failed ({exc}); using fallback text.",
-                    file=sys.stderr,
-                )
-                shadow_line = "Summarize the conversation we had so far."
-                summary_text = "Summary of earlier conversation (temporary fallback)."
-                self._did_summarize_recently = True
+        if summary_triggered:
+            # Mark that a summarization has been performed for this session
+            self._did_summarize_recently = True
+            self._last_summary_report = report
 
         synthetic_items: List[TResponseInputItem] = []
         summary_payload: Optional[Dict[str, str]] = None
@@ -1243,19 +1558,7 @@ class SummarizingSession(TrimmingSession):
                 "shadow_line": shadow_line,
                 "summary_text": summary_text,
             }
-            if shadow_line:
-                synthetic_items.append(
-                    {
-                        "role": "user",
-                        "content": shadow_line,
-                    }
-                )
-            synthetic_items.append(
-                {
-                    "role": "assistant",
-                    "content": summary_text,
-                }
-            )
+            synthetic_items = self._synthetic_items(shadow_line, summary_text)
 
         fallback_trimmed: List[TResponseInputItem] = []
         fallback_trimmed_changed = False
@@ -1270,59 +1573,113 @@ class SummarizingSession(TrimmingSession):
             removed_count = len(combined) - len(fallback_trimmed)
             removed_items_for_delta = combined[:removed_count]
 
-        async with self._lock:
-            self._last_summary = summary_payload
-            self._items.clear()
-            if synthetic_items:
-                self._items.extend(synthetic_items)
-                self._items.extend(suffix)
-            else:
-                # Fallback: if for some reason we could not create a summary, at least trim.
-                self._items.extend(fallback_trimmed)
-
-            # Compute and store context delta usage due to summarization.
-            # Items removed via summarization/trimming are reported as negative deltas
-            # so the UI can apply them immediately (same turn as any added memory tokens).
-            if removed_items_for_delta:
-                removed_usage = _estimate_usage_for_items(removed_items_for_delta)
-                self._last_context_delta_usage = {
-                    "userInput": -removed_usage["userInput"],
-                    "agentOutput": -removed_usage["agentOutput"],
-                    "tools": -removed_usage["tools"],
-                    # memory will be added at run time based on summary_text length
-                    "memory": 0,
-                    "rag": -removed_usage["rag"],
-                    "basePrompt": 0,
-                }
-            else:
-                self._last_context_delta_usage = {
-                    "userInput": 0,
-                    "agentOutput": 0,
-                    "tools": 0,
-                    "memory": 0,
-                    "rag": 0,
-                    "basePrompt": 0,
-                }
-            if summary_triggered:
-                retained_turns = _count_user_turns(suffix)
-                synthetic_turn = 1 if synthetic_items else 0
-                adjusted_turns = retained_turns + synthetic_turn
-                self._internal_turn_counter = max(0, min(adjusted_turns, self.max_turns))
-            elif fallback_trimmed_changed:
-                fallback_turns = _count_user_turns(fallback_trimmed)
-                self._internal_turn_counter = max(0, min(fallback_turns, self.max_turns))
+        self._last_summary = summary_payload
+        self._items.clear()
+        if synthetic_items:
+            self._items.extend(synthetic_items)
+            self._items.extend(suffix)
+        else:
+            # Fallback: if for some reason we could not create a summary, at least trim.
+            self._items.extend(fallback_trimmed)
+
+        # Compute and store context delta usage due to summarization.
+        # Items removed via summarization/trimming are reported as negative deltas
+        # so the UI can apply them immediately (same turn as any added memory tokens).
+        if removed_items_for_delta:
+            removed_usage = _estimate_usage_for_items(removed_items_for_delta)
+            self._last_context_delta_usage = {
+                "userInput": -removed_usage["userInput"],
+                "agentOutput": -removed_usage["agentOutput"],
+                "tools": -removed_usage["tools"],
+                # memory will be added at run time based on summary_text length
+                "memory": 0,
+                "rag": -removed_usage["rag"],
+                "basePrompt": 0,
+            }
+        else:
+            self._last_context_delta_usage = {
+                "userInput": 0,
+                "agentOutput": 0,
+                "tools": 0,
+                "memory": 0,
+                "rag": 0,
+                "basePrompt": 0,
+            }
+        if summary_triggered:
+            retained_turns = _count_user_turns(suffix)
+            synthetic_turn = 1 if synthetic_items else 0
+            adjusted_turns = retained_turns + synthetic_turn
+            self._internal_turn_counter = max(0, min(adjusted_turns, self.max_turns))
+        elif fallback_trimmed_changed:
+            fallback_turns = _count_user_turns(fallback_trimmed)
+            self._internal_turn_counter = max(0, min(fallback_turns, self.max_turns))
+        await self._persist_replace()
+        self._maybe_start_speculation()
+        return summary_payload
 
-        if summary_payload:
-            await asyncio.to_thread(
-                _persist_summary_to_disk,
-                summary_payload.get("shadow_line", ""),
-                summary_payload.get("summary_text", ""),
+    # ----------------------------
+    # Speculative summarization
+    # ----------------------------
+
+    def _predicted_prefix_length(self) -> int:
+        """Length of the prefix the next turn will evict, assuming it brings one user message first."""
+
+        keep = self.keep_last_n_turns
+        if keep <= 0 or keep >= self._items.turn_count + 1:
+            return 0
+        if keep == 1:
+            return len(self._items)
+        return len(self._items) - self._items.suffix_length(keep - 1)
+
+    def _maybe_start_speculation(self) -> None:
+        """Start (or keep) a background summary once the next user turn will cross the limit."""
+
+        if not self.speculative or self._internal_turn_counter + 1 < self.max_turns:
+            return
+        length = self._predicted_prefix_length()
+        if length <= 0:
+            self._cancel_speculation()
+            return
+        if self._speculation is not None:
+            if len(self._speculation.prefix) == length and self._speculation.matches(self._items):
+                return
+            self._cancel_speculation()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:  # pragma: no cover - only reachable outside the event loop
+            return
+        prefix = list(islice(self._items, length))
+        self._speculation = _SpeculativeSummary(prefix, loop.create_task(self._speculate(prefix)))
+
+    async def _speculate(self, prefix: List[TResponseInputItem]) -> Optional[_SummaryResult]:
+        try:
+            return await self._summarize(prefix)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:  # pragma: no cover - defensive logging
+            print(
+                f"[agents-python] Warning: background summarization failed ({exc}); will summarize inline.",
+                file=sys.stderr,
             )
+            return None
 
-    async def clear_session(self) -> None:
-        await super().clear_session()
-        async with self._lock:
-            self._last_summary = None
+    def _take_speculation(
+        self, prefix: List[TResponseInputItem]
+    ) -> Optional["asyncio.Task[Optional[_SummaryResult]]"]:
+        """Claim the speculative task if it summarized exactly `prefix`; cancel it otherwise."""
+
+        speculation, self._speculation = self._speculation, None
+        if speculation is None:
+            return None
+        if prefix and len(speculation.prefix) == len(prefix) and speculation.matches(prefix):
+            return speculation.task
+        speculation.task.cancel()
+        return None
+
+    def _cancel_speculation(self) -> None:
+        if self._speculation is not None:
+            self._speculation.task.cancel()
+            self._speculation = None
 
     async def get_last_summary(self) -> Optional[Dict[str, str]]:
         async with self._lock:
@@ -1330,6 +1687,22 @@ class SummarizingSession(TrimmingSession):
                 return None
             return dict(self._last_summary)
 
+    async def get_last_summary_report(self) -> Optional[Dict[str, Any]]:
+        async with self._lock:
+            if self._last_summary_report is None:
+                return None
+            return self._last_summary_report.to_payload()
+
+    def _persisted_state(self) -> Dict[str, Any]:
+        state = super()._persisted_state()
+        state["lastSummary"] = self._last_summary
+        return state
+
+    def _restore_persisted_state(self, state: Dict[str, Any]) -> None:
+        super()._restore_persisted_state(state)
+        last_summary = state.get("lastSummary")
+        self._last_summary = dict(last_summary) if isinstance(last_summary, dict) else None
+
 
 # --------------------------------------------------------------------------------------
 # Compacting session wrapper
@@ -1391,27 +1764,11 @@ class TrackingCompactingSession(CompactingSession):
             "basePrompt": 0,
         }
 
-    def _compact_tool_result(  # type: ignore[override]
-        self,
-        idx: int,
-        *,
-        tool_name: Optional[str],
-        call_id: Optional[str],
-    ) -> None:
-        original_item = copy.deepcopy(self._items[idx])
-        super()._compact_tool_result(idx, tool_name=tool_name, call_id=call_id)
-        self._record_compaction_delta(original_item, self._items[idx])
-
-    def _compact_tool_call(  # type: ignore[override]
-        self,
-        idx: int,
-        *,
-        tool_name: Optional[str],
-        call_id: Optional[str],
-    ) -> None:
-        original_item = copy.deepcopy(self._items[idx])
-        super()._compact_tool_call(idx, tool_name=tool_name, call_id=call_id)
-        self._record_compaction_delta(original_item, self._items[idx])
+    def _apply_compaction(self, compaction: Any) -> None:  # type: ignore[override]
+        # Compaction is copy-on-write, so the old object is left untouched.
+        original_item = self._items[compaction.index]
+        super()._apply_compaction(compaction)
+        self._record_compaction_delta(original_item, self._items[compaction.index])
 
     def _token_count(self, item: TResponseInputItem) -> int:
         if item.get("compacted") or item.get("messageType") in {"compacted_tool_result", "compacted_tool_call"} or item.get("type") in {"compacted_tool_result", "compacted_tool_call"}:
@@ -1437,7 +1794,49 @@ class TrackingCompactingSession(CompactingSession):
 
 
 RUNNER = Runner()
-SESSIONS: Dict[str, SessionABC] = {}
+
+
+def _positive_int(value: Any) -> Optional[int]:
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    if number <= 0:
+        return None
+    return number
+
+
+# Sessions write through to SQLite so conversations survive a bridge restart.
+# Set AGENT_SESSION_STORE_PATH to an empty string to keep sessions in memory only.
+SESSION_STORE_PATH = os.environ.get("AGENT_SESSION_STORE_PATH", str(STATE_DIR / "sessions.sqlite3"))
+SESSION_STORE: Optional[SessionStore] = SQLiteSessionStore(SESSION_STORE_PATH) if SESSION_STORE_PATH else None
+
+# With a persistent store, only the most recently used sessions stay resident;
+# evicted ones are reloaded from the store on their next request.
+MAX_RESIDENT_SESSIONS: int = _positive_int(os.environ.get("AGENT_SERVICE_MAX_RESIDENT_SESSIONS")) or 256
+SESSIONS: Dict[str, SessionABC] = LRUSessionCache(MAX_RESIDENT_SESSIONS if SESSION_STORE is not None else None)
+
+# Generated summaries, per session and per user; the user's latest one is the
+# cross-session memory injected when memoryInjection is on.
+SUMMARY_STORE = SummaryStore(
+    SUMMARY_OUTPUT_DIR,
+    legacy_path=SUMMARY_FILE_PATH,
+    max_entries=_positive_int(os.environ.get("AGENT_SUMMARY_STORE_CACHE_SIZE")) or 1024,
+)
+
+# Summaries are cached by a hash of their exact prompt, shared across sessions.
+SUMMARY_CACHE = SummaryCache(_positive_int(os.environ.get("AGENT_SUMMARY_CACHE_SIZE")) or 512)
+
+
+async def _discard_persisted_session(agent_id: str) -> None:
+    """Drop stored history for an agent whose session is being reconfigured from scratch."""
+
+    if SESSION_STORE is None:
+        return
+    try:
+        await asyncio.to_thread(SESSION_STORE.clear, agent_id)
+    except Exception as exc:  # pragma: no cover - best-effort persistence
+        print(f"[agents-python] Warning: failed to clear persisted session {agent_id}: {exc}", file=sys.stderr)
 
 
 def _build_instructions(config: Dict[str, Any]) -> str:
@@ -1480,7 +1879,7 @@ def _build_instructions(config: Dict[str, Any]) -> str:
     summary_section = ""
     if memory_enabled:
         sections.append(memory_section)
-        summary_text = _load_cross_session_summary()
+        summary_text = _load_cross_session_summary(_config_user_id(config))
         if summary_text:
             summary_section = f"Cross-session memory:\n{summary_text.strip()}"
             sections.append(summary_section)
@@ -1499,18 +1898,13 @@ def _build_instructions(config: Dict[str, Any]) -> str:
     return instructions
 
 
-def _build_tools(_: Dict[str, Any]) -> List[Any]:
-    return list(TOOL_REGISTRY.values())
+def _config_user_id(config: Dict[str, Any]) -> str:
+    user_id = config.get("userId")
+    return str(user_id).strip() if user_id and str(user_id).strip() else DEFAULT_USER_ID
 
 
-def _positive_int(value: Any) -> Optional[int]:
-    try:
-        number = int(value)
-    except (TypeError, ValueError):
-        return None
-    if number <= 0:
-        return None
-    return number
+def _build_tools(_: Dict[str, Any]) -> List[Any]:
+    return list(TOOL_REGISTRY.values())
 
 
 def _normalize_exclude_tools(value: Any) -> List[str]:
@@ -1530,9 +1924,22 @@ def _normalize_exclude_tools(value: Any) -> List[str]:
     return normalized
 
 
+def _target_ratio(value: Any) -> float:
+    try:
+        ratio = float(value)
+    except (TypeError, ValueError):
+        return 1.0
+    if not 0 < ratio <= 1:
+        return 1.0
+    return ratio
+
+
 def _build_compaction_trigger(config: Dict[str, Any]) -> CompactionTrigger:
     return CompactionTrigger(
         turns=_positive_int(config.get("compactingTriggerTurns")),
+        max_tokens=_positive_int(config.get("compactingTriggerMaxTokens")),
+        max_tool_output_tokens=_positive_int(config.get("compactingTriggerMaxToolTokens")),
+        target_ratio=_target_ratio(config.get("compactingTriggerTargetRatio")),
     )
 
 
@@ -1552,9 +1959,12 @@ def _ensure_session(agent_id: str, config: Dict[str, Any]) -> SessionABC:
                 agent_id,
                 keep_last_n_turns=keep_turns,
                 context_limit=context_limit,
+                store=SESSION_STORE,
+                user_id=_config_user_id(config),
             )
         else:
             existing.configure_limits(keep_turns, context_limit)
+            existing.user_id = _config_user_id(config)
         SESSIONS[agent_id] = existing
         return existing
 
@@ -1572,6 +1982,7 @@ def _ensure_session(agent_id: str, config: Dict[str, Any]) -> SessionABC:
                 keep=keep_turns,
                 exclude_tools=exclude_tools_list,
                 clear_tool_inputs=clear_inputs,
+                store=SESSION_STORE,
             )
         else:
             existing.trigger = trigger
@@ -1587,7 +1998,12 @@ def _ensure_session(agent_id: str, config: Dict[str, Any]) -> SessionABC:
         keep_turns = _positive_int(config.get("memoryKeepRecentTurns")) or 4
         keep_turns = min(keep_turns, max_turns)
         if not isinstance(existing, TrimmingSession):
-            existing = TrimmingSession(agent_id, max_turns=max_turns, keep_last_n_turns=keep_turns)
+            existing = TrimmingSession(
+                agent_id,
+                max_turns=max_turns,
+                keep_last_n_turns=keep_turns,
+                store=SESSION_STORE,
+            )
         else:
             existing.max_turns = max_turns
             existing.keep_last_n_turns = keep_turns
@@ -1595,13 +2011,13 @@ def _ensure_session(agent_id: str, config: Dict[str, Any]) -> SessionABC:
         return existing
 
     if not isinstance(existing, DefaultSession):
-        existing = DefaultSession(agent_id)
+        existing = DefaultSession(agent_id, store=SESSION_STORE)
         SESSIONS[agent_id] = existing
 
     return existing
 
 
-def configure_trimming_sessions(
+async def configure_trimming_sessions(
     agent_ids: Iterable[str],
     enable: bool,
     max_turns: Optional[int] = None,
@@ -1616,18 +2032,20 @@ def configure_trimming_sessions(
     default_keep_last = min(default_keep_last, default_max_turns)
 
     for agent_id in normalized_ids:
+        await _discard_persisted_session(agent_id)
         if enable:
             session = TrimmingSession(
                 agent_id,
                 max_turns=default_max_turns,
                 keep_last_n_turns=default_keep_last,
+                store=SESSION_STORE,
             )
         else:
-            session = DefaultSession(agent_id)
+            session = DefaultSession(agent_id, store=SESSION_STORE)
         SESSIONS[agent_id] = session
 
 
-def configure_summarizing_sessions(
+async def configure_summarizing_sessions(
     agent_ids: Iterable[str],
     enable: bool,
     *,
@@ -1649,17 +2067,20 @@ def configure_summarizing_sessions(
                 existing.configure_limits(default_keep_last, default_context_limit)
                 session = existing
             else:
+                await _discard_persisted_session(agent_id)
                 session = SummarizingSession(
                     agent_id,
                     keep_last_n_turns=default_keep_last,
                     context_limit=default_context_limit,
+                    store=SESSION_STORE,
                 )
         else:
-            session = DefaultSession(agent_id)
+            await _discard_persisted_session(agent_id)
+            session = DefaultSession(agent_id, store=SESSION_STORE)
         SESSIONS[agent_id] = session
 
 
-def configure_compacting_sessions(
+async def configure_compacting_sessions(
     agent_ids: Iterable[str],
     enable: bool,
     *,
@@ -1675,6 +2096,9 @@ def configure_compacting_sessions(
     trigger_payload = trigger or {}
     trigger_config = {
         "compactingTriggerTurns": trigger_payload.get("turns"),
+        "compactingTriggerMaxTokens": trigger_payload.get("max_tokens"),
+        "compactingTriggerMaxToolTokens": trigger_payload.get("max_tool_output_tokens"),
+        "compactingTriggerTargetRatio": trigger_payload.get("target_ratio"),
     }
     keep_turns = _positive_int(keep) or 2
     normalized_exclude = _normalize_exclude_tools(exclude_tools)
@@ -1682,6 +2106,7 @@ def configure_compacting_sessions(
 
     for agent_id in normalized_ids:
         compaction_trigger = _build_compaction_trigger(trigger_config)
+        await _discard_persisted_session(agent_id)
         if enable:
             session = TrackingCompactingSession(
                 agent_id,
@@ -1689,9 +2114,10 @@ def configure_compacting_sessions(
                 keep=keep_turns,
                 exclude_tools=list(normalized_exclude),
                 clear_tool_inputs=clear_inputs,
+                store=SESSION_STORE,
             )
         else:
-            session = DefaultSession(agent_id)
+            session = DefaultSession(agent_id, store=SESSION_STORE)
         SESSIONS[agent_id] = session
 
 
@@ -1774,6 +2200,10 @@ async def run_agent(  # noqa: C901 - orchestration requires several steps
 
     tools = _build_tools(config)
     instructions = _build_instructions(config)
+    # Snapshot the prompt token counts now: other agents' runs may rebuild their
+    # instructions (and overwrite the module globals) while this run is awaiting.
+    base_prompt_tokens = BASE_PROMPT_TOKEN_COUNT
+    injected_memory_tokens = INJECTED_MEMORY_TOKEN_COUNT
     model = str(config.get("model") or "gpt-5")
 
     reasoning_level = str(config.get("reasoningLevel") or "medium")
@@ -1832,15 +2262,16 @@ async def run_agent(  # noqa: C901 - orchestration requires several steps
         response_text = "(No response generated by agent.)"
 
     token_usage = _extract_usage(result, messages, response_text, tool_log, tool_events)
-    token_usage["basePrompt"] = BASE_PROMPT_TOKEN_COUNT
-    if INJECTED_MEMORY_TOKEN_COUNT:
+    token_usage["basePrompt"] = base_prompt_tokens
+    if injected_memory_tokens:
         try:
-            token_usage["memory"] = int(token_usage.get("memory", 0)) + INJECTED_MEMORY_TOKEN_COUNT
+            token_usage["memory"] = int(token_usage.get("memory", 0)) + injected_memory_tokens
         except Exception:
             token_usage = dict(token_usage or {})
-            token_usage["memory"] = int(token_usage.get("memory", 0)) + INJECTED_MEMORY_TOKEN_COUNT
+            token_usage["memory"] = int(token_usage.get("memory", 0)) + injected_memory_tokens
 
     summary_payload: Optional[Dict[str, str]] = None
+    summary_stats: Optional[Dict[str, Any]] = None
     if isinstance(session, SummarizingSession):
         summary_payload = await session.get_last_summary()
 
@@ -1859,11 +2290,14 @@ async def run_agent(  # noqa: C901 - orchestration requires several steps
     )
 
     # If summarization happened this run, count the generated summary as memory tokens
-    # by dividing character count by 4 (ceiling), consistent with other token calculations.
+    # with the shared token counter, consistent with other token calculations.
+    if context_summarized and isinstance(session, SummarizingSession):
+        summary_stats = await session.get_last_summary_report()
+
     if context_summarized and summary_payload:
         summary_text_for_usage = str(summary_payload.get("summary_text") or "")
         if summary_text_for_usage:
-            memory_tokens = int(math.ceil(len(summary_text_for_usage) / 4.0))
+            memory_tokens = _estimate_tokens_from_text(summary_text_for_usage)
             try:
                 token_usage["memory"] = memory_tokens
             except Exception:
@@ -1981,6 +2415,7 @@ async def run_agent(  # noqa: C901 - orchestration requires several steps
         "toolResults": tool_log,
         "tokenUsage": token_usage,
         "summary": summary_payload,
+        "summaryStats": summary_stats,
         "contextTrimmed": context_trimmed,
         "contextSummarized": context_summarized,
         "contextCompacted": context_compacted,
@@ -1994,7 +2429,7 @@ def _extract_usage(
     tool_log: List[str],
     tool_events: List[Dict[str, Any]],
 ) -> Dict[str, int]:
-    # Token usage is derived from character counts rather than agent-reported values.
+    # Token usage is derived from the shared token counter rather than agent-reported values.
     _ = result
 
     def _text_from_content(value: Any) -> str:
@@ -2022,24 +2457,19 @@ def _extract_usage(
                 return str(value)
         return str(value)
 
-    def _chars_to_tokens(char_count: int) -> int:
-        if char_count <= 0:
-            return 0
-        return int(math.ceil(char_count / 4.0))
-
-    user_char_count = 0
+    user_tokens = 0
     for message in messages or []:
         if not isinstance(message, dict):
             continue
         if message.get("role") != ROLE_USER:
             continue
         content_text = _text_from_content(message.get("content"))
-        user_char_count += len(content_text)
+        user_tokens += _estimate_tokens_from_text(content_text)
 
-    agent_char_count = len(response or "")
+    agent_tokens = _estimate_tokens_from_text(response or "")
 
-    tool_char_count = 0
-    rag_char_count = 0
+    tool_tokens = 0
+    rag_tokens = 0
 
     if tool_events:
         for event in tool_events:
@@ -2048,12 +2478,12 @@ def _extract_usage(
             output_text = _text_from_content(event.get("output"))
             if not output_text:
                 continue
-            length = len(output_text)
-            tool_char_count += length
+            tokens = _estimate_tokens_from_text(output_text)
+            tool_tokens += tokens
             if event.get("name") == "SearchPolicy":
-                rag_char_count += length
+                rag_tokens += tokens
 
-    if tool_char_count == 0 and tool_log:
+    if tool_tokens == 0 and tool_log:
         for entry in tool_log:
             if not isinstance(entry, str):
                 continue
@@ -2069,17 +2499,17 @@ def _extract_usage(
             output_text = _text_from_content(decoded_output)
             if not output_text:
                 continue
-            length = len(output_text)
-            tool_char_count += length
+            tokens = _estimate_tokens_from_text(output_text)
+            tool_tokens += tokens
             if entry.startswith("SearchPolicy"):
-                rag_char_count += length
+                rag_tokens += tokens
 
     return {
-        "userInput": _chars_to_tokens(user_char_count),
-        "agentOutput": _chars_to_tokens(agent_char_count),
-        "tools": _chars_to_tokens(tool_char_count),
+        "userInput": user_tokens,
+        "agentOutput": agent_tokens,
+        "tools": tool_tokens,
         "memory": 0,
-        "rag": _chars_to_tokens(rag_char_count),
+        "rag": rag_tokens,
         "basePrompt": 0,
     }
 
@@ -2106,7 +2536,7 @@ async def handle_command(payload: Dict[str, Any]) -> Dict[str, Any]:
         enable = bool(payload.get("enable"))
         max_turns = payload.get("max_turns")
         keep_last = payload.get("keep_last")
-        configure_summarizing_sessions(agent_ids, enable, max_turns=max_turns, keep_last=keep_last)
+        await configure_summarizing_sessions(agent_ids, enable, max_turns=max_turns, keep_last=keep_last)
         return {"ok": True}
 
     if cmd_type == "configure_trimming":
@@ -2116,7 +2546,7 @@ async def handle_command(payload: Dict[str, Any]) -> Dict[str, Any]:
         enable = bool(payload.get("enable"))
         max_turns = payload.get("max_turns")
         keep_last = payload.get("keep_last")
-        configure_trimming_sessions(agent_ids, enable, max_turns, keep_last=keep_last)
+        await configure_trimming_sessions(agent_ids, enable, max_turns, keep_last=keep_last)
         return {"ok": True}
 
     if cmd_type == "configure_compacting":
@@ -2128,7 +2558,7 @@ async def handle_command(payload: Dict[str, Any]) -> Dict[str, Any]:
         keep = payload.get("keep")
         exclude_tools = payload.get("exclude_tools")
         clear_tool_inputs = payload.get("clear_tool_inputs")
-        configure_compacting_sessions(
+        await configure_compacting_sessions(
             agent_ids,
             enable,
             trigger=trigger if isinstance(trigger, dict) else None,
@@ -2141,29 +2571,156 @@ async def handle_command(payload: Dict[str, Any]) -> Dict[str, Any]:
     if cmd_type == "reset":
         reset_data_stores()
         SESSIONS.clear()
+        if SESSION_STORE is not None:
+            await asyncio.to_thread(SESSION_STORE.clear_all)
         return {"ok": True}
 
     raise ValueError(f"Unsupported command type: {cmd_type}")
 
 
+# Maximum number of commands executing at once. A command only takes a slot
+# once the earlier commands for its agents have finished, so commands queued
+# behind a slow agent do not keep other agents from running.
+MAX_IN_FLIGHT: int = _positive_int(os.environ.get("AGENT_SERVICE_MAX_IN_FLIGHT")) or 8
+# Maximum number of commands read but not yet finished (waiting or executing).
+# Once it is reached the reader stops pulling lines from stdin, so a burst of
+# requests queues in the pipe instead of in this process.
+MAX_QUEUED: int = _positive_int(os.environ.get("AGENT_SERVICE_MAX_QUEUED")) or 256
+
+_CONFIGURE_COMMANDS = {"configure_summarization", "configure_trimming", "configure_compacting"}
+
+
+# Tail of each agent's queue: the completion future of the last command
+# dispatched for that agent. Dropped once that command finishes with nothing
+# queued behind it.
+_AGENT_TAILS: Dict[str, asyncio.Future[None]] = {}
+
+
+def _reserve_agents(agent_keys: List[str]) -> Tuple[List[asyncio.Future[None]], asyncio.Future[None]]:
+    """Queue a command behind every agent it touches.
+
+    This runs synchronously when the command is read, so a command spanning
+    several agents takes its place in all of their queues at once. Returns the
+    completion futures of the commands it has to wait for, and its own.
+    """
+
+    done: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+    previous: List[asyncio.Future[None]] = []
+    for key in agent_keys:
+        tail = _AGENT_TAILS.get(key)
+        if tail is not None and tail not in previous:
+            previous.append(tail)
+        _AGENT_TAILS[key] = done
+    return previous, done
+
+
+def _release_agents(agent_keys: List[str], done: asyncio.Future[None]) -> None:
+    done.set_result(None)
+    for key in agent_keys:
+        if _AGENT_TAILS.get(key) is done:
+            del _AGENT_TAILS[key]
+
+
+def _command_agent_keys(payload: Dict[str, Any]) -> Optional[List[str]]:
+    """Return the agent ids a command touches, or None if it must run exclusively."""
+
+    cmd_type = payload.get("type")
+    if cmd_type == "run":
+        return [str(payload.get("agent_id"))]
+    if cmd_type in _CONFIGURE_COMMANDS:
+        agent_ids = payload.get("agent_ids")
+        if not isinstance(agent_ids, list):
+            return []
+        return sorted({str(agent_id) for agent_id in agent_ids if agent_id})
+    # `reset` (and anything unrecognized) acts on global state.
+    return None
+
+
+def _write_envelope(envelope: Dict[str, Any]) -> None:
+    sys.stdout.write(json.dumps(envelope) + "\n")
+    sys.stdout.flush()
+
+
+async def _execute_command(payload: Dict[str, Any]) -> None:
+    request_id = payload.get("id")
+    try:
+        result = await handle_command(payload)
+        envelope = {"id": request_id, "status": "ok", "result": result}
+    except Exception as exc:  # pragma: no cover - defensive logging
+        envelope = {"id": request_id, "status": "error", "error": str(exc)}
+    _write_envelope(envelope)
+
+
+async def _execute_serialized(
+    payload: Dict[str, Any],
+    agent_keys: List[str],
+    previous: List[asyncio.Future[None]],
+    done: asyncio.Future[None],
+    slots: asyncio.Semaphore,
+    queued: asyncio.Semaphore,
+) -> None:
+    try:
+        if previous:
+            await asyncio.wait(previous)
+        async with slots:
+            await _execute_command(payload)
+    finally:
+        _release_agents(agent_keys, done)
+        queued.release()
+
+
 async def _process_stream() -> None:
-    for line in sys.stdin:
+    """Read NDJSON commands and run them concurrently.
+
+    Commands for different agents overlap; commands for the same agent run in
+    arrival order. Envelopes are written as each command completes, so they may
+    be out of order relative to the input; callers match them by `id`.
+    """
+
+    slots = asyncio.Semaphore(MAX_IN_FLIGHT)
+    queued = asyncio.Semaphore(MAX_QUEUED)
+    in_flight: set[asyncio.Task[None]] = set()
+
+    while True:
+        await queued.acquire()
+        line = await asyncio.to_thread(sys.stdin.readline)
+        if not line:
+            queued.release()
+            break
         line = line.strip()
         if not line:
+            queued.release()
             continue
+
         try:
             payload = json.loads(line)
-            request_id = payload.get("id")
-            result = await handle_command(payload)
-            envelope = {"id": request_id, "status": "ok", "result": result}
-        except Exception as exc:  # pragma: no cover - defensive logging
-            envelope = {
-                "id": payload.get("id") if "payload" in locals() else None,
-                "status": "error",
-                "error": str(exc),
-            }
-        sys.stdout.write(json.dumps(envelope) + "\n")
-        sys.stdout.flush()
+            if not isinstance(payload, dict):
+                raise ValueError("command must be a JSON object")
+        except ValueError as exc:
+            queued.release()
+            _write_envelope({"id": None, "status": "error", "error": str(exc)})
+            continue
+
+        agent_keys = _command_agent_keys(payload)
+        if agent_keys is None:
+            # Global commands wait for everything already dispatched, then run alone.
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+            try:
+                await _execute_command(payload)
+            finally:
+                queued.release()
+            continue
+
+        previous, done = _reserve_agents(agent_keys)
+        task = asyncio.create_task(
+            _execute_serialized(payload, agent_keys, previous, done, slots, queued)
+        )
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    if in_flight:
+        await asyncio.gather(*in_flight, return_exceptions=True)
 
 
 def main() -> None:
@@ -2172,6 +2729,8 @@ def main() -> None:
         asyncio.run(_process_stream())
     except KeyboardInterrupt:  # pragma: no cover - allow clean exit
         pass
+    finally:
+        SUMMARY_STORE.close()
 
 
 if __name__ == "__main__":
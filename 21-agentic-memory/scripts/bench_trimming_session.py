@@ -0,0 +1,65 @@
+"""Micro-benchmark for TrimmingSession turn accounting.
+
+Grows a single session to a large history and reports the mean latency of one
+turn (`add_items` followed by `get_items(limit)`) at several history sizes. With
+the running turn index the per-turn cost should stay flat as history grows.
+
+Usage:
+  python scripts/bench_trimming_session.py --items 10000 --limit 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Any, Dict, List
+
+# Benchmark in memory only; never touch the bridge's session database.
+os.environ["AGENT_SESSION_STORE_PATH"] = ""
+
+from agent_service import TrimmingSession  # noqa: E402
+
+
+def _turn(index: int) -> List[Dict[str, Any]]:
+    return [
+        {"role": "user", "content": f"Question {index}: my laptop will not connect to Wi-Fi."},
+        {"type": "function_call_output", "name": "SearchPolicy", "output": "Policy text " * 20},
+        {"role": "assistant", "content": f"Answer {index}: try toggling airplane mode first."},
+    ]
+
+
+async def _bench(total_items: int, limit: int, checkpoints: int, sample: int) -> None:
+    # max_turns above the history size so the window keeps growing instead of trimming.
+    session = TrimmingSession("bench", max_turns=total_items, keep_last_n_turns=total_items)
+    items_per_turn = len(_turn(0))
+    marks = [total_items * (i + 1) // checkpoints for i in range(checkpoints)]
+
+    print(f"{'history items':>14} {'mean turn (us)':>15}")
+    turn = 0
+    for mark in marks:
+        while len(session._items) + items_per_turn * sample < mark:
+            await session.add_items(_turn(turn))
+            turn += 1
+        started = time.perf_counter()
+        for _ in range(sample):
+            await session.add_items(_turn(turn))
+            await session.get_items(limit)
+            turn += 1
+        elapsed = time.perf_counter() - started
+        print(f"{len(session._items):>14} {elapsed / sample * 1e6:>15.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=10_000, help="history size to grow to")
+    parser.add_argument("--limit", type=int, default=50, help="items requested per get_items call")
+    parser.add_argument("--checkpoints", type=int, default=5, help="number of history sizes to report")
+    parser.add_argument("--sample", type=int, default=200, help="turns timed at each checkpoint")
+    args = parser.parse_args()
+    asyncio.run(_bench(args.items, args.limit, args.checkpoints, args.sample))
+
+
+if __name__ == "__main__":
+    main()
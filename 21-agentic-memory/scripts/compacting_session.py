@@ -3,8 +3,11 @@
 # CompactingSession for OpenAI Agents SDK
 # ---------------------------------------
 # Behavior
-# - When trigger is exceeded (by turns), begin compacting the OLDEST user turns first (chronological order),
-#   preserving the most recent `keep` turns intact.
+# - When a trigger is exceeded (by turns, total tokens or tool-output tokens), begin compacting
+#   the OLDEST user turns first (chronological order), preserving the most recent `keep` turns intact.
+# - Token budgets are checked against running totals kept as items are added, compacted or popped.
+#   One selection pass over the oldest candidates picks the smallest prefix that brings the
+#   history under budget (or down to `target_ratio` of it), then applies those compactions.
 # - Compaction clears tool RESULTS by default, replacing their payloads
 #   with a placeholder string so the model knows context was removed.
 # - If clear_tool_inputs=True, it also clears tool CALL arguments.
@@ -14,17 +17,27 @@
 #   One user message + everything that follows (assistant, reasoning,
 #   tool calls, tool results) until the next user message.
 #
+# Storage:
+#   Items are normalized once when they are added. Alongside each stored item
+#   the session keeps its model-facing view, built at the same time, so reads
+#   return those shared views without copying. Compaction is copy-on-write: it
+#   swaps in new item/view objects rather than editing the old ones, so views
+#   handed out earlier never change under the caller. Treat returned items as
+#   read-only.
+#
 # Integration:
-#   session = CompactingSession("my_session", trigger={"turns": 20}, keep=2)
+#   session = CompactingSession("my_session", trigger=CompactionTrigger(max_tokens=8000), keep=2)
 #   result = await Runner.run(agent, "Hello", session=session)
 
 from __future__ import annotations
 
-from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from dataclasses import dataclass, field
-import math
 import copy
 
+from session_store import PersistentSessionMixin, SessionStore
+from token_accounting import count_tokens
+
 # Import your SDK interfaces; shown here as type comments to avoid hard deps.
 # from agents.memory.session import SessionABC
 # from agents.items import TResponseInputItem
@@ -189,13 +202,13 @@ def _stringify_content_field(item: TResponseInputItem) -> str:
 
 def _default_token_counter(item: TResponseInputItem) -> int:
     """
-    Cheap token estimator. Roughly chars/4 with a floor.
-    You can supply a better tokenizer via token_counter in CompactingSession.
+    Token count from the shared, memoized counter in token_accounting, with a floor of 1.
+    You can supply a different tokenizer via token_counter in CompactingSession.
     """
     text = _stringify_content_field(item)
     if not text:
         return 1
-    return max(1, math.ceil(len(text) / 4))
+    return max(1, count_tokens(text))
 
 
 def _build_call_index(items: List[TResponseInputItem]) -> Dict[str, Dict[str, Any]]:
@@ -220,14 +233,51 @@ def _build_call_index(items: List[TResponseInputItem]) -> Dict[str, Dict[str, An
 @dataclass
 class CompactionTrigger:
     """
-    Compaction runs when the number of user-anchored turns exceeds `turns`.
+    Compaction runs when ANY configured threshold is exceeded:
+    - turns: user-anchored turns since the last compaction exceed this count.
+    - max_tokens: the model-facing history holds more than this many tokens.
+    - max_tool_output_tokens: tool results in the history hold more than this many tokens.
+
+    When a token budget is exceeded, compaction frees enough tokens to get back to
+    `target_ratio` * budget (1.0 compacts only down to the budget itself).
     """
 
     turns: Optional[int] = None
+    max_tokens: Optional[int] = None
+    max_tool_output_tokens: Optional[int] = None
+    target_ratio: float = 1.0
+
+    def target(self, budget: int) -> int:
+        ratio = min(1.0, max(0.0, float(self.target_ratio)))
+        return int(budget * ratio)
+
+
+def _budget_excess(used: int, budget: Optional[int], trigger: CompactionTrigger) -> Optional[int]:
+    if budget is None:
+        return None
+    if used > budget:
+        return used - trigger.target(budget)
+    return used - budget
+
+
+def _over(excess: Optional[int]) -> bool:
+    return excess is not None and excess > 0
 
 
 @dataclass
-class CompactingSession(SessionABC):
+class _Compaction:
+    """A prepared compaction: the replacement item, its view and the tokens it frees."""
+
+    index: int
+    item: TResponseInputItem
+    view: TResponseInputItem
+    tokens: int
+    freed_tokens: int
+    freed_tool_tokens: int
+
+
+@dataclass
+class CompactingSession(PersistentSessionMixin, SessionABC):
     """
     A Session that compacts the oldest tool interactions when configured thresholds are exceeded.
 
@@ -241,6 +291,7 @@ class CompactingSession(SessionABC):
         token_counter: Optional callable(item)->int for input token estimation.
         placeholder_template: Template used when replacing compacted items.
                               Receives kwargs: kind ("result"|"call"), name, call_id, reason.
+        store: Optional SessionStore; history is written through to it and lazily reloaded.
     """
 
     session_id: str
@@ -254,10 +305,23 @@ class CompactingSession(SessionABC):
     placeholder_template: str = (
         "⟦removed: tool {kind} for {name} (call_id={call_id}); reason=context_compaction⟧"
     )
+    store: Optional[SessionStore] = None
 
-    # internal buffer
+    # internal buffer: storage items and their precomputed model-facing views
     _items: List[TResponseInputItem] = field(default_factory=list)
+    _views: List[TResponseInputItem] = field(default_factory=list, init=False)
+    # running token accounting over the views (per item, total, tool results only)
+    _token_counts: List[int] = field(default_factory=list, init=False)
+    _total_tokens: int = field(default=0, init=False)
+    _tool_output_tokens: int = field(default=0, init=False)
     internal_turn_counter: int = field(default=0, init=False)
+    _store_loaded: bool = field(default=False, init=False)
+    # positions rewritten by compaction during the current add_items call
+    _rewritten_positions: set[int] = field(default_factory=set, init=False)
+
+    def __post_init__(self) -> None:
+        if self._items:
+            self._restore_items(self._items)
 
     # --------------
     # SessionABC API
@@ -297,32 +361,58 @@ class CompactingSession(SessionABC):
         self.internal_turn_counter = max(0, numeric)
 
     async def get_items(self, limit: int | None = None) -> List[TResponseInputItem]:
-        self._normalize_compacted_items()
-        if limit is None or limit >= len(self._items):
-            items = copy.deepcopy(self._items)
-        else:
-            items = copy.deepcopy(self._items[-limit:])
-        for item in items:
-            self._normalize_item(item, for_storage=False)
-        return items
+        await self._ensure_loaded()
+        if limit is None or limit >= len(self._views):
+            return list(self._views)
+        return self._views[-limit:]
 
     async def add_items(self, items: List[TResponseInputItem]) -> None:
+        await self._ensure_loaded()
         # Append and then compact if needed.
-        self._items.extend(self._safe_copy_items(items))
+        new_items = self._safe_copy_items(items)
+        for item in new_items:
+            self._append_item(item)
         self._increment_internal_turn_counter(items)
+        self._rewritten_positions.clear()
         self._maybe_compact()
+        await self._persist_append(new_items)
+        if self._rewritten_positions:
+            await self._persist_updates(self._rewritten_positions)
+            self._rewritten_positions.clear()
 
     async def pop_item(self) -> TResponseInputItem | None:
+        await self._ensure_loaded()
         if not self._items:
             return None
-        item = self._items.pop()
-        sanitized = copy.deepcopy(item)
-        self._normalize_item(sanitized, for_storage=False)
-        return sanitized
+        self._items.pop()
+        view = self._views.pop()
+        self._track_tokens(view, -self._token_counts.pop())
+        await self._persist("pop_item")
+        return view
 
     async def clear_session(self) -> None:
         self._items.clear()
+        self._views.clear()
+        self._token_counts.clear()
+        self._total_tokens = 0
+        self._tool_output_tokens = 0
         self._reset_internal_turn_counter()
+        await self._persist_clear()
+
+    def _restore_items(self, items: List[TResponseInputItem]) -> None:
+        restored = list(items)
+        for item in restored:
+            self._normalize_item(item, for_storage=True)
+        self._items = []
+        self._views = []
+        self._token_counts = []
+        self._total_tokens = 0
+        self._tool_output_tokens = 0
+        for item in restored:
+            self._append_item(item)
+
+    def _is_turn_start(self, item: TResponseInputItem) -> bool:
+        return _is_user(item)
 
     # --------------
     # Core logic
@@ -332,13 +422,51 @@ class CompactingSession(SessionABC):
         if not self._items:
             return
 
-        self._normalize_compacted_items()
-
         # Check if thresholds are exceeded
-        exceeds = self._exceeds_trigger()
-        if not exceeds:
+        turns_exceeded = self._exceeds_trigger()
+        token_excess, tool_excess = self._token_excess()
+        if not (turns_exceeded or _over(token_excess) or _over(tool_excess)):
             return
 
+        # Every compaction resets the turn counter to `keep`, so one compaction
+        # satisfies the turns trigger unless `keep` is itself above it.
+        trig = self.trigger or CompactionTrigger()
+        turns_survive_reset = trig.turns is not None and self.keep > trig.turns
+
+        # Single selection pass: take the oldest candidates until every exceeded
+        # threshold is satisfied, then apply that minimal set. Compacting a tiny
+        # payload can grow it (the placeholder is longer), so a candidate is only
+        # taken for a token budget if it actually frees tokens toward it.
+        plan: List[_Compaction] = []
+        for idx, kind, tname, cid in self._compaction_candidates():
+            if not (turns_exceeded or _over(token_excess) or _over(tool_excess)):
+                break
+            compaction = self._prepare_compaction(idx, kind=kind, tool_name=tname, call_id=cid)
+            if not (
+                turns_exceeded
+                or (_over(token_excess) and compaction.freed_tokens > 0)
+                or (_over(tool_excess) and compaction.freed_tool_tokens > 0)
+            ):
+                continue
+            plan.append(compaction)
+            if token_excess is not None:
+                token_excess -= compaction.freed_tokens
+            if tool_excess is not None:
+                tool_excess -= compaction.freed_tool_tokens
+            turns_exceeded = turns_exceeded and turns_survive_reset
+
+        for compaction in plan:
+            self._apply_compaction(compaction)
+
+        # If thresholds are still exceeded we did everything we can (older turns
+        # compacted). Newest `keep` turns remain intact by contract.
+
+    def _compaction_candidates(self) -> Iterator[Tuple[int, str, Optional[str], Optional[str]]]:
+        """
+        Yield (index, kind, tool_name, call_id) for items that may be compacted, oldest
+        turns first. Within a turn tool RESULTS come first, then tool CALLS if
+        clear_tool_inputs=True. Already compacted and excluded tools are skipped.
+        """
         # Build turn map and call index for pairing results->calls
         turns, user_turn_ids = self._group_by_user_turns()
         protected_turn_ids = set(user_turn_ids[-max(0, self.keep):])  # keep most recent K turns intact
@@ -346,52 +474,33 @@ class CompactingSession(SessionABC):
         call_index = _build_call_index(self._items)
         excluded = _lower_set(self.exclude_tools)
 
-        # Iterate from oldest user turns towards newer (excluding protected)
         for turn_id in user_turn_ids:
             if turn_id in protected_turn_ids:
                 continue
-
-            # Collect indices inside this turn that we MAY compact
             turn_indices = turns[turn_id]
 
-            # 1) Compact tool RESULTS first (oldest to newest)
             for idx in turn_indices:
                 item = self._items[idx]
-                if not _is_tool_result(item):
+                if item.get("compacted") or not _is_tool_result(item):
                     continue
                 # Determine tool name via call_id lookup
                 cid = _get_call_id(item)
                 tname = None
                 if cid and cid in call_index:
                     tname = call_index[cid]["name"]
-
                 if tname and tname.lower() in excluded:
                     continue
+                yield idx, "result", tname, cid
 
-                self._compact_tool_result(idx, tool_name=tname, call_id=cid)
-
-                # After each compaction, check if now under threshold
-                if not self._exceeds_trigger():
-                    return
-
-            # 2) If still over threshold and clear_tool_inputs=True, compact tool CALLS
             if self.clear_tool_inputs:
                 for idx in turn_indices:
                     item = self._items[idx]
-                    if not _is_tool_call(item):
+                    if item.get("compacted") or not _is_tool_call(item):
                         continue
                     tname = _get_tool_name_from_call(item)
                     if tname and tname.lower() in excluded:
                         continue
-
-                    cid = _get_call_id(item)
-                    self._compact_tool_call(idx, tool_name=tname, call_id=cid)
-
-                    if not self._exceeds_trigger():
-                        return
-
-        # If we reach here and are still over threshold, we did everything we can
-        # (older turns compacted). Newest `keep` turns remain intact by contract.
+                    yield idx, "call", tname, _get_call_id(item)
 
     def _exceeds_trigger(self) -> bool:
         trig = self.trigger or CompactionTrigger()
@@ -399,6 +508,26 @@ class CompactingSession(SessionABC):
             return False
         return self.internal_turn_counter > trig.turns
 
+    def _token_excess(self) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Tokens above the (total, tool-output) targets, or None for an unset budget.
+        A budget that is exceeded targets `target_ratio` of itself; one that is not
+        reports its (non-positive) headroom so growth during selection is still seen.
+        """
+        trig = self.trigger or CompactionTrigger()
+        return (
+            _budget_excess(self._total_tokens, trig.max_tokens, trig),
+            _budget_excess(self._tool_output_tokens, trig.max_tool_output_tokens, trig),
+        )
+
+    @property
+    def total_tokens(self) -> int:
+        return self._total_tokens
+
+    @property
+    def tool_output_tokens(self) -> int:
+        return self._tool_output_tokens
+
     def _group_by_user_turns(self) -> Tuple[Dict[int, List[int]], List[int]]:
         """
         Returns:
@@ -433,11 +562,47 @@ class CompactingSession(SessionABC):
             reason="context_compaction",
         )
 
-    def _normalize_compacted_items(self) -> None:
-        if not self._items:
-            return
-        for item in self._items:
-            self._normalize_item(item, for_storage=True)
+    def _build_view(self, item: TResponseInputItem) -> TResponseInputItem:
+        """Model-facing copy of a storage item, built once per item version."""
+        view = copy.deepcopy(item)
+        self._normalize_item(view, for_storage=False)
+        return view
+
+    def _count_view_tokens(self, view: TResponseInputItem) -> int:
+        counter = self.token_counter or _default_token_counter
+        return max(0, int(counter(view)))
+
+    def _track_tokens(self, view: TResponseInputItem, tokens: int) -> None:
+        self._total_tokens += tokens
+        if _is_tool_result(view):
+            self._tool_output_tokens += tokens
+
+    def _append_item(self, item: TResponseInputItem) -> None:
+        view = self._build_view(item)
+        tokens = self._count_view_tokens(view)
+        self._items.append(item)
+        self._views.append(view)
+        self._token_counts.append(tokens)
+        self._track_tokens(view, tokens)
+
+    def _replace_item(
+        self,
+        idx: int,
+        item: TResponseInputItem,
+        *,
+        view: Optional[TResponseInputItem] = None,
+        tokens: Optional[int] = None,
+    ) -> None:
+        if view is None:
+            view = self._build_view(item)
+        if tokens is None:
+            tokens = self._count_view_tokens(view)
+        self._track_tokens(self._views[idx], -self._token_counts[idx])
+        self._items[idx] = item
+        self._views[idx] = view
+        self._token_counts[idx] = tokens
+        self._track_tokens(view, tokens)
+        self._rewritten_positions.add(idx)
 
     def _normalize_item(self, item: TResponseInputItem, *, for_storage: bool) -> None:
         raw_obj = item.get("raw")
@@ -512,19 +677,54 @@ class CompactingSession(SessionABC):
                 elif isinstance(value, (dict, list)):
                     self._strip_compacted_labels(value)
 
+    def _prepare_compaction(
+        self, idx: int, *, kind: str, tool_name: Optional[str], call_id: Optional[str]
+    ) -> _Compaction:
+        """Build the compacted replacement for item `idx` and measure the tokens it frees."""
+        build = self._compacted_tool_result if kind == "result" else self._compacted_tool_call
+        item = build(self._items[idx], tool_name=tool_name, call_id=call_id)
+        view = self._build_view(item)
+        tokens = self._count_view_tokens(view)
+        old_view, old_tokens = self._views[idx], self._token_counts[idx]
+        old_tool = old_tokens if _is_tool_result(old_view) else 0
+        new_tool = tokens if _is_tool_result(view) else 0
+        return _Compaction(
+            index=idx,
+            item=item,
+            view=view,
+            tokens=tokens,
+            freed_tokens=old_tokens - tokens,
+            freed_tool_tokens=old_tool - new_tool,
+        )
+
+    def _apply_compaction(self, compaction: _Compaction) -> None:
+        self._replace_item(compaction.index, compaction.item, view=compaction.view, tokens=compaction.tokens)
+        self._reset_internal_turn_counter(value=self.keep)
+
     def _compact_tool_result(self, idx: int, *, tool_name: Optional[str], call_id: Optional[str]) -> None:
         """
         Replace tool result payload with a compact placeholder but keep the item in place.
         """
-        item = self._items[idx]
+        self._apply_compaction(self._prepare_compaction(idx, kind="result", tool_name=tool_name, call_id=call_id))
+
+    def _compact_tool_call(self, idx: int, *, tool_name: Optional[str], call_id: Optional[str]) -> None:
+        """
+        Replace tool call arguments with a compact placeholder while keeping the tool name.
+        """
+        self._apply_compaction(self._prepare_compaction(idx, kind="call", tool_name=tool_name, call_id=call_id))
+
+    def _compacted_tool_result(
+        self, original: TResponseInputItem, *, tool_name: Optional[str], call_id: Optional[str]
+    ) -> TResponseInputItem:
+        # Copy-on-write: edit shallow copies so earlier views are never mutated.
+        item = dict(original)
         ph = self._placeholder(kind="result", name=tool_name, call_id=call_id)
 
         # Mark as compacted in a model-visible way:
         # - If there is a string-bearing "content", replace with the placeholder.
         # - Also null out or overwrite raw["output"].
         raw = item.get("raw")
-        if not isinstance(raw, dict):
-            raw = {}
+        raw = dict(raw) if isinstance(raw, dict) else {}
         raw["output"] = ph
         raw["compacted"] = True
         raw["type"] = "function_call_output"
@@ -546,17 +746,15 @@ class CompactingSession(SessionABC):
         # Tag the item for downstream logic if needed
         item["compacted"] = True
         self._normalize_item(item, for_storage=True)
-        self._reset_internal_turn_counter(value=self.keep)
+        return item
 
-    def _compact_tool_call(self, idx: int, *, tool_name: Optional[str], call_id: Optional[str]) -> None:
-        """
-        Replace tool call arguments with a compact placeholder while keeping the tool name.
-        """
-        item = self._items[idx]
+    def _compacted_tool_call(
+        self, original: TResponseInputItem, *, tool_name: Optional[str], call_id: Optional[str]
+    ) -> TResponseInputItem:
+        item = dict(original)
         ph = self._placeholder(kind="call", name=tool_name, call_id=call_id)
         raw = item.get("raw")
-        if not isinstance(raw, dict):
-            raw = {}
+        raw = dict(raw) if isinstance(raw, dict) else {}
         raw["arguments"] = ph
         raw["output"] = ph
         raw["compacted"] = True
@@ -576,7 +774,7 @@ class CompactingSession(SessionABC):
 
         item["compacted"] = True
         self._normalize_item(item, for_storage=True)
-        self._reset_internal_turn_counter(value=self.keep)
+        return item
 
     def _safe_copy_items(self, items: Iterable[TResponseInputItem]) -> List[TResponseInputItem]:
         copied: List[TResponseInputItem] = []
@@ -595,6 +793,8 @@ class CompactingSession(SessionABC):
 #     session_id="compacting_demo",
 #     trigger=CompactionTrigger(
 #         turns=25,          # start compacting once the conversation exceeds 25 user turns
+#         max_tool_output_tokens=6000,  # ...or once tool results hold more than 6k tokens
+#         target_ratio=0.75,            # and then compact down to ~4.5k tool tokens
 #     ),
 #     keep=2,                        # always keep last 2 user turns intact
 #     exclude_tools=["GetOrder"],    # never compact these tool uses/results
@@ -0,0 +1,487 @@
+"""Persistent storage backends for the demo's agent sessions."""
+
+# Session persistence
+# -------------------
+# Sessions keep their working history in memory and write every change through
+# to a SessionStore. A restarted bridge (or a session evicted from the resident
+# cache) reloads its conversation lazily on first access.
+#
+# SQLiteSessionStore layout:
+#   sessions(session_id, kind, state, updated_at)   - one row per session
+#   session_items(session_id, seq, turn, payload)   - one row per history item
+#
+# `seq` only ever grows for a session, so appends never rewrite existing rows.
+# `turn` is the running user-turn number of each item, which lets cold loads
+# read just the last N turns without deserializing the whole history.
+#
+# Integration:
+#   store = SQLiteSessionStore("state/sessions.sqlite3")
+#   session = TrimmingSession("agentA", max_turns=9, store=store)
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+TResponseInputItem = Dict[str, Any]
+
+
+@dataclass
+class StoredSession:
+    """A session as read back from a store."""
+
+    kind: str
+    state: Dict[str, Any] = field(default_factory=dict)
+    items: List[TResponseInputItem] = field(default_factory=list)
+
+
+class SessionStore(ABC):
+    """Storage backend interface used by the persistent session classes.
+
+    Every write carries the session `kind` (its class name) and a small JSON
+    `state` dict (turn counters, last summary, ...) so the session row and its
+    items are always updated together.
+    """
+
+    @abstractmethod
+    def load(self, session_id: str, *, last_n_turns: Optional[int] = None) -> Optional[StoredSession]:
+        """Return the stored session, optionally limited to its last N user turns."""
+
+    @abstractmethod
+    def append_items(
+        self,
+        session_id: str,
+        items: Sequence[TResponseInputItem],
+        *,
+        turn_starts: Sequence[bool],
+        drop_prefix: int = 0,
+        kind: str,
+        state: Dict[str, Any],
+    ) -> None:
+        """Append items, then drop the oldest `drop_prefix` items."""
+
+    @abstractmethod
+    def drop_prefix(self, session_id: str, count: int, *, kind: str, state: Dict[str, Any]) -> None:
+        """Remove the oldest `count` items."""
+
+    @abstractmethod
+    def replace_items(
+        self,
+        session_id: str,
+        items: Sequence[TResponseInputItem],
+        *,
+        turn_starts: Sequence[bool],
+        kind: str,
+        state: Dict[str, Any],
+    ) -> None:
+        """Rewrite the whole history (summarization, compaction)."""
+
+    @abstractmethod
+    def update_items(
+        self,
+        session_id: str,
+        updates: Sequence[Tuple[int, TResponseInputItem]],
+        *,
+        kind: str,
+        state: Dict[str, Any],
+    ) -> None:
+        """Overwrite items in place, addressed by their position in the live history."""
+
+    @abstractmethod
+    def pop_item(self, session_id: str, *, kind: str, state: Dict[str, Any]) -> None:
+        """Remove the newest item."""
+
+    @abstractmethod
+    def save_state(self, session_id: str, *, kind: str, state: Dict[str, Any]) -> None:
+        """Update the session row without touching its items."""
+
+    @abstractmethod
+    def clear(self, session_id: str) -> None:
+        """Forget a session entirely."""
+
+    @abstractmethod
+    def clear_all(self) -> None:
+        """Forget every session."""
+
+
+def _json_default(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        try:
+            return value.model_dump(exclude_none=True)
+        except Exception:
+            pass
+    return str(value)
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=_json_default)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Append-only SQLite store running in WAL mode.
+
+    A single connection is shared across threads behind a lock; callers on the
+    event loop are expected to invoke it through `asyncio.to_thread`.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT '{}',
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS session_items (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                turn INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_session_items_turn ON session_items (session_id, turn);
+            """
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # --------------
+    # Reads
+    # --------------
+
+    def load(self, session_id: str, *, last_n_turns: Optional[int] = None) -> Optional[StoredSession]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT kind, state FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if last_n_turns is None:
+                cursor = self._conn.execute(
+                    "SELECT payload FROM session_items WHERE session_id = ? ORDER BY seq",
+                    (session_id,),
+                )
+            else:
+                cursor = self._conn.execute(
+                    """
+                    SELECT payload FROM session_items
+                    WHERE session_id = ?
+                      AND turn > (SELECT COALESCE(MAX(turn), 0) FROM session_items WHERE session_id = ?) - ?
+                    ORDER BY seq
+                    """,
+                    (session_id, session_id, max(0, int(last_n_turns))),
+                )
+            payloads = [payload for (payload,) in cursor]
+
+        kind, raw_state = row
+        try:
+            state = json.loads(raw_state) if raw_state else {}
+        except json.JSONDecodeError:
+            state = {}
+        return StoredSession(kind=kind, state=state, items=[json.loads(p) for p in payloads])
+
+    # --------------
+    # Writes
+    # --------------
+
+    def append_items(
+        self,
+        session_id: str,
+        items: Sequence[TResponseInputItem],
+        *,
+        turn_starts: Sequence[bool],
+        drop_prefix: int = 0,
+        kind: str,
+        state: Dict[str, Any],
+    ) -> None:
+        with self._lock, self._transaction():
+            last_seq, last_turn = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), -1), COALESCE(MAX(turn), 0) FROM session_items WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            self._insert_items(session_id, items, turn_starts, first_seq=last_seq + 1, first_turn=last_turn)
+            if drop_prefix > 0:
+                self._delete_prefix(session_id, drop_prefix)
+            self._upsert_session(session_id, kind, state)
+
+    def drop_prefix(self, session_id: str, count: int, *, kind: str, state: Dict[str, Any]) -> None:
+        with self._lock, self._transaction():
+            if count > 0:
+                self._delete_prefix(session_id, count)
+            self._upsert_session(session_id, kind, state)
+
+    def replace_items(
+        self,
+        session_id: str,
+        items: Sequence[TResponseInputItem],
+        *,
+        turn_starts: Sequence[bool],
+        kind: str,
+        state: Dict[str, Any],
+    ) -> None:
+        with self._lock, self._transaction():
+            self._conn.execute("DELETE FROM session_items WHERE session_id = ?", (session_id,))
+            self._insert_items(session_id, items, turn_starts, first_seq=0, first_turn=0)
+            self._upsert_session(session_id, kind, state)
+
+    def update_items(
+        self,
+        session_id: str,
+        updates: Sequence[Tuple[int, TResponseInputItem]],
+        *,
+        kind: str,
+        state: Dict[str, Any],
+    ) -> None:
+        with self._lock, self._transaction():
+            # Live seqs are contiguous: appends extend the tail, trims and pops cut the ends.
+            (first_seq,) = self._conn.execute(
+                "SELECT MIN(seq) FROM session_items WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if first_seq is not None and updates:
+                self._conn.executemany(
+                    "UPDATE session_items SET payload = ? WHERE session_id = ? AND seq = ?",
+                    [(_dumps(item), session_id, first_seq + position) for position, item in updates],
+                )
+            self._upsert_session(session_id, kind, state)
+
+    def pop_item(self, session_id: str, *, kind: str, state: Dict[str, Any]) -> None:
+        with self._lock, self._transaction():
+            self._conn.execute(
+                """
+                DELETE FROM session_items
+                WHERE session_id = ?
+                  AND seq = (SELECT MAX(seq) FROM session_items WHERE session_id = ?)
+                """,
+                (session_id, session_id),
+            )
+            self._upsert_session(session_id, kind, state)
+
+    def save_state(self, session_id: str, *, kind: str, state: Dict[str, Any]) -> None:
+        with self._lock, self._transaction():
+            self._upsert_session(session_id, kind, state)
+
+    def clear(self, session_id: str) -> None:
+        with self._lock, self._transaction():
+            self._conn.execute("DELETE FROM session_items WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def clear_all(self) -> None:
+        with self._lock, self._transaction():
+            self._conn.execute("DELETE FROM session_items")
+            self._conn.execute("DELETE FROM sessions")
+
+    # --------------
+    # Internals
+    # --------------
+
+    def _transaction(self) -> "_Transaction":
+        return _Transaction(self._conn)
+
+    def _insert_items(
+        self,
+        session_id: str,
+        items: Sequence[TResponseInputItem],
+        turn_starts: Sequence[bool],
+        *,
+        first_seq: int,
+        first_turn: int,
+    ) -> None:
+        rows = []
+        turn = first_turn
+        for offset, (item, starts_turn) in enumerate(zip(items, turn_starts)):
+            if starts_turn:
+                turn += 1
+            rows.append((session_id, first_seq + offset, turn, _dumps(item)))
+        if rows:
+            self._conn.executemany(
+                "INSERT INTO session_items (session_id, seq, turn, payload) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def _delete_prefix(self, session_id: str, count: int) -> None:
+        self._conn.execute(
+            """
+            DELETE FROM session_items
+            WHERE session_id = ?
+              AND seq IN (SELECT seq FROM session_items WHERE session_id = ? ORDER BY seq LIMIT ?)
+            """,
+            (session_id, session_id, int(count)),
+        )
+
+    def _upsert_session(self, session_id: str, kind: str, state: Dict[str, Any]) -> None:
+        self._conn.execute(
+            """
+            INSERT INTO sessions (session_id, kind, state, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (session_id) DO UPDATE SET
+                kind = excluded.kind, state = excluded.state, updated_at = excluded.updated_at
+            """,
+            (session_id, kind, _dumps(state), time.time()),
+        )
+
+
+class _Transaction:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self._conn.execute("BEGIN")
+        return self._conn
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if exc_type is None:
+            self._conn.execute("COMMIT")
+        else:
+            self._conn.execute("ROLLBACK")
+
+
+# ----------------------------
+# Session-side helpers
+# ----------------------------
+
+
+class PersistentSessionMixin:
+    """Write-through persistence and lazy loading against an optional SessionStore.
+
+    Host classes provide `session_id`, `_items` (a list or deque), `store`,
+    `_store_loaded` and `_is_turn_start(item)`. Every method here must be
+    awaited while the host holds whatever guards `_items`.
+    """
+
+    store: Optional[SessionStore]
+    _store_loaded: bool
+
+    def _is_turn_start(self, item: TResponseInputItem) -> bool:  # pragma: no cover - abstract
+        raise NotImplementedError
+
+    def _load_turn_window(self) -> Optional[int]:
+        """How many trailing user turns a cold load needs; None loads everything."""
+        return None
+
+    def _persisted_state(self) -> Dict[str, Any]:
+        return {"internalTurnCounter": self.internalTurnCounter}  # type: ignore[attr-defined]
+
+    def _restore_persisted_state(self, state: Dict[str, Any]) -> None:
+        self.internalTurnCounter = state.get("internalTurnCounter", 0)  # type: ignore[attr-defined]
+
+    def _restore_items(self, items: List[TResponseInputItem]) -> None:
+        self._items.clear()  # type: ignore[attr-defined]
+        self._items.extend(items)  # type: ignore[attr-defined]
+
+    async def _ensure_loaded(self) -> None:
+        if self._store_loaded or self.store is None:
+            return
+        self._store_loaded = True
+        session_id = self.session_id  # type: ignore[attr-defined]
+        try:
+            stored = await asyncio.to_thread(
+                self.store.load, session_id, last_n_turns=self._load_turn_window()
+            )
+            if stored is not None and stored.kind != type(self).__name__:
+                # Another memory strategy owned this id; start over like a freshly configured session.
+                await asyncio.to_thread(self.store.clear, session_id)
+                stored = None
+        except Exception as exc:  # pragma: no cover - best-effort persistence
+            print(f"[agents-python] Warning: failed to load session {session_id}: {exc}", file=sys.stderr)
+            return
+        if stored is None:
+            return
+        self._restore_items(stored.items)
+        self._restore_persisted_state(stored.state)
+
+    async def _persist(self, operation: str, *args: Any, **kwargs: Any) -> None:
+        if self.store is None:
+            return
+        method = getattr(self.store, operation)
+        session_id = self.session_id  # type: ignore[attr-defined]
+        try:
+            await asyncio.to_thread(
+                method,
+                session_id,
+                *args,
+                kind=type(self).__name__,
+                state=self._persisted_state(),
+                **kwargs,
+            )
+        except Exception as exc:  # pragma: no cover - best-effort persistence
+            print(
+                f"[agents-python] Warning: failed to persist session {session_id} ({operation}): {exc}",
+                file=sys.stderr,
+            )
+
+    async def _persist_append(self, items: Sequence[TResponseInputItem], *, drop_prefix: int = 0) -> None:
+        items = list(items)
+        await self._persist(
+            "append_items",
+            items,
+            turn_starts=[self._is_turn_start(item) for item in items],
+            drop_prefix=drop_prefix,
+        )
+
+    async def _persist_replace(self) -> None:
+        items = list(self._items)  # type: ignore[attr-defined]
+        await self._persist(
+            "replace_items",
+            items,
+            turn_starts=[self._is_turn_start(item) for item in items],
+        )
+
+    async def _persist_updates(self, positions: Iterable[int]) -> None:
+        items = self._items  # type: ignore[attr-defined]
+        await self._persist("update_items", [(position, items[position]) for position in sorted(positions)])
+
+    async def _persist_clear(self) -> None:
+        self._store_loaded = True
+        if self.store is None:
+            return
+        try:
+            await asyncio.to_thread(self.store.clear, self.session_id)  # type: ignore[attr-defined]
+        except Exception as exc:  # pragma: no cover - best-effort persistence
+            print(f"[agents-python] Warning: failed to clear persisted session: {exc}", file=sys.stderr)
+
+
+class LRUSessionCache(OrderedDict):
+    """Dict of resident sessions that evicts the least recently used beyond `max_size`.
+
+    Only safe for sessions backed by a persistent store: an evicted session is
+    simply dropped and reloaded from the store the next time it is needed.
+    """
+
+    def __init__(self, max_size: Optional[int] = None) -> None:
+        super().__init__()
+        self.max_size = max_size
+
+    def __getitem__(self, key: Any) -> Any:
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if key in self:
+            return self[key]
+        return default
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if self.max_size is not None:
+            while len(self) > self.max_size:
+                self.popitem(last=False)
@@ -0,0 +1,258 @@
+"""Per-session and per-user storage for generated conversation summaries."""
+
+# Summary persistence
+# -------------------
+# Every summarization is recorded under its session id and under the user the
+# session belongs to. The user's latest summary is the cross-session memory
+# injected into new conversations.
+#
+# - Lookups are served from an in-memory LRU of parsed summaries. A key is read
+#   from disk at most once (misses are cached too), so building instructions
+#   never stats the filesystem per request. This process is the only writer.
+# - Writes update the LRU immediately and queue the file write. Queued writes
+#   are flushed together after a short debounce on a worker thread, keeping
+#   file I/O off the event loop; only the newest record per key is written.
+# - Each file is written to a temp file and renamed into place, so readers
+#   never see a partial summary.
+#
+# Layout (under state/summaries/):
+#   sessions/<session_id>.txt   latest summary produced by a session
+#   users/<user_id>.txt         latest summary for a user, across sessions
+#   summary.txt                 legacy single summary; read-only seed for users
+#                               that have no summary of their own yet
+#
+# Integration:
+#   store = SummaryStore(Path("state/summaries"))
+#   store.record("agentA", "default", shadow_line, summary_text)
+#   memory = store.user_summary("default")
+
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+DEFAULT_USER_ID = "default"
+
+_SAFE_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# ("session" | "user", id)
+_Key = Tuple[str, str]
+
+
+@dataclass(frozen=True)
+class SummaryRecord:
+    shadow_line: str
+    summary_text: str
+    generated_at: str
+
+
+def format_summary(record: SummaryRecord) -> str:
+    lines = [
+        f"generated_at: {record.generated_at}",
+        "",
+    ]
+    if record.shadow_line:
+        lines.append("shadow_line:")
+        lines.append(record.shadow_line)
+        lines.append("")
+    if record.summary_text:
+        lines.append("summary:")
+        lines.append(record.summary_text)
+        lines.append("")
+    return "\n".join(lines).rstrip() + "\n"
+
+
+def extract_summary_section(raw: str) -> Optional[str]:
+    if not raw:
+        return None
+
+    lowered = raw.lower()
+    marker = "summary:"
+    idx = lowered.rfind(marker)
+    if idx == -1:
+        return None
+
+    start = idx + len(marker)
+    summary_text = raw[start:].strip()
+    return summary_text or None
+
+
+def _file_stem(identifier: str) -> str:
+    if _SAFE_ID.match(identifier) and identifier not in {".", ".."}:
+        return identifier
+    return hashlib.sha1(identifier.encode("utf-8")).hexdigest()
+
+
+def _atomic_write_text(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(text)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+class SummaryStore:
+    """Summaries keyed by session and by user, cached in memory and flushed in batches."""
+
+    def __init__(
+        self,
+        root: Path,
+        *,
+        legacy_path: Optional[Path] = None,
+        max_entries: int = 1024,
+        flush_delay: float = 0.5,
+    ) -> None:
+        self.root = Path(root)
+        self.legacy_path = legacy_path
+        self.max_entries = max(1, int(max_entries))
+        self.flush_delay = max(0.0, float(flush_delay))
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._cache: "OrderedDict[_Key, Optional[SummaryRecord]]" = OrderedDict()
+        self._pending: Dict[_Key, SummaryRecord] = {}
+        self._legacy_loaded = False
+        self._legacy: Optional[SummaryRecord] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional["asyncio.Future[None]"] = None
+
+    # ----------------------------
+    # Reads
+    # ----------------------------
+
+    def session_summary(self, session_id: str) -> Optional[str]:
+        record = self._get(("session", str(session_id)))
+        return record.summary_text if record else None
+
+    def user_summary(self, user_id: Optional[str] = None) -> Optional[str]:
+        record = self._get(("user", str(user_id or DEFAULT_USER_ID)))
+        if record is None:
+            record = self._legacy_record()
+        return record.summary_text if record else None
+
+    def _get(self, key: _Key) -> Optional[SummaryRecord]:
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        record = self._read(self._path(key))
+        with self._lock:
+            # A record written while we were reading wins over the file contents.
+            if key in self._cache:
+                return self._cache[key]
+            self._remember(key, record)
+        return record
+
+    def _legacy_record(self) -> Optional[SummaryRecord]:
+        if not self._legacy_loaded:
+            self._legacy = self._read(self.legacy_path) if self.legacy_path else None
+            self._legacy_loaded = True
+        return self._legacy
+
+    def _path(self, key: _Key) -> Path:
+        kind, identifier = key
+        folder = "sessions" if kind == "session" else "users"
+        return self.root / folder / f"{_file_stem(identifier)}.txt"
+
+    @staticmethod
+    def _read(path: Path) -> Optional[SummaryRecord]:
+        try:
+            raw = path.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            return None
+        summary_text = extract_summary_section(raw)
+        if not summary_text:
+            return None
+        shadow_line = ""
+        generated_at = ""
+        lines = raw.splitlines()
+        for index, line in enumerate(lines):
+            if line.startswith("generated_at:"):
+                generated_at = line.partition(":")[2].strip()
+            elif line.strip() == "shadow_line:" and index + 1 < len(lines):
+                shadow_line = lines[index + 1].strip()
+        return SummaryRecord(shadow_line, summary_text, generated_at)
+
+    # ----------------------------
+    # Writes
+    # ----------------------------
+
+    def record(self, session_id: str, user_id: Optional[str], shadow_line: str, summary_text: str) -> None:
+        """Remember a new summary for the session and its user; the files are written on the next flush."""
+
+        shadow = (shadow_line or "").strip()
+        summary = (summary_text or "").strip()
+        if not shadow and not summary:
+            return
+
+        record = SummaryRecord(shadow, summary, dt.datetime.now(dt.timezone.utc).isoformat())
+        keys = (("session", str(session_id)), ("user", str(user_id or DEFAULT_USER_ID)))
+        with self._lock:
+            for key in keys:
+                self._remember(key, record)
+                self._pending[key] = record
+        self._schedule_flush()
+
+    def flush(self) -> None:
+        """Write all queued records now (blocking; safe to call from any thread)."""
+
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            for key, record in batch.items():
+                try:
+                    _atomic_write_text(self._path(key), format_summary(record))
+                except Exception as exc:  # pragma: no cover - best-effort persistence
+                    print(
+                        f"[agents-python] Warning: failed to write summary for {key[0]} {key[1]}: {exc}",
+                        file=sys.stderr,
+                    )
+
+    def close(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self.flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop to defer to (scripts, tests): write synchronously.
+            self.flush()
+            return
+        self._flush_handle = loop.call_later(self.flush_delay, self._start_flush, loop)
+
+    def _start_flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._flush_handle = None
+        self._flush_task = loop.run_in_executor(None, self.flush)
+
+    def _remember(self, key: _Key, record: Optional[SummaryRecord]) -> None:
+        # Caller holds self._lock. Pending writes are tracked separately, so
+        # evicting a cached entry never loses a summary.
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
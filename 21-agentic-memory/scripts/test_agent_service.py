@@ -0,0 +1,63 @@
+"""Ordering tests for the NDJSON command loop in agent_service.
+
+Run from this directory with `python -m unittest test_agent_service`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import agent_service  # noqa: E402
+
+
+class ProcessStreamOrderingTest(unittest.TestCase):
+    def replay(self, commands):
+        events = []
+
+        async def handle_command(payload):
+            events.append(("start", payload["id"]))
+            await asyncio.sleep(payload.get("delay", 0.01))
+            events.append(("end", payload["id"]))
+            return {}
+
+        stdin = io.StringIO("".join(json.dumps(command) + "\n" for command in commands))
+        with mock.patch.object(agent_service, "handle_command", handle_command), \
+                mock.patch.object(sys, "stdin", stdin), \
+                mock.patch.object(sys, "stdout", io.StringIO()):
+            asyncio.run(agent_service._process_stream())
+        return events
+
+    def test_configure_spanning_agents_keeps_arrival_order(self):
+        events = self.replay([
+            {"id": "1", "type": "run", "agent_id": "A", "delay": 0.2},
+            {"id": "2", "type": "configure_trimming", "agent_ids": ["A", "B"]},
+            {"id": "3", "type": "run", "agent_id": "B"},
+        ])
+
+        self.assertEqual(
+            events,
+            [("start", "1"), ("end", "1"), ("start", "2"), ("end", "2"), ("start", "3"), ("end", "3")],
+        )
+        self.assertEqual(agent_service._AGENT_TAILS, {})
+
+    def test_other_agents_are_not_blocked(self):
+        events = self.replay([
+            {"id": "1", "type": "run", "agent_id": "A", "delay": 0.2},
+            {"id": "2", "type": "run", "agent_id": "A"},
+            {"id": "3", "type": "run", "agent_id": "B"},
+        ])
+
+        self.assertLess(events.index(("end", "3")), events.index(("end", "1")))
+        self.assertLess(events.index(("end", "1")), events.index(("start", "2")))
+
+
+if __name__ == "__main__":
+    unittest.main()
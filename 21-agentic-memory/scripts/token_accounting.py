@@ -0,0 +1,210 @@
+"""Token accounting shared by the demo's sessions, compaction and UI usage deltas."""
+
+# Token accounting
+# ----------------
+# Every token estimate in the agent service goes through one TokenCounter:
+# - Text is tokenized with a tiktoken BPE encoding (o200k_base by default)
+#   loaded strictly offline from the vocab files in state/tokenizers/.
+# - Counts are memoized in an LRU keyed by a content hash of the text, so an
+#   item that is counted by trimming, compaction and the UI delta is tokenized
+#   once. Heuristic counts are cheaper than the hash, so they skip the cache.
+# - If tiktoken or the vocab file is unavailable, counting falls back to the
+#   ceil(len(text) / 4) heuristic the demo used originally.
+#
+# Environment:
+#   AGENT_TOKENIZER_ENCODING  encoding name, or "heuristic" to skip tiktoken
+#   TIKTOKEN_CACHE_DIR        vocab directory (defaults to state/tokenizers)
+#
+# Populate the vocab directory once, on a machine with network access:
+#   python scripts/token_accounting.py fetch o200k_base
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import math
+import os
+import sys
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+TOKENIZER_DIR = (Path(__file__).resolve().parent.parent) / "state" / "tokenizers"
+DEFAULT_ENCODING = "o200k_base"
+_VOCAB_URL_TEMPLATE = "https://openaipublic.blob.core.windows.net/encodings/{name}.tiktoken"
+
+
+class Tokenizer(ABC):
+    """Minimal tokenizer interface: only token counts are needed."""
+
+    name: str
+    # Whether counting costs enough for TokenCounter to memoize it.
+    cacheable: bool = True
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        """Return the number of tokens in `text`."""
+
+
+class HeuristicTokenizer(Tokenizer):
+    """Roughly chars/4; used when no BPE vocabulary is available."""
+
+    name = "heuristic"
+    cacheable = False
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return int(math.ceil(len(text) / 4.0))
+
+
+class TiktokenTokenizer(Tokenizer):
+    """Exact counts from a tiktoken-compatible `Encoding`."""
+
+    def __init__(self, encoding: Any) -> None:
+        self._encoding = encoding
+        self.name = str(getattr(encoding, "name", "tiktoken"))
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return len(self._encoding.encode_ordinary(text))
+
+
+def _vocab_cache_path(encoding_name: str, cache_dir: Path) -> Path:
+    # tiktoken names cached vocab files by the SHA-1 of their download URL.
+    url = _VOCAB_URL_TEMPLATE.format(name=encoding_name)
+    return cache_dir / hashlib.sha1(url.encode()).hexdigest()
+
+
+def _tokenizer_cache_dir() -> Path:
+    return Path(os.environ.get("TIKTOKEN_CACHE_DIR") or TOKENIZER_DIR)
+
+
+def load_tokenizer(encoding_name: Optional[str] = None) -> Tokenizer:
+    """Load the configured BPE tokenizer without touching the network.
+
+    Falls back to `HeuristicTokenizer` (with a warning) if tiktoken is not
+    installed or the vocab file has not been fetched into the cache directory.
+    """
+
+    name = encoding_name or os.environ.get("AGENT_TOKENIZER_ENCODING") or DEFAULT_ENCODING
+    if name == HeuristicTokenizer.name:
+        return HeuristicTokenizer()
+
+    cache_dir = _tokenizer_cache_dir()
+    if not _vocab_cache_path(name, cache_dir).exists():
+        print(
+            f"[agents-python] Warning: no local vocab for {name} in {cache_dir}; using chars/4 token estimates. "
+            f"Run `python scripts/token_accounting.py fetch {name}` to enable exact counts.",
+            file=sys.stderr,
+        )
+        return HeuristicTokenizer()
+
+    os.environ["TIKTOKEN_CACHE_DIR"] = str(cache_dir)
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding(name)
+    except Exception as exc:
+        print(
+            f"[agents-python] Warning: failed to load tokenizer {name} ({exc}); using chars/4 token estimates.",
+            file=sys.stderr,
+        )
+        return HeuristicTokenizer()
+    return TiktokenTokenizer(encoding)
+
+
+class TokenCounter:
+    """Memoized token counts keyed by a content hash of the counted text."""
+
+    def __init__(self, tokenizer: Tokenizer, max_entries: int = 100_000) -> None:
+        self.tokenizer = tokenizer
+        self.max_entries = max(1, int(max_entries))
+        self._cache: OrderedDict[bytes, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count_text(self, text: str) -> int:
+        if not text:
+            return 0
+        if not self.tokenizer.cacheable:
+            return self.tokenizer.count(text)
+        key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+        tokens = self.tokenizer.count(text)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = tokens
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_DEFAULT_COUNTER: Optional[TokenCounter] = None
+_DEFAULT_COUNTER_LOCK = threading.Lock()
+
+
+def get_token_counter() -> TokenCounter:
+    """Return the process-wide counter, loading the tokenizer on first use."""
+
+    global _DEFAULT_COUNTER
+    if _DEFAULT_COUNTER is None:
+        with _DEFAULT_COUNTER_LOCK:
+            if _DEFAULT_COUNTER is None:
+                _DEFAULT_COUNTER = TokenCounter(load_tokenizer())
+    return _DEFAULT_COUNTER
+
+
+def set_token_counter(counter: TokenCounter) -> None:
+    """Swap the process-wide counter (e.g. to plug in a different tokenizer)."""
+
+    global _DEFAULT_COUNTER
+    with _DEFAULT_COUNTER_LOCK:
+        _DEFAULT_COUNTER = counter
+
+
+def count_tokens(text: str) -> int:
+    return get_token_counter().count_text(text)
+
+
+def fetch_vocab(encoding_name: str) -> Path:
+    """Download an encoding's vocab into the local cache directory (needs network)."""
+
+    cache_dir = _tokenizer_cache_dir()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    os.environ["TIKTOKEN_CACHE_DIR"] = str(cache_dir)
+    import tiktoken
+
+    tiktoken.get_encoding(encoding_name)
+    return _vocab_cache_path(encoding_name, cache_dir)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage local tokenizer vocab files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    fetch = subparsers.add_parser("fetch", help="download an encoding's vocab into the local cache")
+    fetch.add_argument("encoding", nargs="?", default=DEFAULT_ENCODING)
+    args = parser.parse_args()
+
+    if args.command == "fetch":
+        path = fetch_vocab(args.encoding)
+        print(f"Saved {args.encoding} vocab to {path}")
+
+
+if __name__ == "__main__":
+    main()
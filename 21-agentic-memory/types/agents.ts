@@ -11,6 +11,9 @@ export type AgentConfig = {
   summarizationTriggerTurns: number
   memoryCompacting: boolean
   compactingTriggerTurns: number | null
+  compactingTriggerMaxTokens?: number | null
+  compactingTriggerMaxToolTokens?: number | null
+  compactingTriggerTargetRatio?: number | null
   compactingKeepTurns: number
   compactingExcludeTools: string[]
   compactingClearToolInputs: boolean
@@ -37,11 +40,20 @@ export type AgentSummary = {
   summary_text: string
 }
 
+export type SummaryStats = {
+  inputTokens: number
+  fullInputTokens: number
+  savedInputTokens: number
+  cached: boolean
+  rolling: boolean
+}
+
 export type AgentRunResult = {
   response: string
   toolResults: string[]
   tokenUsage: TokenUsageBreakdown
   summary: AgentSummary | null
+  summaryStats?: SummaryStats | null
   contextTrimmed?: boolean
   contextSummarized?: boolean
   contextCompacted?: boolean
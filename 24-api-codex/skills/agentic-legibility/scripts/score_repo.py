@@ -8,7 +8,9 @@ import fnmatch
 import json
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable, Iterable
 
 
 IGNORED_DIRS = {
@@ -34,6 +36,7 @@ IGNORED_DIRS = {
 
 DOC_EXTENSIONS = {".md", ".mdx", ".rst", ".txt"}
 MAX_TEXT_SIZE = 250_000
+READ_WORKERS = min(32, (os.cpu_count() or 1) + 4)
 MAX_EVIDENCE = 5
 ROOT_SCOPE = "."
 AGENT_DOC_NAMES = {"agents.md", "claude.md", "copilot-instructions.md"}
@@ -57,6 +60,10 @@ def rel(path: Path, root: Path) -> str:
     return path.relative_to(root).as_posix()
 
 
+def basename(relpath: str) -> str:
+    return relpath.rpartition("/")[2]
+
+
 def read_text(path: Path) -> str:
     try:
         if path.stat().st_size > MAX_TEXT_SIZE:
@@ -66,52 +73,93 @@ def read_text(path: Path) -> str:
         return ""
 
 
-def walk_repo(root: Path, excludes: list[str]) -> list[Path]:
-    paths: list[Path] = []
-    exclude_patterns = [pattern.strip("/") for pattern in excludes if pattern.strip("/")]
-    for dirpath, dirnames, filenames in os.walk(root):
-        current = Path(dirpath)
+class TextCache:
+    """Reads repository files at most once, fanning cold reads out to a thread pool."""
+
+    def __init__(self, max_workers: int = READ_WORKERS) -> None:
+        self.max_workers = max(1, max_workers)
+        self._texts: dict[str, str] = {}
+
+    def read(self, path: Path) -> str:
+        return self.read_many([path])[0]
+
+    def read_many(self, paths: Iterable[Path]) -> list[str]:
+        keys = [str(path) for path in paths]
+        missing = [key for key in dict.fromkeys(keys) if key not in self._texts]
+        if len(missing) > 1 and self.max_workers > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as pool:
+                texts = list(pool.map(read_text, map(Path, missing)))
+        else:
+            texts = [read_text(Path(key)) for key in missing]
+        self._texts.update(zip(missing, texts))
+        return [self._texts[key] for key in keys]
+
+
+def compile_excludes(excludes: list[str]) -> Callable[[str], bool] | None:
+    """Fold every exclude into one regex: an exact path or directory prefix, or an fnmatch glob."""
+
+    patterns = [pattern.strip("/") for pattern in excludes if pattern.strip("/")]
+    if not patterns:
+        return None
+    alternatives = [re.escape(pattern) + r"(?:/.*)?\Z" for pattern in patterns]
+    alternatives.extend(fnmatch.translate(pattern) for pattern in patterns)
+    regex = re.compile("|".join(f"(?:{item})" for item in alternatives), re.DOTALL)
+    return lambda relpath: regex.match(relpath) is not None
+
+
+def walk_repo(root: Path, excludes: list[str]) -> list[str]:
+    """Return root-relative POSIX paths of every included file, in os.walk order."""
+
+    relpaths: list[str] = []
+    matches_exclude = compile_excludes(excludes)
+    root_str = str(root)
+    for dirpath, dirnames, filenames in os.walk(root_str):
+        reldir = os.path.relpath(dirpath, root_str)
+        prefix = "" if reldir == os.curdir else reldir.replace(os.sep, "/") + "/"
         dirnames[:] = [
             name
             for name in dirnames
             if name not in IGNORED_DIRS
-            and not matches_exclude(rel(current / name, root), exclude_patterns)
+            and not (matches_exclude and matches_exclude(prefix + name))
         ]
         for filename in filenames:
-            file_path = current / filename
-            relpath = rel(file_path, root)
-            if matches_exclude(relpath, exclude_patterns):
+            relpath = prefix + filename
+            if matches_exclude and matches_exclude(relpath):
                 continue
-            paths.append(file_path)
-    return paths
-
-
-def matches_exclude(relpath: str, patterns: list[str]) -> bool:
-    if not patterns:
-        return False
-    for pattern in patterns:
-        if relpath == pattern or relpath.startswith(pattern.rstrip("/") + "/"):
-            return True
-        if fnmatch.fnmatch(relpath, pattern):
-            return True
-    return False
+            relpaths.append(relpath)
+    return relpaths
+
+
+class RepoIndex:
+    """One walk of the repository, shared by the root context and any nested scope."""
+
+    def __init__(self, root: Path, excludes: list[str], texts: TextCache | None = None) -> None:
+        self.root = root
+        self.excludes = excludes
+        self.relpaths = walk_repo(root, excludes)
+        self.texts = texts or TextCache()
+
+    def scope_relpaths(self, scope: str) -> list[str]:
+        if scope == ROOT_SCOPE:
+            return self.relpaths
+        # Excludes are honoured relative to the scope as well as to the repository root.
+        matches_exclude = compile_excludes(self.excludes)
+        prefix = scope.rstrip("/") + "/"
+        return [
+            relpath[len(prefix):]
+            for relpath in self.relpaths
+            if relpath.startswith(prefix)
+            and not (matches_exclude and matches_exclude(relpath[len(prefix):]))
+        ]
 
 
-def find_files(paths: list[Path], *patterns: str) -> list[Path]:
-    matches: list[Path] = []
-    for path in paths:
-        relpath = path.as_posix()
-        name = path.name
-        if any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relpath, pattern) for pattern in patterns):
-            matches.append(path)
-    return matches
+def compile_globs(*patterns: str) -> re.Pattern[str]:
+    return re.compile("|".join(f"(?:{fnmatch.translate(pattern)})" for pattern in patterns))
 
 
-def read_candidates(paths: list[Path], root: Path, patterns: tuple[str, ...]) -> dict[str, str]:
-    selected = {}
-    for path in find_files(paths, *patterns):
-        selected[rel(path, root)] = read_text(path)
-    return selected
+def find_files(relpaths: list[str], *patterns: str) -> list[str]:
+    matcher = compile_globs(*patterns)
+    return [relpath for relpath in relpaths if matcher.match(basename(relpath)) or matcher.match(relpath)]
 
 
 def parse_package_scripts(text: str) -> set[str]:
@@ -176,8 +224,8 @@ def normalize_scope(root: Path, scope: str) -> str:
     return normalized or ROOT_SCOPE
 
 
-def scope_candidates_for_path(path: Path) -> list[str]:
-    return [Path(*path.parts[:index]).as_posix() for index in range(1, len(path.parts))]
+def scope_candidates_for_path(parts: list[str]) -> list[str]:
+    return ["/".join(parts[:index]) for index in range(1, len(parts))]
 
 
 def root_routes_to_scope(root_readme: str, scope: str) -> bool:
@@ -196,28 +244,32 @@ def discover_scopes(ctx: dict) -> list[dict]:
     ).lower()
     task_surface_files = ctx["task_surface_files"]
     signals_by_scope: dict[str, set[str]] = {}
+    routed: dict[str, bool] = {}
 
     for relpath in relpaths:
-        path = Path(relpath)
-        if len(path.parts) < 2:
+        parts = relpath.split("/")
+        if len(parts) < 2:
             continue
 
-        direct_scope = path.parent.as_posix()
-        filename = path.name.lower()
-        candidate_scopes = scope_candidates_for_path(path)
+        direct_scope = "/".join(parts[:-1])
+        name = parts[-1]
+        filename = name.lower()
+        candidate_scopes = scope_candidates_for_path(parts)
 
         if filename in AGENT_DOC_NAMES:
-            signals_by_scope.setdefault(direct_scope, set()).add(f"agent_doc:{path.name}")
+            signals_by_scope.setdefault(direct_scope, set()).add(f"agent_doc:{name}")
         if filename == "readme.md":
             signals_by_scope.setdefault(direct_scope, set()).add("scope_readme:README.md")
 
         for scope in candidate_scopes:
             signals = signals_by_scope.setdefault(scope, set())
             if filename in TASK_FILE_NAMES and relpath in task_surface_files:
-                signals.add(f"task_surface:{path.name}")
+                signals.add(f"task_surface:{name}")
             if filename in MANIFEST_FILE_NAMES:
-                signals.add(f"manifest:{path.name}")
-            if root_routes_to_scope(root_readme, scope):
+                signals.add(f"manifest:{name}")
+            if scope not in routed:
+                routed[scope] = root_routes_to_scope(root_readme, scope)
+            if routed[scope]:
                 signals.add("root_routes_here:README.md")
 
     candidates = []
@@ -270,12 +322,22 @@ def choose_scope(ctx: dict, explicit_scope: str | None = None) -> tuple[str, lis
     return ROOT_SCOPE, discovered, "root_default"
 
 
-def collect_context(root: Path, excludes: list[str]) -> dict:
-    files = walk_repo(root, excludes)
-    relpaths = {rel(path, root) for path in files}
-    docs = [path for path in files if path.suffix.lower() in DOC_EXTENSIONS]
-    doc_texts = {
-        rel(path, root): read_text(path)
+def collect_context(root: Path, excludes: list[str], index: RepoIndex | None = None) -> dict:
+    if index is not None and root != index.root and index.root not in root.parents:
+        index = RepoIndex(root, excludes, index.texts)
+    if index is None:
+        index = RepoIndex(root, excludes)
+    scope = ROOT_SCOPE if root == index.root else rel(root, index.root)
+    ordered_relpaths = index.scope_relpaths(scope)
+    relpaths = set(ordered_relpaths)
+    doc_paths = [
+        relpath
+        for relpath in ordered_relpaths
+        if os.path.splitext(basename(relpath))[1].lower() in DOC_EXTENSIONS
+    ]
+    docs = [root / relpath for relpath in doc_paths]
+    doc_files = [
+        path
         for path in docs
         if path.name.lower()
         in {
@@ -287,21 +349,20 @@ def collect_context(root: Path, excludes: list[str]) -> dict:
             "copilot-instructions.md",
         }
         or path.parts[:1] == ("docs",)
-    }
-
-    task_files = read_candidates(
-        files,
-        root,
-        (
-            "Makefile",
-            "makefile",
-            "justfile",
-            "Justfile",
-            "Taskfile.yml",
-            "Taskfile.yaml",
-            "package.json",
-        ),
+    ]
+    task_candidates = find_files(
+        ordered_relpaths,
+        "Makefile",
+        "makefile",
+        "justfile",
+        "Justfile",
+        "Taskfile.yml",
+        "Taskfile.yaml",
+        "package.json",
     )
+    contents = index.texts.read_many(doc_files + [root / relpath for relpath in task_candidates])
+    doc_texts = {rel(path, root): text for path, text in zip(doc_files, contents)}
+    task_files = dict(zip(task_candidates, contents[len(doc_files):]))
 
     task_surface: set[str] = set()
     task_surface_files: set[str] = set()
@@ -326,9 +387,9 @@ def collect_context(root: Path, excludes: list[str]) -> dict:
 
     return {
         "root": root,
-        "files": files,
+        "texts": index.texts,
         "relpaths": relpaths,
-        "doc_paths": [rel(path, root) for path in docs],
+        "doc_paths": doc_paths,
         "doc_texts": doc_texts,
         "task_surface": task_surface,
         "task_surface_files": task_surface_files,
@@ -386,7 +447,7 @@ def score_bootstrap(ctx: dict) -> dict:
     lockfiles = sorted(
         path
         for path in relpaths
-        if Path(path).name
+        if basename(path)
         in {
             "package-lock.json",
             "pnpm-lock.yaml",
@@ -440,15 +501,18 @@ def score_validation_harness(ctx: dict) -> dict:
         for path in relpaths
         if re.search(r"(^|/)(tests?|__tests__|spec|specs|integration|e2e|cypress|playwright|testdata|fixtures)(/|$)", path)
     )
+    test_config_names = compile_globs(
+        "pytest.ini",
+        "tox.ini",
+        "jest.config.*",
+        "vitest.config.*",
+        "playwright.config.*",
+        "cypress.config.*",
+    )
     test_configs = sorted(
         path
         for path in relpaths
-        if fnmatch.fnmatch(Path(path).name, "pytest.ini")
-        or fnmatch.fnmatch(Path(path).name, "tox.ini")
-        or fnmatch.fnmatch(Path(path).name, "jest.config.*")
-        or fnmatch.fnmatch(Path(path).name, "vitest.config.*")
-        or fnmatch.fnmatch(Path(path).name, "playwright.config.*")
-        or fnmatch.fnmatch(Path(path).name, "cypress.config.*")
+        if test_config_names.match(basename(path))
     )
     test_commands = sorted(name for name in surface if name in {"test", "check", "ci", "smoke", "integration", "e2e"})
     layered = any(part in path for path in test_dirs for part in ("integration", "e2e", "cypress", "playwright"))
@@ -470,7 +534,7 @@ def score_lint_format(ctx: dict) -> dict:
     lint_files = sorted(
         path
         for path in relpaths
-        if Path(path).name
+        if basename(path)
         in {
             ".eslintrc",
             ".eslintrc.js",
@@ -493,7 +557,7 @@ def score_lint_format(ctx: dict) -> dict:
     format_files = sorted(
         path
         for path in relpaths
-        if Path(path).name
+        if basename(path)
         in {
             ".prettierrc",
             ".prettierrc.json",
@@ -507,7 +571,7 @@ def score_lint_format(ctx: dict) -> dict:
     )
     pyproject_text = ""
     if "pyproject.toml" in relpaths:
-        pyproject_text = read_text(ctx["root"] / "pyproject.toml")
+        pyproject_text = ctx["texts"].read(ctx["root"] / "pyproject.toml")
         if any(token in pyproject_text for token in ("[tool.ruff", "[tool.black", "[tool.isort")):
             lint_files.append("pyproject.toml")
         if any(token in pyproject_text for token in ("[tool.black", "[tool.ruff.format")):
@@ -544,7 +608,7 @@ def score_agent_repo_map(ctx: dict) -> dict:
     nested_agent_docs = sorted(
         path
         for path in relpaths
-        if path.count("/") >= 1 and Path(path).name.lower() in AGENT_DOC_NAMES
+        if path.count("/") >= 1 and basename(path).lower() in AGENT_DOC_NAMES
     )
     evidence = repo_wide_agent_docs + sorted(root_support_docs)[:2] + nested_agent_docs[:2]
 
@@ -638,8 +702,8 @@ def score_decision_records(ctx: dict) -> dict:
     )
     structured = 0
     supersession = 0
-    for path in adr_files[:10]:
-        text = read_text(ctx["root"] / path)
+    adr_texts = ctx["texts"].read_many(ctx["root"] / path for path in adr_files[:10])
+    for text in adr_texts:
         lower = text.lower()
         if all(token in lower for token in ("context", "decision")):
             structured += 1
@@ -698,11 +762,12 @@ def normalize_metric_names(raw_metrics: list[str]) -> list[str]:
 
 
 def build_report(root: Path, excludes: list[str], selected_metrics: list[str], scope: str | None = None) -> dict:
-    root_ctx = collect_context(root, excludes)
+    index = RepoIndex(root, excludes)
+    root_ctx = collect_context(root, excludes, index)
     normalized_scope = normalize_scope(root, scope) if scope else None
     evaluated_scope, discovered_scopes, scope_selection = choose_scope(root_ctx, normalized_scope)
     target_root = root if evaluated_scope == ROOT_SCOPE else (root / evaluated_scope).resolve()
-    ctx = collect_context(target_root, excludes)
+    ctx = root_ctx if target_root == root else collect_context(target_root, excludes, index)
     metrics = {name: METRIC_SCORERS[name](ctx) for name in selected_metrics}
     total = sum(data["score"] for data in metrics.values())
     max_score = len(metrics) * 3